@@ -0,0 +1,143 @@
+"""
+Benchmark how the compute half of the newsletter pipeline scales with cores.
+
+Customers' frames are fetched once from synthetic Nessie data (not timed).
+Each measurement then runs the per-customer compute work (banking summary
+metrics, conversion to plain types and HTML rendering) for every customer,
+dispatched from as many threads as there are workers:
+
+- threads: everything in the dispatcher threads, contending for the GIL
+- processes: through a ComputePool with 1..N worker processes, with the
+  frames passed as Arrow IPC buffers
+
+Usage (from the repository root):
+    python -m benchmarks.bench_compute_pool
+    python -m benchmarks.bench_compute_pool --customers 64 --transactions 2000 --max-processes 8
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from benchmarks.fake_upstreams import FakeUpstreams, SyntheticBank
+
+STATIC_SECTIONS = {
+    "accounts_summary": "Benchmark headline.",
+    "stocks": [
+        {"ticker": "^GSPC", "name": "S&P 500", "price": 5123.45, "status": "Up"},
+        {"ticker": "^DJI", "name": "Dow Jones", "price": 38765.32, "status": "Up"},
+        {"ticker": "^IXIC", "name": "Nasdaq Composite", "price": 16432.10, "status": "Down"}
+    ],
+    "news_ai_summary": "Benchmark news summary.",
+    "news_articles": [
+        {"title": f"Headline {i}", "url": "https://example.com", "source": "Bench",
+         "published_at": "2025-01-01T00:00:00Z"}
+        for i in range(4)
+    ]
+}
+
+
+def fetch_managers(customers: int, accounts: int, transactions: int, seed: int) -> Dict[str, object]:
+    """Fetch every customer's frames from a local fake Nessie"""
+    bank = SyntheticBank(accounts_per_customer=accounts, transactions_per_account=transactions, seed=seed)
+    with FakeUpstreams(bank) as upstreams:
+        os.environ.update(upstreams.env())
+        from helperFunctions.get_bank_data import BankDataManager
+        from helperFunctions.settings import get_settings
+
+        managers = {}
+        for customer_id in bank.customer_ids(customers):
+            manager = BankDataManager.from_settings(get_settings())
+            manager.fetch_customer_data(customer_id)
+            managers[customer_id] = manager
+    return managers
+
+
+def compute_in_thread(manager, customer_id: str, date_range: str):
+    import report_data
+    from generate_newsletter import generate_newsletter
+    from send_email import convert_numpy_types
+
+    # Work on a copy: the summary converts transaction dates in place
+    manager = _copy_manager(manager)
+    summary, _ = report_data.summarize_banking_data(manager, customer_id, date_range)
+    summary.update(STATIC_SECTIONS)
+    return generate_newsletter(summary), convert_numpy_types(summary)
+
+
+def compute_in_pool(pool, manager, customer_id: str, date_range: str):
+    summary, _ = pool.summarize_banking_data(manager, customer_id, date_range)
+    summary.update(STATIC_SECTIONS)
+    return pool.render_newsletter(summary)
+
+
+def _copy_manager(manager):
+    from helperFunctions.get_bank_data import BankDataManager
+
+    copy = BankDataManager(manager.api_url, manager.api_key)
+    for name in ("customers_df", "accounts_df", "transactions_df", "loans_df", "merchants_df"):
+        frame = getattr(manager, name)
+        setattr(copy, name, None if frame is None else frame.copy())
+    copy.build_customer_index()
+    return copy
+
+
+def warm_up(pool, managers: Dict[str, object], date_range: str):
+    """Start every worker process (and its imports) before timing"""
+    customer_id, manager = next(iter(managers.items()))
+    with ThreadPoolExecutor(max_workers=pool.processes) as executor:
+        list(executor.map(lambda _: compute_in_pool(pool, manager, customer_id, date_range), range(pool.processes)))
+
+
+def run(managers: Dict[str, object], workers: int, task) -> float:
+    """Run task for every customer from workers threads; returns customers per second"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(task, managers.items()))
+    return len(managers) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=32)
+    parser.add_argument("--accounts", type=int, default=3, help="Accounts per customer")
+    parser.add_argument("--transactions", type=int, default=1000, help="Transactions per account")
+    parser.add_argument("--date-range", default="30d")
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    from compute_pool import ComputePool
+
+    managers = fetch_managers(args.customers, args.accounts, args.transactions, args.seed)
+    counts: List[int] = sorted({1, *range(2, args.max_processes + 1, 2), args.max_processes})
+
+    results = []
+    for workers in counts:
+        threads = run(managers, workers, lambda item: compute_in_thread(item[1], item[0], args.date_range))
+        with ComputePool(workers) as pool:
+            warm_up(pool, managers, args.date_range)
+            processes = run(managers, workers,
+                            lambda item: compute_in_pool(pool, item[1], item[0], args.date_range))
+        results.append({"workers": workers, "threads_per_s": threads, "processes_per_s": processes})
+
+    baseline = results[0]["processes_per_s"]
+    for result in results:
+        result["process_speedup"] = result["processes_per_s"] / baseline
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.customers} customers x {args.accounts * args.transactions} transactions, "
+          f"{os.cpu_count()} cores available")
+    print(f"{'workers':>8} {'threads/s':>10} {'processes/s':>12} {'scaling':>8}")
+    for result in results:
+        print(f"{result['workers']:>8} {result['threads_per_s']:>10.1f} "
+              f"{result['processes_per_s']:>12.1f} {result['process_speedup']:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+End-to-end offline benchmark of the newsletter pipeline.
+
+Runs send_financial_newsletter (get_report_data -> generate_newsletter -> send)
+for synthetic customers against local fakes of Nessie, OpenAI, NewsAPI, Resend
+and yfinance, and reports per-stage and end-to-end latency percentiles plus
+throughput. Stage names are the tracing spans, so every span added to the
+pipeline shows up here automatically. Firestore is the in-memory emulator.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_newsletter_pipeline
+    python -m benchmarks.bench_newsletter_pipeline --customers 50 --accounts 4 --transactions 1000
+    python -m benchmarks.bench_newsletter_pipeline --latency nessie=20,openai=400 --concurrency 8
+    python -m benchmarks.bench_newsletter_pipeline --concurrency 16 --headline-batch-size 16
+    python -m benchmarks.bench_newsletter_pipeline --latency openai=400 --headline-llm-budget 5
+    python -m benchmarks.bench_newsletter_pipeline --latency openai=300,openai_token=20 --headline-streaming
+
+Baselines:
+    --save-baseline benchmarks/baselines/pipeline.json   write this run as the baseline
+    --baseline benchmarks/baselines/pipeline.json        compare against it; exits 1 when a
+                                                         stage's p95 or the throughput regresses
+                                                         by more than --tolerance
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.fake_upstreams import FakeUpstreams, StubYFinance, SyntheticBank
+from helperFunctions.firestore_emulator import InMemoryFirestore
+
+END_TO_END = "end_to_end"
+
+
+def parse_latency(spec: str) -> Dict[str, float]:
+    """Parse "upstream=ms,upstream=ms" into a dictionary"""
+    latency = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            latency[name.strip()] = float(value)
+    return latency
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """Latency statistics in milliseconds"""
+    ms = np.asarray(values) * 1000
+    return {
+        "count": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3)
+    }
+
+
+def seed_users(customer_ids: List[str]) -> InMemoryFirestore:
+    """Create an emulated Firestore with one weekly subscriber per synthetic customer"""
+    db = InMemoryFirestore()
+    for customer_id in customer_ids:
+        email = f"{customer_id}@example.com"
+        db.collection("users").document(email).set({
+            "customer_id": customer_id, "email": email, "frequency": "weekly"
+        })
+    return db
+
+
+def load_pipeline(upstreams: FakeUpstreams, yfinance_latency_ms: float, db: InMemoryFirestore):
+    """Point the pipeline at the fakes and import it"""
+    os.environ.update(upstreams.env())
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+    from helperFunctions.logging_config import configure_logging
+    configure_logging()
+
+    # get_stocks_data imports yfinance on first use, so this stands in for it
+    sys.modules["yfinance"] = StubYFinance(yfinance_latency_ms)
+
+    import resend
+    import send_email
+
+    # resend reads its base URL at import time
+    resend.api_url = os.environ["RESEND_API_URL"]
+    send_email.get_firestore_db = lambda: db
+    return send_email
+
+
+def run(args) -> Dict:
+    from helperFunctions import tracing
+    from helperFunctions.headline_batcher import HeadlineBatcher
+    from helperFunctions.headline_engine import HeadlineEngine, HeadlinePolicy
+    from helperFunctions.settings import get_settings
+
+    bank = SyntheticBank(args.accounts, args.transactions, args.merchants, seed=args.seed)
+    latency = parse_latency(args.latency)
+
+    with FakeUpstreams(bank, latency) as upstreams:
+        customer_ids = bank.customer_ids(args.customers)
+        send_email = load_pipeline(upstreams, latency.get("yfinance", 0), seed_users(customer_ids))
+        headline_batcher = HeadlineBatcher(args.headline_batch_size) if args.headline_batch_size > 1 else None
+        headline_policy = HeadlinePolicy(llm_budget=args.headline_llm_budget or None)
+        settings = replace(get_settings(), headline_streaming=args.headline_streaming,
+                           headline_first_token_ms=args.first_token_ms)
+        headline_engine = HeadlineEngine(headline_policy, headline_batcher, settings)
+
+        def send_one(customer_id: str) -> Dict[str, List[float]]:
+            with tracing.run_trace() as trace:
+                start = time.perf_counter()
+                send_email.send_financial_newsletter(customer_id, args.date_range, f"{customer_id}@example.com",
+                                                     headline_engine=headline_engine)
+                trace.record(END_TO_END, time.perf_counter() - start)
+            return trace.durations()
+
+        for customer_id in customer_ids[:args.warmup]:
+            send_one(customer_id)
+        # Warm-up headlines don't count against the measured run's budget
+        headline_policy.llm_used = 0
+
+        stages: Dict[str, List[float]] = {}
+        chat_requests_before = upstreams.chat_requests
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for durations in pool.map(send_one, customer_ids):
+                for name, values in durations.items():
+                    stages.setdefault(name, []).extend(values)
+        wall_seconds = time.perf_counter() - wall_start
+        chat_requests = upstreams.chat_requests - chat_requests_before
+
+    return {
+        "config": {
+            "customers": args.customers,
+            "accounts": args.accounts,
+            "transactions": args.transactions,
+            "merchants": args.merchants,
+            "concurrency": args.concurrency,
+            "headline_batch_size": args.headline_batch_size,
+            "headline_llm_budget": args.headline_llm_budget,
+            "headline_streaming": args.headline_streaming,
+            "first_token_ms": args.first_token_ms,
+            "date_range": args.date_range,
+            "latency_ms": latency
+        },
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_per_second": round(args.customers / wall_seconds, 3),
+        "openai_requests": chat_requests,
+        "stages": {name: percentiles(values) for name, values in sorted(stages.items())}
+    }
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float, min_delta_ms: float) -> List[str]:
+    """Describe every stage whose p95, and the throughput, regressed beyond tolerance"""
+    regressions = []
+    if report["config"] != baseline.get("config"):
+        print("warning: run configuration differs from the baseline's", file=sys.stderr)
+
+    for name, base in baseline.get("stages", {}).items():
+        current = report["stages"].get(name)
+        if current is None:
+            continue
+        limit = base["p95_ms"] * (1 + tolerance)
+        if current["p95_ms"] > limit and current["p95_ms"] - base["p95_ms"] > min_delta_ms:
+            regressions.append(f"{name}: p95 {current['p95_ms']:.2f}ms vs baseline {base['p95_ms']:.2f}ms")
+
+    base_throughput = baseline.get("throughput_per_second")
+    if base_throughput and report["throughput_per_second"] < base_throughput / (1 + tolerance):
+        regressions.append(
+            f"throughput: {report['throughput_per_second']:.2f}/s vs baseline {base_throughput:.2f}/s"
+        )
+    return regressions
+
+
+def print_report(report: Dict):
+    print(f"{'stage':<36}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'max ms':>11}")
+    for name, stats in report["stages"].items():
+        print(f"{name:<36}{stats['count']:>7}{stats['p50_ms']:>11.2f}{stats['p95_ms']:>11.2f}"
+              f"{stats['p99_ms']:>11.2f}{stats['max_ms']:>11.2f}")
+    print(f"\n{report['config']['customers']} newsletters in {report['wall_seconds']:.2f}s "
+          f"({report['throughput_per_second']:.2f}/s), {report.get('openai_requests', 0)} OpenAI requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=20)
+    parser.add_argument("--accounts", type=int, default=3, help="Accounts per customer")
+    parser.add_argument("--transactions", type=int, default=200, help="Transactions per account")
+    parser.add_argument("--merchants", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--headline-batch-size", type=int, default=1,
+                        help="Batch headline prompts across customers (needs --concurrency at least as large)")
+    parser.add_argument("--headline-llm-budget", type=int, default=0,
+                        help="Most LLM headlines in the run; the rest use the template (0: no limit)")
+    parser.add_argument("--headline-streaming", action="store_true",
+                        help="Stream unbatched headlines and stop after three sentences")
+    parser.add_argument("--first-token-ms", type=int, default=3000,
+                        help="First-token deadline for streamed headlines (0: none)")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs before measuring")
+    parser.add_argument("--date-range", default="30d")
+    parser.add_argument("--latency", default="", help='Artificial upstream latency, e.g. "nessie=20,openai=400"')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--baseline", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="Ignore p95 increases smaller than this, to absorb timer noise")
+    args = parser.parse_args()
+    if args.headline_batch_size > args.concurrency:
+        parser.error("--headline-batch-size must not be larger than --concurrency")
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
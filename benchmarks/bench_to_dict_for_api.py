@@ -0,0 +1,142 @@
+"""
+Benchmark BankDataManager.to_dict_for_api against the previous row-by-row
+implementation on synthetic customers.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_to_dict_for_api
+    python -m benchmarks.bench_to_dict_for_api --sizes 10 1000 100000 --repeat 3
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from helperFunctions.get_bank_data import BankDataManager
+
+TRANSACTION_TYPES = ["deposit", "withdrawal", "transfer", "purchase"]
+
+
+def build_manager(num_transactions: int, num_accounts: int = 5, seed: int = 0) -> BankDataManager:
+    """Create a BankDataManager populated with synthetic frames for one customer"""
+    rng = np.random.default_rng(seed)
+    customer_id = "customer-0"
+    manager = BankDataManager("http://localhost", "unused")
+
+    manager.customers_df = pd.DataFrame([{
+        "customer_id": customer_id, "first_name": "Bench", "last_name": "Mark",
+        "street_number": "1", "street_name": "Main", "city": "Town", "state": "CA", "zip": "94105"
+    }])
+
+    account_ids = [f"account-{i}" for i in range(num_accounts)]
+    manager.accounts_df = pd.DataFrame({
+        "account_id": account_ids,
+        "customer_id": customer_id,
+        "type": "Checking",
+        "nickname": [f"Account {i}" for i in range(num_accounts)],
+        "rewards": rng.integers(0, 10000, num_accounts),
+        "balance": rng.integers(1000, 50000, num_accounts),
+        "account_number": "0000000000000000"
+    })
+
+    tx_types = rng.choice(TRANSACTION_TYPES, num_transactions)
+    dates = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 90, num_transactions), unit="D")
+    manager.transactions_df = pd.DataFrame({
+        "transaction_id": [f"tx-{i}" for i in range(num_transactions)],
+        "account_id": rng.choice(account_ids, num_transactions),
+        "transaction_type": tx_types,
+        "amount": rng.uniform(5, 1000, num_transactions).round(2),
+        "description": rng.choice(["Dining", "Salary deposit", "ATM withdrawal", "Monthly transfer"], num_transactions),
+        "transaction_date": dates.strftime("%Y-%m-%d"),
+        "status": "completed",
+        "medium": "balance",
+        "payee_id": np.where(tx_types == "deposit", "payee", None),
+        "merchant_id": np.where(tx_types == "purchase", "merchant", None),
+        "payer_id": np.where(tx_types == "deposit", None, "payer")
+    })
+
+    manager.loans_df = pd.DataFrame({
+        "loan_id": [f"loan-{i}" for i in range(num_accounts)],
+        "account_id": account_ids,
+        "type": "home",
+        "status": rng.choice(["pending", "completed"], num_accounts),
+        "credit_score": rng.integers(300, 780, num_accounts),
+        "monthly_payment": rng.integers(100, 2000, num_accounts),
+        "amount": rng.integers(1000, 50000, num_accounts),
+        "description": "Home renovation",
+        "creation_date": "2025-01-01"
+    })
+    return manager
+
+
+def legacy_to_dict_for_api(manager: BankDataManager, customer_id: str) -> dict:
+    """The previous implementation: per-account filtering and per-row to_json round trips"""
+    customer_info = manager.customers_df[manager.customers_df['customer_id'] == customer_id]
+    customer_data = json.loads(customer_info.iloc[0].to_json())
+
+    accounts = manager.accounts_df[manager.accounts_df['customer_id'] == customer_id]
+    if not accounts.empty:
+        accounts_list = []
+        for _, account in accounts.iterrows():
+            account_id = account['account_id']
+            account_data = json.loads(account.to_json())
+            if manager.transactions_df is not None and not manager.transactions_df.empty:
+                account_transactions = manager.transactions_df[manager.transactions_df['account_id'] == account_id]
+                if not account_transactions.empty:
+                    transactions_by_type = {}
+                    for tx_type, group in account_transactions.groupby('transaction_type'):
+                        transactions_by_type[tx_type] = [json.loads(tx.to_json()) for _, tx in group.iterrows()]
+                    account_data['transactions'] = transactions_by_type
+            if manager.loans_df is not None and not manager.loans_df.empty:
+                account_loans = manager.loans_df[manager.loans_df['account_id'] == account_id]
+                if not account_loans.empty:
+                    account_data['loans'] = [json.loads(loan.to_json()) for _, loan in account_loans.iterrows()]
+            accounts_list.append(account_data)
+        customer_data['accounts'] = accounts_list
+
+    customer_data['net_worth'] = float(manager.calculate_customer_net_worth(customer_id))
+    customer_data['total_debt'] = float(manager.calculate_total_debt(customer_id))
+
+    transaction_summary = manager.get_transaction_summary(customer_id)
+    if not transaction_summary.empty:
+        customer_data['transaction_summary'] = [
+            json.loads(summary.to_json()) for _, summary in transaction_summary.iterrows()
+        ]
+    return customer_data
+
+
+def time_call(func, repeat: int) -> float:
+    """Return the best wall-clock time of repeat calls, in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000],
+                        help="Transaction counts per customer")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    print(f"{'transactions':>12} {'legacy ms':>12} {'current ms':>12} {'speedup':>9}")
+    for size in args.sizes:
+        manager = build_manager(size)
+        customer_id = "customer-0"
+
+        expected = legacy_to_dict_for_api(manager, customer_id)
+        actual = manager.to_dict_for_api(customer_id)
+        if expected != actual:
+            raise SystemExit(f"Output mismatch for {size} transactions")
+
+        legacy_ms = time_call(lambda: legacy_to_dict_for_api(manager, customer_id), args.repeat)
+        current_ms = time_call(lambda: manager.to_dict_for_api(customer_id), args.repeat)
+        print(f"{size:>12} {legacy_ms:>12.1f} {current_ms:>12.1f} {legacy_ms / current_ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Local stand-ins for every upstream the newsletter pipeline talks to.
+
+FakeUpstreams serves a synthetic Nessie API, an OpenAI-compatible chat
+completions endpoint, NewsAPI top headlines and the Resend emails endpoint
+from one threaded HTTP server on localhost. StubYFinance replaces the yfinance
+module, which has no configurable base URL.
+
+Each upstream can be given an artificial latency so benchmarks can model
+slow dependencies as well as measure the pipeline's own overhead.
+"""
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+NESSIE_PREFIX = "/nessie"
+OPENAI_PREFIX = "/openai/v1"
+NEWSAPI_PREFIX = "/newsapi/v2/top-headlines"
+RESEND_PREFIX = "/resend"
+
+MERCHANT_CATEGORIES = ["Food", "Retail", "Travel", "Entertainment", "Utilities", "Health"]
+TRANSACTION_TYPES = ["deposits", "withdrawals", "transfers", "purchases"]
+
+
+class SyntheticBank:
+    """
+    Deterministic synthetic Nessie data.
+
+    Customers are named bench-<n>; each has accounts_per_customer accounts and
+    each account transactions_per_account transactions spread over the last
+    90 days and split across the four transaction types.
+    """
+
+    def __init__(self, accounts_per_customer: int = 3, transactions_per_account: int = 200,
+                 num_merchants: int = 50, seed: int = 0):
+        self.accounts_per_customer = accounts_per_customer
+        self.transactions_per_account = transactions_per_account
+        self.seed = seed
+        self.today = datetime.now()
+        self.merchants = [
+            {
+                "_id": f"bench-merchant-{i}",
+                "name": f"Merchant {i}",
+                "category": MERCHANT_CATEGORIES[i % len(MERCHANT_CATEGORIES)],
+                "address": {"street_number": str(i), "street_name": "Market St",
+                            "city": "San Francisco", "state": "CA", "zip": "94105"},
+                "geocode": {"lat": 37.77, "lng": -122.41}
+            }
+            for i in range(num_merchants)
+        ]
+        self._merchants_by_id = {merchant["_id"]: merchant for merchant in self.merchants}
+        self._cache: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def customer_ids(self, count: int) -> List[str]:
+        return [f"bench-{i}" for i in range(count)]
+
+    def _account_ids(self, customer_id: str) -> List[str]:
+        return [f"{customer_id}-acct-{i}" for i in range(self.accounts_per_customer)]
+
+    def _rng(self, key: str) -> random.Random:
+        return random.Random(f"{self.seed}:{key}")
+
+    def _transactions(self, account_id: str, tx_type: str) -> List[Dict]:
+        rng = self._rng(f"{account_id}:{tx_type}")
+        count = self.transactions_per_account // len(TRANSACTION_TYPES)
+        date_field = "purchase_date" if tx_type == "purchases" else "transaction_date"
+        records = []
+        for i in range(count):
+            record = {
+                "_id": f"{account_id}-{tx_type}-{i}",
+                "amount": round(rng.uniform(5, 500), 2),
+                "description": rng.choice(["Dining", "Groceries", "Salary", "Rent", "Coffee"]),
+                date_field: (self.today - timedelta(days=rng.randint(0, 89))).strftime("%Y-%m-%d"),
+                "status": "completed",
+                "medium": "balance"
+            }
+            if tx_type == "purchases":
+                record["merchant_id"] = rng.choice(self.merchants)["_id"]
+                record["payer_id"] = account_id
+            elif tx_type == "deposits":
+                record["payee_id"] = account_id
+            else:
+                record["payer_id"] = account_id
+                record["payee_id"] = f"{account_id}-external"
+            records.append(record)
+        return records
+
+    def _resolve(self, path: str) -> Optional[object]:
+        parts = path.strip("/").split("/")
+        if parts == ["merchants"]:
+            return self.merchants
+        if len(parts) == 2 and parts[0] == "merchants":
+            return self._merchants_by_id.get(parts[1])
+        if len(parts) == 2 and parts[0] == "customers":
+            rng = self._rng(parts[1])
+            return {
+                "_id": parts[1],
+                "first_name": rng.choice(["Ada", "Grace", "Alan", "Edsger"]),
+                "last_name": rng.choice(["Lovelace", "Hopper", "Turing", "Dijkstra"]),
+                "address": {"street_number": "1", "street_name": "Main St",
+                            "city": "Springfield", "state": "IL", "zip": "62701"}
+            }
+        if len(parts) == 3 and parts[0] == "customers" and parts[2] == "accounts":
+            rng = self._rng(f"{parts[1]}:accounts")
+            return [
+                {
+                    "_id": account_id,
+                    "customer_id": parts[1],
+                    "type": rng.choice(["Checking", "Savings", "Credit Card"]),
+                    "nickname": f"Account {i}",
+                    "rewards": rng.randint(0, 10000),
+                    "balance": rng.randint(100, 50000),
+                    "account_number": f"{rng.randint(0, 10 ** 16 - 1):016d}"
+                }
+                for i, account_id in enumerate(self._account_ids(parts[1]))
+            ]
+        if len(parts) == 3 and parts[0] == "accounts":
+            if parts[2] in TRANSACTION_TYPES:
+                return self._transactions(parts[1], parts[2])
+            if parts[2] == "loans":
+                rng = self._rng(f"{parts[1]}:loans")
+                if rng.random() < 0.5:
+                    return []
+                return [{
+                    "_id": f"{parts[1]}-loan",
+                    "type": rng.choice(["home", "auto", "small business"]),
+                    "status": "approved",
+                    "credit_score": rng.randint(550, 800),
+                    "monthly_payment": round(rng.uniform(100, 2000), 2),
+                    "amount": rng.randint(1000, 300000),
+                    "description": "Bench loan",
+                    "creation_date": (self.today - timedelta(days=365)).strftime("%Y-%m-%d")
+                }]
+        return None
+
+    def payload(self, path: str) -> Optional[bytes]:
+        """JSON body for a Nessie path, or None when the path is unknown"""
+        with self._lock:
+            if path in self._cache:
+                return self._cache[path]
+        value = self._resolve(path)
+        if value is None:
+            return None
+        body = json.dumps(value).encode()
+        with self._lock:
+            self._cache[path] = body
+        return body
+
+
+def _chat_completion(content: str, request: Dict) -> bytes:
+    # Roughly four characters per token, so prompt size changes show up in the usage
+    prompt_tokens = sum(len(message.get("content", "")) for message in request.get("messages", [])) // 4
+    completion_tokens = len(content) // 4
+    return json.dumps({
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "gpt-3.5-turbo",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens}
+    }).encode()
+
+
+# Longer than a headline needs, so streamed requests have something to cut off
+CHAT_ANSWER = ("Your finances are on track this month. Spending held steady against last month. "
+               "Deposits covered every bill with room to spare. Keep an eye on dining out, "
+               "which is creeping up, and consider moving the surplus into savings.")
+
+
+def _chat_chunk(content: str, finish_reason: Optional[str] = None) -> bytes:
+    return b"data: " + json.dumps({
+        "id": "chatcmpl-bench",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "gpt-3.5-turbo",
+        "choices": [{"index": 0, "delta": {"content": content} if content else {}, "finish_reason": finish_reason}]
+    }).encode() + b"\n\n"
+
+
+def _chat_answer(request: Dict) -> str:
+    """A fixed answer, or one answer per item for batched JSON-mode requests"""
+    if (request.get("response_format") or {}).get("type") == "json_object":
+        items = json.loads(request["messages"][-1]["content"])
+        return json.dumps({"results": [
+            {"id": item["id"], "text": CHAT_ANSWER} for item in items
+        ]})
+    return CHAT_ANSWER
+
+
+def _news_headlines(count: int = 10) -> bytes:
+    return json.dumps({
+        "status": "ok",
+        "totalResults": count,
+        "articles": [
+            {
+                "source": {"id": None, "name": f"Bench Wire {i}"},
+                "title": f"Markets move on benchmark headline {i}",
+                "url": f"https://example.com/news/{i}",
+                "publishedAt": "2025-01-01T00:00:00Z"
+            }
+            for i in range(count)
+        ]
+    }).encode()
+
+
+class FakeUpstreams:
+    """
+    Threaded localhost server for Nessie, OpenAI, NewsAPI and Resend.
+
+    Parameters:
+    - bank: SyntheticBank serving the Nessie endpoints
+    - latency_ms: Optional artificial latency per upstream, keyed by
+      "nessie", "openai", "newsapi" and "resend"; "openai_token" adds a delay
+      per generated word, so full completions take longer than cut-off streams
+    """
+
+    def __init__(self, bank: SyntheticBank, latency_ms: Dict[str, float] = None):
+        self.bank = bank
+        self.latency_ms = latency_ms or {}
+        self.emails_sent = 0
+        self.chat_requests = 0
+        # Handlers run on ThreadingHTTPServer threads
+        self._counter_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment variables that point the pipeline at this server"""
+        return {
+            "NESSIE_API_URL": self.base_url + NESSIE_PREFIX,
+            "NESSIE_API_KEY": "bench",
+            "OPENAI_BASE_URL": self.base_url + OPENAI_PREFIX,
+            "OPEN_AI_API_KEY": "bench",
+            "NEWS_API_URL": self.base_url + NEWSAPI_PREFIX,
+            "NEWS_API_KEY": "bench",
+            "RESEND_API_URL": self.base_url + RESEND_PREFIX,
+            "RESEND_API_KEY": "bench"
+        }
+
+    def _delay(self, upstream: str):
+        delay = self.latency_ms.get(upstream, 0)
+        if delay:
+            time.sleep(delay / 1000)
+
+    def _make_handler(self):
+        upstreams = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status: int, body: bytes = b"{}"):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, content: str):
+                # Server-sent events, one chunk per word, ended by closing the connection
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                try:
+                    for word in content.split(" "):
+                        upstreams._delay("openai_token")
+                        self.wfile.write(_chat_chunk(word + " "))
+                        self.wfile.flush()
+                    self.wfile.write(_chat_chunk("", "stop") + b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading early
+                    pass
+
+            def _read_body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if path.startswith(NESSIE_PREFIX):
+                    upstreams._delay("nessie")
+                    body = upstreams.bank.payload(path[len(NESSIE_PREFIX):])
+                    if body is None:
+                        self._reply(404)
+                    else:
+                        self._reply(200, body)
+                elif path.startswith(NEWSAPI_PREFIX):
+                    upstreams._delay("newsapi")
+                    self._reply(200, _news_headlines())
+                else:
+                    self._reply(404)
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                body = self._read_body()
+                if path == OPENAI_PREFIX + "/chat/completions":
+                    upstreams._delay("openai")
+                    with upstreams._counter_lock:
+                        upstreams.chat_requests += 1
+                    request = json.loads(body or b"{}")
+                    answer = _chat_answer(request)
+                    if request.get("stream"):
+                        self._stream(answer)
+                        return
+                    for _ in answer.split(" "):
+                        upstreams._delay("openai_token")
+                    self._reply(200, _chat_completion(answer, request))
+                elif path == RESEND_PREFIX + "/emails":
+                    upstreams._delay("resend")
+                    with upstreams._counter_lock:
+                        upstreams.emails_sent += 1
+                        email_id = f"email-{upstreams.emails_sent}"
+                    self._reply(200, json.dumps({"id": email_id}).encode())
+                else:
+                    self._reply(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeUpstreams":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeUpstreams":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class StubTicker:
+    def __init__(self, symbol: str, latency_ms: float):
+        self.symbol = symbol
+        self.latency_ms = latency_ms
+
+    def history(self, period: str = "2d", interval: str = "1h") -> pd.DataFrame:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        index = pd.date_range(end=datetime.now(), periods=16, freq="h")
+        close = np.linspace(100, 101, len(index)) * (1 + len(self.symbol))
+        return pd.DataFrame({"Close": close}, index=index)
+
+
+class StubYFinance:
+    """Drop-in for the yfinance module as used by get_stocks_data"""
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency_ms = latency_ms
+
+    def Ticker(self, symbol: str) -> StubTicker:
+        return StubTicker(symbol, self.latency_ms)
@@ -0,0 +1,80 @@
+"""
+Cold-start import profile.
+
+Imports a module in a fresh interpreter under `python -X importtime`, writes
+the raw report to a file (to keep as a CI artifact) and prints the slowest
+imports by cumulative and self time.
+
+Usage (from the repository root):
+    python -m benchmarks.import_profile
+    python -m benchmarks.import_profile --module send_email --top 30
+    python -m benchmarks.import_profile --output importtime.txt --budget-ms 1500
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import List, Tuple
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def profile_imports(module: str) -> Tuple[str, List[Tuple[str, int, int, int]]]:
+    """
+    Import a module in a subprocess with -X importtime.
+
+    Returns:
+    Tuple of (raw report, list of (name, self_us, cumulative_us, depth))
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=os.environ.copy()
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+
+    entries = []
+    for line in completed.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return completed.stderr, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--output", default="importtime.txt", help="Where to write the raw -X importtime report")
+    parser.add_argument("--budget-ms", type=float, help="Exit 1 if importing the module takes longer than this")
+    args = parser.parse_args()
+
+    raw, entries = profile_imports(args.module)
+    with open(args.output, "w") as f:
+        f.write(raw)
+
+    total_us = next((cumulative for name, _, cumulative, depth in entries
+                     if name == args.module and depth == 0), 0)
+
+    print(f"Slowest imports by cumulative time (top-level packages of {args.module}):")
+    top_level = sorted((entry for entry in entries if entry[3] <= 1 and entry[0] != args.module),
+                       key=lambda entry: entry[2], reverse=True)
+    for name, _, cumulative_us, _ in top_level[:args.top]:
+        print(f"  {cumulative_us / 1000:>9.1f} ms  {name}")
+
+    print("\nSlowest individual modules by self time:")
+    for name, self_us, _, _ in sorted(entries, key=lambda entry: entry[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:>9.1f} ms  {name}")
+
+    print(f"\nimport {args.module}: {total_us / 1000:.1f} ms (raw report written to {args.output})")
+    if args.budget_ms is not None and total_us / 1000 > args.budget_ms:
+        print(f"Import time exceeds the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
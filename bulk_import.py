@@ -0,0 +1,395 @@
+"""
+Bulk user import.
+
+An upload of users (CSV with a header row, or JSON Lines with either flat
+address fields or a nested "address" object) is parsed into a DataFrame and
+validated and normalized in one vectorized pass, with the same state and zip
+formatting as /register. Rows that fail validation, duplicate an earlier row
+or belong to an existing user are reported rather than imported.
+
+The import then runs as a job in the background:
+1. Nessie customers are created by BULK_IMPORT_WORKERS threads, started at
+   most BULK_IMPORT_RATE per second; each user document is created (only if
+   there is none yet) as soon as its Nessie customer exists. Each user is
+   created under the same single-flight key as /register, so a registration
+   or another upload racing on the same email never creates a second Nessie
+   customer or overwrites the document
+2. each new customer's accounts are seeded and their welcome newsletter sent,
+   again by BULK_IMPORT_WORKERS threads
+
+Progress is stored in the bulk_import_jobs collection under the job ID, every
+few seconds and when the job finishes. Jobs run in the process that accepted
+the upload; a job whose process stops stays "running".
+"""
+import io
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from google.api_core.exceptions import Conflict
+
+import send_email
+from helperFunctions import resilience, tracing
+from helperFunctions.create_account_transactions import populate_and_create_all_accounts_with_transactions
+from helperFunctions.settings import Settings, get_settings
+from helperFunctions.single_flight import single_flight
+from helperFunctions.user_repository import USERS_COLLECTION, UserRecord, UserRepository
+from helperFunctions.work_queue import process_stream
+
+logger = logging.getLogger(__name__)
+
+JOBS_COLLECTION = "bulk_import_jobs"
+
+REQUIRED_COLUMNS = ["email", "first_name", "last_name", "frequency"]
+ADDRESS_COLUMNS = ["street_number", "street_name", "city", "state", "zip"]
+FREQUENCIES = ("weekly", "monthly")
+
+# Used for users without any address, as in /register
+DEFAULT_ADDRESS = {
+    "street_number": "123",
+    "street_name": "Main Street",
+    "city": "San Francisco",
+    "state": "CA",
+    "zip": "94105"
+}
+
+EMAIL_PATTERN = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+WELCOME_DATE_RANGE = "30d"
+# Rejected rows and failures kept in the job document
+MAX_RECORDED_ERRORS = 100
+PROGRESS_INTERVAL = 2.0
+
+
+class BulkImportError(ValueError):
+    """Raised when an upload cannot be parsed or lacks required columns"""
+
+
+def format_from_content_type(content_type: Optional[str]) -> str:
+    """ "csv" or "jsonl" for an upload's Content-Type (CSV unless it names JSON)"""
+    return "jsonl" if content_type and "json" in content_type.lower() else "csv"
+
+
+def parse_upload(body: bytes, format: str) -> pd.DataFrame:
+    """
+    Parse an uploaded user list into a DataFrame of strings.
+
+    Parameters:
+    - body: The raw upload
+    - format: "csv" or "jsonl"
+
+    Raises:
+    BulkImportError if the upload cannot be parsed
+    """
+    if format == "csv":
+        try:
+            return pd.read_csv(io.BytesIO(body), dtype=str, keep_default_na=False)
+        except (ValueError, pd.errors.ParserError) as e:
+            raise BulkImportError(f"Could not parse CSV: {e}")
+    if format != "jsonl":
+        raise BulkImportError(f"Unsupported format: {format}")
+
+    records = []
+    for number, line in enumerate(body.decode("utf-8", errors="replace").splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise BulkImportError(f"Line {number} is not valid JSON: {e}")
+        if not isinstance(record, dict):
+            raise BulkImportError(f"Line {number} is not a JSON object")
+        records.append(record)
+    frame = pd.json_normalize(records) if records else pd.DataFrame()
+    return frame.rename(columns=lambda column: column[len("address."):] if column.startswith("address.") else column)
+
+
+def normalize_users(frame: pd.DataFrame) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """
+    Validate and normalize users column by column.
+
+    Values are stripped, frequencies lower-cased, users without any address
+    get the default one, states are cut to two upper-case letters ("CA" if
+    shorter) and zips to five digits (zero-padded if shorter).
+
+    Returns:
+    Tuple of the valid users (the required and address columns only) and the
+    rejected rows, each with its 1-based row number, email and reason
+
+    Raises:
+    BulkImportError if a required column is missing
+    """
+    missing = [column for column in REQUIRED_COLUMNS if column not in frame.columns]
+    if missing:
+        raise BulkImportError(f"Missing required columns: {', '.join(missing)}")
+
+    frame = frame.reindex(columns=REQUIRED_COLUMNS + ADDRESS_COLUMNS).fillna("").astype(str)
+    frame = frame.apply(lambda column: column.str.strip())
+    frame["frequency"] = frame["frequency"].str.lower()
+
+    no_address = (frame[ADDRESS_COLUMNS] == "").all(axis=1)
+    for column, value in DEFAULT_ADDRESS.items():
+        frame.loc[no_address, column] = value
+
+    state = frame["state"].str.upper().str[:2]
+    frame["state"] = state.where(state.str.len() == 2, "CA")
+    frame["zip"] = frame["zip"].str.replace(r"\D", "", regex=True).str.zfill(5).str[:5]
+
+    reasons = np.select(
+        [
+            ~frame["email"].str.match(EMAIL_PATTERN),
+            (frame["first_name"] == "") | (frame["last_name"] == ""),
+            ~frame["frequency"].isin(FREQUENCIES),
+            frame["email"].duplicated()
+        ],
+        [
+            "invalid email",
+            "missing first or last name",
+            f"frequency must be one of {', '.join(FREQUENCIES)}",
+            "duplicate of an earlier row"
+        ],
+        default=""
+    )
+    rejected_mask = reasons != ""
+    rejected = [
+        {"row": int(position) + 1, "email": email, "reason": reason}
+        for position, email, reason in zip(np.flatnonzero(rejected_mask),
+                                           frame["email"].to_numpy()[rejected_mask],
+                                           reasons[rejected_mask])
+    ]
+    return frame[~rejected_mask].reset_index(drop=True), rejected
+
+
+def create_nessie_customer(user: Dict[str, str], settings: Settings) -> str:
+    """
+    Create a Nessie customer for a normalized user.
+
+    Returns:
+    The new customer ID
+
+    Raises:
+    requests.exceptions.RequestException if Nessie rejects or fails the request,
+    ValueError if the response has no customer ID
+    """
+    payload = {
+        "first_name": user["first_name"],
+        "last_name": user["last_name"],
+        "address": {column: user[column] for column in ADDRESS_COLUMNS}
+    }
+    response = tracing.traced_request(
+        "POST",
+        f"{settings.nessie_api_url}/customers?key={settings.nessie_api_key}",
+        "nessie",
+        data=json.dumps(payload),
+        headers={"Content-Type": "application/json", "Accept": "application/json"}
+    )
+    response.raise_for_status()
+    customer_id = response.json().get("objectCreated", {}).get("_id")
+    if not customer_id:
+        raise ValueError(f"No customer ID in Nessie response: {response.text[:200]}")
+    return customer_id
+
+
+class ImportJob:
+    """One bulk import: its users, progress and the Firestore document that reports it"""
+
+    def __init__(self, db, users: pd.DataFrame, rejected: List[Dict[str, Any]],
+                 seed_accounts: bool = True, send_welcome: bool = True, settings: Settings = None):
+        """
+        Parameters:
+        - db: Firestore client
+        - users: Valid users from normalize_users
+        - rejected: Rejected rows from normalize_users
+        - seed_accounts: Seed accounts and transactions for every new customer
+        - send_welcome: Send every new user their first newsletter
+        - settings: Optional settings; defaults to the ones loaded at startup
+        """
+        self.db = db
+        self.users = users
+        self.seed_accounts = seed_accounts
+        self.send_welcome = send_welcome
+        self.settings = settings or get_settings()
+        self.job_id = f"bulk_import_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        self.reference = db.collection(JOBS_COLLECTION).document(self.job_id)
+        self.progress = {
+            "job_id": self.job_id,
+            "status": "queued",
+            "created_at": datetime.now().isoformat(),
+            "rows": len(users) + len(rejected),
+            "rejected": len(rejected),
+            "skipped_existing": 0,
+            "customers_created": 0,
+            "customers_failed": 0,
+            "accounts_seeded": 0,
+            "welcome_emails_sent": 0,
+            "onboarding_failed": 0,
+            "errors": rejected[:MAX_RECORDED_ERRORS]
+        }
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return json.loads(json.dumps(self.progress))
+
+    def save(self, force: bool = True):
+        """Write the progress document (at most every PROGRESS_INTERVAL seconds unless forced)"""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._saved_at < PROGRESS_INTERVAL:
+                return
+            self._saved_at = now
+            self.progress["updated_at"] = datetime.now().isoformat()
+            document = json.loads(json.dumps(self.progress))
+        try:
+            self.reference.set(document)
+        except Exception as e:
+            logger.error("Failed to store progress of %s: %s", self.job_id, e)
+
+    def _count(self, field: str, error: Dict[str, Any] = None):
+        with self._lock:
+            self.progress[field] += 1
+            if error is not None and len(self.progress["errors"]) < MAX_RECORDED_ERRORS:
+                self.progress["errors"].append(error)
+        self.save(force=False)
+
+    def _set_status(self, status: str):
+        with self._lock:
+            self.progress["status"] = status
+        self.save()
+
+    def run(self):
+        """Create, store and onboard every user; failures are recorded on the job rather than raised"""
+        with tracing.run_trace() as trace:
+            try:
+                repository = UserRepository(self.db)
+                created = self._create_customers(repository)
+                if self.seed_accounts or self.send_welcome:
+                    self._set_status("onboarding")
+                    process_stream(created, lambda user: self._onboard(user, repository),
+                                   workers=self.settings.bulk_import_workers)
+                    with tracing.span("firestore.flush_newsletter_data"):
+                        repository.flush()
+                status = "completed"
+            except Exception as e:
+                logger.exception("Bulk import %s failed", self.job_id)
+                with self._lock:
+                    self.progress["error"] = str(e)
+                status = "failed"
+            with self._lock:
+                self.progress["finished_at"] = datetime.now().isoformat()
+                self.progress["timings"] = trace.summary()
+            self._set_status(status)
+
+    def _create_customers(self, repository: UserRepository) -> List[UserRecord]:
+        emails = self.users["email"].tolist()
+        with tracing.span("bulk_import.find_existing"):
+            existing = repository.existing_ids(emails)
+        with self._lock:
+            self.progress["skipped_existing"] = len(existing)
+        self._set_status("creating_customers")
+
+        rate_limiter = resilience.RateLimiter(self.settings.bulk_import_rate)
+        created: List[UserRecord] = []
+        created_lock = threading.Lock()
+
+        def create(user: Dict[str, str]):
+            records = []
+
+            def create_once() -> Dict[str, Any]:
+                # Checked again under the flight: a /register may have created the user since
+                if self.db.collection(USERS_COLLECTION).document(user["email"]).get().exists:
+                    return {"status": "success", "message": "Customer already created"}
+                rate_limiter.acquire()
+                with tracing.span("bulk_import.create_customer"):
+                    customer_id = create_nessie_customer(user, self.settings)
+                data = {
+                    "customer_id": customer_id,
+                    "email": user["email"],
+                    "frequency": user["frequency"],
+                    "first_name": user["first_name"],
+                    "last_name": user["last_name"],
+                    "address": {column: user[column] for column in ADDRESS_COLUMNS}
+                }
+                with tracing.span("firestore.create_user"):
+                    try:
+                        records.append(repository.create(user["email"], data))
+                    except Conflict:
+                        # Written by a caller that gave up waiting for this flight
+                        logger.warning("User %s was created concurrently; Nessie customer %s is unused",
+                                       user["email"], customer_id)
+                        return {"status": "success", "message": "Customer already created"}
+                # Same shape as the /register response, which a racing /register receives
+                return {
+                    "status": "success",
+                    "message": "Customer created and data saved to database",
+                    "capital_one_response": {"code": 201, "message": "Customer created",
+                                             "objectCreated": {"_id": customer_id}},
+                    "database_data": data
+                }
+
+            try:
+                single_flight("register", user["email"], create_once, db=self.db)
+            except Exception as e:
+                self._count("customers_failed", {"email": user["email"], "reason": f"Nessie customer: {e}"})
+                return
+            if not records:
+                # Created by a /register or another import in the meantime
+                self._count("skipped_existing")
+                return
+            with created_lock:
+                created.extend(records)
+            self._count("customers_created")
+
+        new_users = (user for user in self.users.to_dict("records") if user["email"] not in existing)
+        process_stream(new_users, create, workers=self.settings.bulk_import_workers)
+        self.save()
+        return created
+
+    def _onboard(self, user: UserRecord, repository: UserRepository):
+        try:
+            if self.seed_accounts:
+                with tracing.span("bulk_import.seed_accounts"):
+                    populate_and_create_all_accounts_with_transactions.fill_accounts_with_data(user.customer_id, db=self.db)
+                self._count("accounts_seeded")
+            if self.send_welcome:
+                with tracing.span("bulk_import.welcome_email"):
+                    send_email.send_financial_newsletter(
+                        customer_id=user.customer_id,
+                        date_range=WELCOME_DATE_RANGE,
+                        recipient_email=user.email,
+                        repository=repository,
+                        user=user
+                    )
+                self._count("welcome_emails_sent")
+        except Exception as e:
+            self._count("onboarding_failed", {"email": user.email, "reason": f"Onboarding: {e}"})
+
+
+def create_job(db, body: bytes, format: str, seed_accounts: bool = True, send_welcome: bool = True,
+               settings: Settings = None) -> ImportJob:
+    """
+    Parse and validate an upload and record a queued job for it; call run() on the job to import.
+
+    Raises:
+    BulkImportError if the upload cannot be parsed, lacks required columns or has no rows
+    """
+    frame = parse_upload(body, format)
+    if frame.empty:
+        raise BulkImportError("The upload contains no users")
+    users, rejected = normalize_users(frame)
+    job = ImportJob(db, users, rejected, seed_accounts, send_welcome, settings)
+    job.save()
+    logger.info("Queued %s: %d users, %d rejected rows", job.job_id, len(users), len(rejected))
+    return job
+
+
+def get_job_status(db, job_id: str) -> Optional[Dict[str, Any]]:
+    """The stored progress of a job, or None if there is no such job"""
+    snapshot = db.collection(JOBS_COLLECTION).document(job_id).get()
+    return snapshot.to_dict() if snapshot.exists else None
@@ -0,0 +1,145 @@
+"""
+Process pool for the CPU-bound half of the newsletter pipeline.
+
+Once network I/O is overlapped, the pandas work per customer (metrics,
+category spending, prompt building), converting the report to plain Python
+types and rendering the HTML hold the GIL, so extra dispatcher threads stop
+helping. A ComputePool runs that work in worker processes instead, while
+fetching, the OpenAI/News calls and sending stay in the calling threads.
+
+A customer's frames cross the process boundary as Arrow IPC buffers (the
+columns of the ledger schemas from ledger_export, in the frames' own dtypes
+so results match the in-process path), which are far smaller and cheaper to
+decode than pickled DataFrames.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+from helperFunctions import ledger_export
+from helperFunctions.prompt_builder import Prompt
+from helperFunctions.tracing import span
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional["ComputePool"] = None
+_pool_lock = threading.Lock()
+
+
+def frames_to_buffers(bank_manager, customer_id: str) -> Dict[str, bytes]:
+    """Serialize a customer's fetched frames as Arrow IPC buffers"""
+    tables = {}
+    for name, frame in ledger_export.ledger_frames(bank_manager, customer_id).items():
+        # Not cast to the export schema (e.g. integer balances would come back as floats)
+        columns = [column for column in ledger_export.LEDGER_SCHEMAS[name].names if column in frame.columns]
+        tables[name] = pa.Table.from_pandas(frame[columns], preserve_index=False)
+    customers = bank_manager.customers_df
+    if customers is None:
+        customers = pd.DataFrame()
+    tables["customers"] = pa.Table.from_pandas(customers, preserve_index=False)
+    return {name: ledger_export.table_to_ipc_bytes(table) for name, table in tables.items()}
+
+
+def buffers_to_bank_manager(buffers: Dict[str, bytes]):
+    """Rebuild an offline BankDataManager from frames_to_buffers() output"""
+    from helperFunctions.get_bank_data import BankDataManager
+
+    frames = {name: pa.ipc.open_stream(buffer).read_all().to_pandas() for name, buffer in buffers.items()}
+    bank_manager = BankDataManager("", "")
+    bank_manager.customers_df = frames["customers"]
+    bank_manager.accounts_df = frames["accounts"]
+    bank_manager.transactions_df = frames["transactions"]
+    bank_manager.loans_df = frames["loans"]
+    bank_manager.merchants_df = frames["merchants"]
+    bank_manager.build_customer_index()
+    return bank_manager
+
+
+def _summarize_task(buffers: Dict[str, bytes], customer_id: str, timestamp: Optional[str]) -> Tuple[Dict, Optional[str]]:
+    import report_data
+    from send_email import convert_numpy_types
+
+    bank_manager = buffers_to_bank_manager(buffers)
+    result, summary_prompt = report_data.summarize_banking_data(bank_manager, customer_id, timestamp)
+    # Plain Python types pickle far more compactly than NumPy scalars
+    return convert_numpy_types(result), summary_prompt
+
+
+def _render_task(customer_data: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    from generate_newsletter import generate_newsletter
+    from send_email import convert_numpy_types
+
+    return generate_newsletter(customer_data), convert_numpy_types(customer_data)
+
+
+def _warm_up_worker():
+    # Pay for the heavy imports once per worker rather than on its first task
+    import report_data  # noqa: F401
+    import generate_newsletter  # noqa: F401
+    import send_email  # noqa: F401
+
+
+class ComputePool:
+    """
+    Runs the compute half of the pipeline in worker processes.
+
+    Methods block the calling thread (without holding the GIL) until the
+    worker finishes, so they drop into the threaded cron dispatcher as-is.
+    """
+
+    def __init__(self, processes: int = None):
+        """
+        Parameters:
+        - processes: Number of worker processes (defaults to the core count)
+        """
+        self.processes = processes or os.cpu_count() or 1
+        # Workers are spawned rather than forked: the app already runs logging
+        # and dispatcher threads, which a forked child would inherit mid-flight
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_up_worker
+        )
+
+    def summarize_banking_data(self, bank_manager, customer_id: str,
+                               timestamp: str = None) -> Tuple[Dict[str, Any], Optional[Prompt]]:
+        """report_data.summarize_banking_data() in a worker process"""
+        with span("compute.serialize_frames"):
+            buffers = frames_to_buffers(bank_manager, customer_id)
+        with span("compute.banking_summary"):
+            return self._executor.submit(_summarize_task, buffers, customer_id, timestamp).result()
+
+    def render_newsletter(self, customer_data: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Render the newsletter HTML in a worker process.
+
+        Returns:
+        Tuple of the HTML and customer_data converted to plain Python types
+        """
+        with span("compute.render_newsletter"):
+            return self._executor.submit(_render_task, customer_data).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "ComputePool":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+def get_compute_pool() -> ComputePool:
+    """The shared pool, sized to the core count and started on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ComputePool()
+            logger.info("Started compute pool with %s processes", _pool.processes)
+        return _pool
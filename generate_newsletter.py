@@ -1,11 +1,14 @@
+import logging
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 # Try to import the real module, fall back to mock if not available
 try:
     import report_data
-    print("Using real report_data module")
+    logger.debug("Using real report_data module")
 except ImportError:
-    print("Real report_data module not found, using mock_report_data instead")
+    logger.warning("Real report_data module not found, using mock_report_data instead")
     import mock_report_data as report_data
 
 def generate_newsletter(data):
@@ -254,7 +257,49 @@ def generate_newsletter(data):
                             </table>
                         </td>
                     </tr>
-                </table>
+                </table>"""
+
+    # Spending by category section (only when merchant categories are available)
+    category_spending = data.get('category_spending', [])
+    if category_spending:
+        html += """
+                <!-- Spending by Category Section -->
+                <table width="100%" cellpadding="0" cellspacing="0" border="0" style="margin-bottom: 20px;">
+                    <tr>
+                        <td>
+                            <h2 style="color: #2ca05a; margin-top: 0; margin-bottom: 15px; font-size: 20px; border-bottom: 1px solid #2c3038; padding-bottom: 10px;">Spending by Category</h2>
+                        </td>
+                    </tr>
+                    <tr>
+                        <td>
+                            <table width="100%" cellpadding="0" cellspacing="0" border="0" style="background-color: #1a1f27; border-radius: 8px;">
+                                <tr style="background-color: #232830;">
+                                    <th align="left" style="padding: 10px; border-bottom: 1px solid #2c3038; font-weight: bold; color: #f9f9f9;">Category</th>
+                                    <th align="right" style="padding: 10px; border-bottom: 1px solid #2c3038; font-weight: bold; color: #f9f9f9;">Purchases</th>
+                                    <th align="right" style="padding: 10px; border-bottom: 1px solid #2c3038; font-weight: bold; color: #f9f9f9;">Spent</th>
+                                    <th align="right" style="padding: 10px; border-bottom: 1px solid #2c3038; font-weight: bold; color: #f9f9f9;">Change</th>
+                                </tr>"""
+
+        for category in category_spending:
+            change = category['change']
+            # Spending more than last period is shown in red, less in green
+            change_color = "#dc3545" if change > 0 else "#28a745"
+            change_text = ("+" if change > 0 else "-" if change < 0 else "") + format_currency(abs(change))
+            html += """
+                                <tr>
+                                    <td style="padding: 10px; border-bottom: 1px solid #2c3038; color: #f9f9f9;">""" + category['category'] + """</td>
+                                    <td align="right" style="padding: 10px; border-bottom: 1px solid #2c3038; color: #f9f9f9;">""" + str(category['count']) + """</td>
+                                    <td align="right" style="padding: 10px; border-bottom: 1px solid #2c3038; color: #f9f9f9;">""" + format_currency(category['amount']) + """</td>
+                                    <td align="right" style="padding: 10px; border-bottom: 1px solid #2c3038; color: """ + change_color + """;">""" + change_text + """</td>
+                                </tr>"""
+
+        html += """
+                            </table>
+                        </td>
+                    </tr>
+                </table>"""
+
+    html += """
 
                 <!-- Largest Transactions Section -->
                 <table width="100%" cellpadding="0" cellspacing="0" border="0" style="margin-bottom: 20px;">
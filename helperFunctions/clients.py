@@ -0,0 +1,55 @@
+"""
+Shared API clients, created on first use.
+
+firebase_admin and openai are slow to import, so they are only imported
+when a client is first requested rather than when the app starts.
+"""
+import json
+import logging
+import threading
+from functools import lru_cache
+
+from helperFunctions.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+_firebase_lock = threading.Lock()
+
+
+def get_firestore_db():
+    """
+    Return the Firestore client, initializing Firebase from FIREBASE_SERVICE_ACCOUNT on first use.
+
+    Returns:
+    Firestore client, or None if Firebase is not configured or fails to initialize
+    """
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    with _firebase_lock:
+        if not firebase_admin._apps:
+            service_account = get_settings().firebase_service_account
+            if not service_account:
+                logger.warning("FIREBASE_SERVICE_ACCOUNT is not set, Firestore is unavailable")
+                return None
+            try:
+                cred = credentials.Certificate(json.loads(service_account))
+                firebase_admin.initialize_app(cred)
+                logger.info("Firebase initialized with environment variables")
+            except Exception as e:
+                logger.error("Error initializing Firebase with environment variable: %s", e)
+                return None
+
+    try:
+        return firestore.client()
+    except Exception as e:
+        logger.warning("Could not get Firestore client: %s", e)
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_openai_client(api_key: str):
+    """Return a shared OpenAI client (and its connection pool) for the given key"""
+    from openai import OpenAI
+
+    return OpenAI(api_key=api_key)
@@ -1,20 +1,23 @@
 import requests
 import json
-import random
-from datetime import datetime, timedelta
-import os
-from dotenv import load_dotenv
+from helperFunctions.generation_context import GenerationContext, default_context
+from helperFunctions.settings import get_settings
+from helperFunctions.tracing import traced_request
+import logging
 
-def create_random_deposit(account_id):
+logger = logging.getLogger(__name__)
+
+def create_random_deposit(account_id, context: GenerationContext = None):
     """Create a random deposit for a specific account"""
-    load_dotenv()
+    settings = get_settings()
+    context = context or default_context()
 
     deposit_data = {
         "medium": "balance",
-        "transaction_date": (datetime.now() - timedelta(days=random.randint(1, 90))).strftime("%Y-%m-%d"),
-        "status": random.choice(["pending", "completed", "cancelled"]),
-        "amount": round(random.uniform(10, 10000), 2),
-        "description": random.choice([
+        "transaction_date": context.random_date(1, 90),
+        "status": context.random.choice(["pending", "completed", "cancelled"]),
+        "amount": round(context.random.uniform(10, 10000), 2),
+        "description": context.random.choice([
             "Salary deposit",
             "Refund",
             "Transfer from external account",
@@ -23,7 +26,7 @@ def create_random_deposit(account_id):
         ])
     }
 
-    url = f"{os.getenv('NESSIE_API_URL')}/accounts/{account_id}/deposits?key={os.getenv('NESSIE_API_KEY')}"
+    url = f"{settings.nessie_api_url}/accounts/{account_id}/deposits?key={settings.nessie_api_key}"
     # Send request
     headers = {
         "Content-Type": "application/json",
@@ -31,8 +34,10 @@ def create_random_deposit(account_id):
     }
 
     try:
-        response = requests.post(
+        response = traced_request(
+            "POST",
             url,
+            "nessie",
             data=json.dumps(deposit_data),
             headers=headers
         )
@@ -40,5 +45,5 @@ def create_random_deposit(account_id):
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
-        print(f"Error creating deposit: {str(e)}")
+        logger.warning("Error creating deposit: %s", e)
         return None
\ No newline at end of file
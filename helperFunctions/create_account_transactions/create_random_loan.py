@@ -1,20 +1,24 @@
-import os
-import random
-from dotenv import load_dotenv
+from helperFunctions.generation_context import GenerationContext, default_context
+from helperFunctions.settings import get_settings
+from helperFunctions.tracing import traced_request
 import requests
 import json
+import logging
 
-def create_random_loan(account_id):
+logger = logging.getLogger(__name__)
+
+def create_random_loan(account_id, context: GenerationContext = None):
     """Create a random loan for a specific account"""
-    load_dotenv()
+    settings = get_settings()
+    context = context or default_context()
 
     loan_data = {
         "type": "home",
         "status": "pending",
-        "credit_score": random.randint(300, 780),
-        "monthly_payment": random.randint(100, 2000),
-        "amount": random.randint(1000, 50000),
-        "description": random.choice([
+        "credit_score": context.random.randint(300, 780),
+        "monthly_payment": context.random.randint(100, 2000),
+        "amount": context.random.randint(1000, 50000),
+        "description": context.random.choice([
             "Home renovation",
             "Car purchase",
             "Education expenses",
@@ -24,7 +28,7 @@ def create_random_loan(account_id):
     }
 
     # API endpoint for creating a loan
-    url = f"{os.getenv('NESSIE_API_URL')}/accounts/{account_id}/loans?key={os.getenv('NESSIE_API_KEY')}"
+    url = f"{settings.nessie_api_url}/accounts/{account_id}/loans?key={settings.nessie_api_key}"
 
     # Send request
     headers = {
@@ -33,8 +37,10 @@ def create_random_loan(account_id):
     }
 
     try:
-        response = requests.post(
+        response = traced_request(
+            "POST",
             url,
+            "nessie",
             data=json.dumps(loan_data),
             headers=headers
         )
@@ -42,5 +48,5 @@ def create_random_loan(account_id):
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
-        print(f"Error creating loan: {str(e)}")
+        logger.warning("Error creating loan: %s", e)
         return None
\ No newline at end of file
@@ -1,20 +1,32 @@
 import requests
-from dotenv import load_dotenv
-from faker import Faker
-import random
+from helperFunctions.settings import get_settings
+from helperFunctions.tracing import traced_request
 import json
-import os
+import logging
+import threading
+from typing import List, Optional
+from helperFunctions.generation_context import GenerationContext, default_context
 
-def create_random_merchants():
-    """Create a random merchant using Faker"""
-    fake = Faker()
-    load_dotenv()
+logger = logging.getLogger(__name__)
+
+MERCHANT_CATEGORIES = [
+    "Food", "Retail", "Entertainment", "Healthcare",
+    "Transportation", "Utilities", "Education"
+]
+
+# Merchants shared by every seeded account; enough for variety across
+# accounts (5-10 merchants each) without growing the catalog per customer
+MERCHANT_POOL_SIZE = 30
+
+
+def create_random_merchants(context: GenerationContext = None):
+    """Create a random merchant using the context's Faker"""
+    context = context or default_context()
+    fake = context.faker
+    settings = get_settings()
     merchant_data = {
         "name": fake.company(),
-        "category": random.choice([
-            "Food", "Retail", "Entertainment", "Healthcare",
-            "Transportation", "Utilities", "Education"
-        ]),
+        "category": context.random.choice(MERCHANT_CATEGORIES),
         "address": {
             "street_number": fake.building_number(),
             "street_name": fake.street_name(),
@@ -29,7 +41,7 @@ def create_random_merchants():
     }
 
     # API endpoint for creating a merchant
-    url = f"{os.getenv('NESSIE_API_URL')}/merchants?key={os.getenv('NESSIE_API_KEY')}"
+    url = f"{settings.nessie_api_url}/merchants?key={settings.nessie_api_key}"
 
     headers = {
         "Content-Type": "application/json",
@@ -37,8 +49,10 @@ def create_random_merchants():
     }
 
     try:
-        response = requests.post(
+        response = traced_request(
+            "POST",
             url,
+            "nessie",
             data=json.dumps(merchant_data),
             headers=headers
         )
@@ -46,5 +60,74 @@ def create_random_merchants():
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
-        print(f"Error creating merchant: {str(e)}")
-        return None
\ No newline at end of file
+        logger.warning("Error creating merchant: %s", e)
+        return None
+
+
+class MerchantPool:
+    """
+    A fixed set of merchants reused across accounts and customers.
+
+    The pool is filled once, on first use: from the existing Nessie merchant
+    catalog when it has enough merchants, topped up with newly created ones
+    otherwise. Seeding then only posts purchases against pooled merchants,
+    so the catalog (downloaded whole by get_all_merchant_data) stops growing
+    with every seeded customer.
+    """
+
+    def __init__(self, size: int = MERCHANT_POOL_SIZE, load_catalog: bool = True):
+        """
+        Parameters:
+        - size: Number of merchants in the pool
+        - load_catalog: Reuse merchants already in the Nessie catalog before creating any
+        """
+        self.size = size
+        self.load_catalog = load_catalog
+        self._merchant_ids: Optional[List[str]] = None
+        self._lock = threading.Lock()
+
+    def merchant_ids(self, context: GenerationContext = None) -> List[str]:
+        """The pooled merchant IDs; merchants created to fill the pool are generated from context"""
+        context = context or default_context()
+        with self._lock:
+            if not self._merchant_ids:
+                self._merchant_ids = self._fill(context.child("merchant-pool"))
+            return list(self._merchant_ids)
+
+    def sample(self, count: int, context: GenerationContext = None) -> List[str]:
+        """Up to count distinct merchant IDs from the pool, drawn with the context's randomness"""
+        context = context or default_context()
+        merchant_ids = self.merchant_ids(context)
+        return context.random.sample(merchant_ids, min(count, len(merchant_ids)))
+
+    def _fill(self, context: GenerationContext) -> List[str]:
+        merchant_ids = []
+        if self.load_catalog:
+            from helperFunctions.get_bank_data import BankDataManager
+
+            try:
+                catalog = BankDataManager.from_settings().get_all_merchant_data()
+                if not catalog.empty:
+                    # Sorted so the same catalog always gives the same pool
+                    merchant_ids = sorted(merchant_id for merchant_id in catalog["merchant_id"] if merchant_id)[:self.size]
+            except Exception as e:
+                logger.warning("Could not load the merchant catalog: %s", e)
+
+        created = 0
+        while len(merchant_ids) < self.size:
+            response = create_random_merchants(context)
+            if not response or "objectCreated" not in response:
+                break
+            merchant_ids.append(response["objectCreated"]["_id"])
+            created += 1
+
+        logger.info("Merchant pool has %d merchants (%d newly created)", len(merchant_ids), created)
+        return merchant_ids
+
+
+_merchant_pool = MerchantPool()
+
+
+def get_merchant_pool() -> MerchantPool:
+    """The merchant pool shared by every seeding run in this process"""
+    return _merchant_pool
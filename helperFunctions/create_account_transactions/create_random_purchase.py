@@ -1,21 +1,24 @@
 import json
-import os
-import random
-from datetime import datetime, timedelta
 import requests
-from dotenv import load_dotenv
+from helperFunctions.generation_context import GenerationContext, default_context
+from helperFunctions.settings import get_settings
+from helperFunctions.tracing import traced_request
+import logging
 
+logger = logging.getLogger(__name__)
 
-def create_random_purchase(account_id, merchant_id):
+
+def create_random_purchase(account_id, merchant_id, context: GenerationContext = None):
     """Create a random purchase for a specific account with a merchant"""
-    load_dotenv()
+    settings = get_settings()
+    context = context or default_context()
     purchase_data = {
         "merchant_id": merchant_id,
         "medium": "balance",
-        "purchase_date": (datetime.now() - timedelta(days=random.randint(1, 90))).strftime("%Y-%m-%d"),
-        "amount": round(random.uniform(5, 1000), 2),
-        "status": random.choice(["pending", "completed", "cancelled"]),
-        "description": random.choice([
+        "purchase_date": context.random_date(1, 90),
+        "amount": round(context.random.uniform(5, 1000), 2),
+        "status": context.random.choice(["pending", "completed", "cancelled"]),
+        "description": context.random.choice([
             "Grocery shopping",
             "Electronics",
             "Clothing",
@@ -26,7 +29,7 @@ def create_random_purchase(account_id, merchant_id):
         ])
     }
 
-    url = f"{os.getenv('NESSIE_API_URL')}/accounts/{account_id}/purchases?key={os.getenv('NESSIE_API_KEY')}"
+    url = f"{settings.nessie_api_url}/accounts/{account_id}/purchases?key={settings.nessie_api_key}"
 
     headers = {
         "Content-Type": "application/json",
@@ -34,8 +37,10 @@ def create_random_purchase(account_id, merchant_id):
     }
 
     try:
-        response = requests.post(
+        response = traced_request(
+            "POST",
             url,
+            "nessie",
             data=json.dumps(purchase_data),
             headers=headers
         )
@@ -43,5 +48,5 @@ def create_random_purchase(account_id, merchant_id):
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
-        print(f"Error creating purchase: {str(e)}")
+        logger.warning("Error creating purchase: %s", e)
         return None
\ No newline at end of file
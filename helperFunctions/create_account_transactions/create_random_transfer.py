@@ -1,21 +1,24 @@
 import json
-import os
-from datetime import datetime, timedelta
-import random
 import requests
-from dotenv import load_dotenv
+from helperFunctions.generation_context import GenerationContext, default_context
+from helperFunctions.settings import get_settings
+from helperFunctions.tracing import traced_request
+import logging
 
+logger = logging.getLogger(__name__)
 
-def create_random_transfer(payer_account_id, payee_account_id):
+
+def create_random_transfer(payer_account_id, payee_account_id, context: GenerationContext = None):
     """Create a random transfer between two accounts"""
-    load_dotenv()
+    settings = get_settings()
+    context = context or default_context()
     transfer_data = {
         "medium": "balance",
         "payee_id": payee_account_id,
-        "amount": round(random.uniform(10, 1000), 2),
-        "transaction_date": (datetime.now() - timedelta(days=random.randint(1, 90))).strftime("%Y-%m-%d"),
+        "amount": round(context.random.uniform(10, 1000), 2),
+        "transaction_date": context.random_date(1, 90),
         "status": "pending",  # API only accepts "pending"
-        "description": random.choice([
+        "description": context.random.choice([
             "Monthly transfer",
             "Debt payment",
             "Shared expense",
@@ -24,7 +27,7 @@ def create_random_transfer(payer_account_id, payee_account_id):
         ])
     }
 
-    url = f"{os.getenv('NESSIE_API_URL')}/accounts/{payer_account_id}/transfers?key={os.getenv('NESSIE_API_KEY')}"
+    url = f"{settings.nessie_api_url}/accounts/{payer_account_id}/transfers?key={settings.nessie_api_key}"
 
     headers = {
         "Content-Type": "application/json",
@@ -32,8 +35,10 @@ def create_random_transfer(payer_account_id, payee_account_id):
     }
 
     try:
-        response = requests.post(
+        response = traced_request(
+            "POST",
             url,
+            "nessie",
             data=json.dumps(transfer_data),
             headers=headers
         )
@@ -41,5 +46,5 @@ def create_random_transfer(payer_account_id, payee_account_id):
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
-        print(f"Error creating transfer: {str(e)}")
+        logger.warning("Error creating transfer: %s", e)
         return None
\ No newline at end of file
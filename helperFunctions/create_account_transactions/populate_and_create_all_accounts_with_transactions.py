@@ -1,22 +1,41 @@
+import logging
 import time
 from helperFunctions.create_account_transactions.populate_account_with_transactions import populate_account_with_transactions
 from helperFunctions.create_accounts.generate_random_customer_accounts import generate_accounts_for_customer
 from helperFunctions.get_accounts_for_customer import get_accounts_for_customer
 from helperFunctions.create_accounts import generate_random_customer_accounts
+from helperFunctions.generation_context import GenerationContext, customer_context
+from helperFunctions.single_flight import single_flight
 
+logger = logging.getLogger(__name__)
 
-def fill_accounts_with_data(customer_id):
-    """Main function to fill accounts with data for a specific customer"""
 
-    print(f"Starting to fill accounts with data for customer {customer_id}")
+def fill_accounts_with_data(customer_id, context: GenerationContext = None, db=None):
+    """
+    Main function to fill accounts with data for a specific customer.
 
+    Pass a seeded GenerationContext (with a reference_date) to generate a
+    reproducible ledger, e.g. for benchmark customers; without one, the
+    customer's context comes from the GENERATION_SEED setting (see
+    generation_context.customer_context).
+
+    Concurrent calls for the same customer are deduplicated (across workers too
+    when db, a Firestore client, is given), so the check for existing accounts
+    and the seeding cannot interleave and seed the customer twice.
+    """
+
+    logger.info("Starting to fill accounts with data for customer %s", customer_id)
+    context = context or customer_context(customer_id)
+    single_flight("seed", customer_id, lambda: _seed_if_empty(customer_id, context), db=db)
+
+
+    logger.info("Finished filling accounts with data for customer %s", customer_id)
+
+
+def _seed_if_empty(customer_id, context: GenerationContext = None):
     # First, check if the customer already has accounts
     existing_accounts = get_accounts_for_customer(customer_id)
 
     if not existing_accounts:
          # Create new accounts with transactions
-        generate_random_customer_accounts.generate_accounts_for_customer(customer_id)
- 
-
-
-    print(f"Finished filling accounts with data for customer {customer_id}")
+        generate_random_customer_accounts.generate_accounts_for_customer(customer_id, context)
@@ -1,31 +1,35 @@
 import json
-import os
-import random
+import logging
 import string
 import requests
-from dotenv import load_dotenv
+from helperFunctions.generation_context import GenerationContext, default_context
+from helperFunctions.settings import get_settings
+from helperFunctions.tracing import traced_request
+from helperFunctions.logging_config import SAMPLED
 
+logger = logging.getLogger(__name__)
 
-def create_random_account(customer_id):
+def create_random_account(customer_id, context: GenerationContext = None):
     """Create a random account for a specific customer"""
-    load_dotenv()
+    settings = get_settings()
+    context = context or default_context()
 
     account_types = ["Checking", "Savings", "Credit Card"]
 
     nicknames = ["Primary", "Secondary", "Emergency Fund", "Vacation",
                  "Home Savings", "Daily Expenses", "Travel", "Education"]
 
-    account_number = ''.join(random.choices(string.digits, k=16))
+    account_number = ''.join(context.random.choices(string.digits, k=16))
 
     account_data = {
-        "type": random.choice(account_types),
-        "nickname": random.choice(nicknames),
-        "rewards": random.randint(0, 10000),
-        "balance": random.randint(1000, 50000),
+        "type": context.random.choice(account_types),
+        "nickname": context.random.choice(nicknames),
+        "rewards": context.random.randint(0, 10000),
+        "balance": context.random.randint(1000, 50000),
         "account_number": account_number
     }
 
-    url = f"{os.getenv('NESSIE_API_URL')}/customers/{customer_id}/accounts?key={os.getenv('NESSIE_API_KEY')}"
+    url = f"{settings.nessie_api_url}/customers/{customer_id}/accounts?key={settings.nessie_api_key}"
 
     headers = {
         "Content-Type": "application/json",
@@ -33,15 +37,17 @@ def create_random_account(customer_id):
     }
 
     try:
-        response = requests.post(
+        response = traced_request(
+            "POST",
             url,
+            "nessie",
             data=json.dumps(account_data),
             headers=headers
         )
 
         response.raise_for_status()
-        print(response)
+        logger.debug("Created account for customer %s (status %s)", customer_id, response.status_code, extra=SAMPLED)
         return response.json()
     except requests.exceptions.RequestException as e:
-        print(f"Error creating account: {str(e)}")
+        logger.warning("Error creating account: %s", e)
         return None
\ No newline at end of file
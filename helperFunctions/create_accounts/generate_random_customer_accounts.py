@@ -1,32 +1,43 @@
+import logging
 import time
-import random
 
 from helperFunctions.create_account_transactions.populate_account_with_transactions import \
     populate_account_with_transactions
 from helperFunctions.create_accounts.create_random_account import create_random_account
+from helperFunctions.generation_context import GenerationContext, default_context
+from helperFunctions.logging_config import SAMPLED
 
+logger = logging.getLogger(__name__)
 
-def generate_accounts_for_customer(customer_id):
-    """Generate multiple random accounts with transactions for a customer"""
-    num_accounts = random.randint(2, 5)
+
+def generate_accounts_for_customer(customer_id, context: GenerationContext = None):
+    """
+    Generate multiple random accounts with transactions for a customer.
+
+    Each account is generated from its own child of context, so with a seeded
+    context the same seed always produces the same accounts and ledgers.
+    """
+    context = context or default_context()
+    num_accounts = context.random.randint(2, 5)
     created_accounts = []
 
-    print(f"Creating {num_accounts} accounts for customer {customer_id}...")
+    logger.info("Creating %d accounts for customer %s", num_accounts, customer_id)
 
     for i in range(num_accounts):
-        print(f"Creating account {i+1}/{num_accounts}...")
-        result = create_random_account(customer_id)
+        logger.debug("Creating account %d/%d", i + 1, num_accounts, extra=SAMPLED)
+        result = create_random_account(customer_id, context.child(f"account-{i}"))
         if result and 'objectCreated' in result:
             account_id = result['objectCreated']['_id']
             created_accounts.append(account_id)
 
-    print(f"Populating {len(created_accounts)} accounts with transactions...")
+    logger.info("Populating %d accounts with transactions", len(created_accounts))
 
     for i, account_id in enumerate(created_accounts):
-        print(f"  Populating account {i+1}/{len(created_accounts)}...")
+        logger.debug("Populating account %d/%d", i + 1, len(created_accounts), extra=SAMPLED)
         other_accounts = [acc_id for acc_id in created_accounts if acc_id != account_id]
-        populate_account_with_transactions(account_id, other_accounts)
+        populate_account_with_transactions(account_id, other_accounts,
+                                           context=context.child(f"transactions-{i}"))
         time.sleep(0.5)
 
-    print(f"Successfully created and populated {len(created_accounts)} accounts for customer {customer_id}")
+    logger.info("Successfully created and populated %d accounts for customer %s", len(created_accounts), customer_id)
     return created_accounts
\ No newline at end of file
@@ -0,0 +1,229 @@
+"""
+Sharded cron runs.
+
+A run splits a newsletter cohort into shard_count shards by the shard_point
+stored on each user document (a stable hash of their email): shard i covers
+the i-th of shard_count equal ranges of shard points, so each worker queries
+only its own slice of the cohort. The cron trigger only enqueues one
+Firestore document per shard; independent worker processes (see
+shard_worker.py) claim shards under time-limited leases, process them and
+record per-shard results. The worker that completes the last shard merges
+the results into a single cron_logs summary.
+
+Leases are taken and renewed with last-update-time write preconditions, so two
+workers can never both hold a shard. A worker that dies simply stops renewing,
+and its shard is picked up again once the lease expires; a worker that loses
+its lease stops sending. Each user is marked as sent for the run as soon as
+their newsletter goes out and a retried shard skips marked users, so only a
+newsletter in flight when a worker dies can be sent twice (never zero times).
+"""
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from google.api_core.exceptions import FailedPrecondition
+
+from helperFunctions.user_repository import SHARD_SPACE
+
+RUNS_COLLECTION = "cron_runs"
+SHARDS_COLLECTION = "cron_shards"
+DEFAULT_LEASE_SECONDS = 300
+
+
+class LeaseLost(Exception):
+    """Raised when a worker no longer holds the lease on its shard"""
+
+
+def shard_range(shard: int, shard_count: int) -> Tuple[int, int]:
+    """The [start, end) range of shard points in a shard: the points p with p * shard_count // SHARD_SPACE == shard"""
+    return -(-shard * SHARD_SPACE // shard_count), -(-(shard + 1) * SHARD_SPACE // shard_count)
+
+
+@dataclass
+class ShardLease:
+    run_id: str
+    shard: int
+    shard_count: int
+    frequency: str
+    date_range: str
+    worker_id: str
+    reference: Any
+    update_time: Any
+    expires_at: float
+
+    @property
+    def point_range(self) -> Tuple[int, int]:
+        """The range of user shard points this shard covers"""
+        return shard_range(self.shard, self.shard_count)
+
+
+def enqueue_run(db, frequency: str, date_range: str, shard_count: int) -> str:
+    """
+    Create a run and one pending task per shard.
+
+    Returns:
+    The run ID
+    """
+    if shard_count < 1:
+        raise ValueError("shard_count must be at least 1")
+    run_id = f"{frequency}_newsletter_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+    batch = db.batch()
+    batch.set(db.collection(RUNS_COLLECTION).document(run_id), {
+        "run_id": run_id,
+        "frequency": frequency,
+        "date_range": date_range,
+        "shard_count": shard_count,
+        "status": "running",
+        "created_at": datetime.now().isoformat()
+    })
+    for shard in range(shard_count):
+        batch.set(db.collection(SHARDS_COLLECTION).document(f"{run_id}_{shard}"), {
+            "run_id": run_id,
+            "frequency": frequency,
+            "date_range": date_range,
+            "shard": shard,
+            "shard_count": shard_count,
+            "status": "pending",
+            "lease_owner": None,
+            "lease_expires_at": 0,
+            "attempts": 0
+        })
+    batch.commit()
+    return run_id
+
+
+def claim_shard(db, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[ShardLease]:
+    """
+    Claim a pending shard, or one whose previous worker's lease has expired.
+
+    Returns:
+    The lease, or None if no shard is available
+    """
+    now = time.time()
+    for snapshot in db.collection(SHARDS_COLLECTION).where("status", "in", ["pending", "running"]).stream():
+        task = snapshot.to_dict()
+        if task["status"] == "running" and task["lease_expires_at"] > now:
+            continue
+
+        expires_at = now + lease_seconds
+        try:
+            write = snapshot.reference.update({
+                "status": "running",
+                "lease_owner": worker_id,
+                "lease_expires_at": expires_at,
+                "attempts": task.get("attempts", 0) + 1
+            }, option=db.write_option(last_update_time=snapshot.update_time))
+        except FailedPrecondition:
+            # Another worker claimed it first
+            continue
+
+        return ShardLease(
+            run_id=task["run_id"],
+            shard=task["shard"],
+            shard_count=task["shard_count"],
+            frequency=task["frequency"],
+            date_range=task["date_range"],
+            worker_id=worker_id,
+            reference=snapshot.reference,
+            update_time=write.update_time,
+            expires_at=expires_at
+        )
+    return None
+
+
+def _write_with_lease(db, lease: ShardLease, fields: Dict[str, Any]):
+    try:
+        write = lease.reference.update(fields, option=db.write_option(last_update_time=lease.update_time))
+    except FailedPrecondition:
+        raise LeaseLost(f"Lost the lease on shard {lease.shard} of {lease.run_id}")
+    lease.update_time = write.update_time
+
+
+def renew_lease(db, lease: ShardLease, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+    """Extend the lease; raises LeaseLost if another worker has taken the shard over"""
+    expires_at = time.time() + lease_seconds
+    _write_with_lease(db, lease, {"lease_expires_at": expires_at})
+    lease.expires_at = expires_at
+
+
+def complete_shard(db, lease: ShardLease, results: Dict):
+    """Record a shard's results; raises LeaseLost if another worker has taken the shard over"""
+    _write_with_lease(db, lease, {
+        "status": "done",
+        "results": results,
+        "finished_at": datetime.now().isoformat()
+    })
+
+
+def release_shard(db, lease: ShardLease):
+    """Give a shard back so another worker can retry it straight away"""
+    _write_with_lease(db, lease, {"status": "pending", "lease_owner": None, "lease_expires_at": 0})
+
+
+def get_run_status(db, run_id: str) -> Optional[Dict]:
+    """The run document plus the status of each of its shards, or None if there is no such run"""
+    run = db.collection(RUNS_COLLECTION).document(run_id).get()
+    if not run.exists:
+        return None
+    status = run.to_dict()
+    status["shards"] = {
+        snapshot.get("shard"): {
+            "status": snapshot.get("status"),
+            "lease_owner": snapshot.get("lease_owner"),
+            "attempts": snapshot.get("attempts")
+        }
+        for snapshot in db.collection(SHARDS_COLLECTION).where("run_id", "==", run_id).stream()
+    }
+    return status
+
+
+def merge_run(db, run_id: str, log_reference) -> Optional[Dict]:
+    """
+    Merge per-shard results into one summary once every shard is done.
+
+    The summary is written to log_reference (a cron_logs document) in the same
+    batch that marks the run merged, guarded by a precondition, so it is
+    written exactly once even if several workers finish at the same time.
+
+    Returns:
+    The merged summary, or None if shards are still outstanding or another worker merged the run
+    """
+    run_ref = db.collection(RUNS_COLLECTION).document(run_id)
+    run = run_ref.get()
+    if not run.exists or run.get("status") != "running":
+        return None
+
+    shards = [snapshot.to_dict() for snapshot in db.collection(SHARDS_COLLECTION).where("run_id", "==", run_id).stream()]
+    if len(shards) < run.get("shard_count") or any(shard["status"] != "done" for shard in shards):
+        return None
+
+    summary = {
+        "run_id": run_id,
+        "total_users": 0,
+        "successful": 0,
+        "failed": 0,
+        "already_sent": 0,
+        "errors": [],
+        "shard_count": len(shards),
+        "timings": {}
+    }
+    for shard in sorted(shards, key=lambda shard: shard["shard"]):
+        results = shard.get("results") or {}
+        for key in ("total_users", "successful", "failed", "already_sent"):
+            summary[key] += results.get(key, 0)
+        summary["errors"].extend(results.get("errors", []))
+        summary["timings"][f"shard_{shard['shard']}"] = results.get("timings", {})
+    summary["timestamp"] = datetime.now().isoformat()
+
+    batch = db.batch()
+    batch.update(run_ref, {"status": "merged", "merged_at": summary["timestamp"]},
+                 option=db.write_option(last_update_time=run.update_time))
+    batch.set(log_reference, summary)
+    try:
+        batch.commit()
+    except FailedPrecondition:
+        return None
+    return summary
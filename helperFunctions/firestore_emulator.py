@@ -0,0 +1,275 @@
+"""
+In-memory stand-in for the subset of the Firestore client used by this app.
+
+Supports collection/document references, equality and comparison filters,
+order_by/limit/start_after pagination, get()/stream(), get_all(), create/set/update,
+write batches and last-update-time write preconditions. Intended for offline tests
+and benchmarks; pass an InMemoryFirestore anywhere a firestore.client() is
+expected.
+"""
+import copy
+import itertools
+import operator
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+DOCUMENT_ID = "__name__"
+
+_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, options: value in options
+}
+
+
+class LastUpdateOption:
+    """Write precondition: the document must not have changed since last_update_time"""
+
+    def __init__(self, last_update_time):
+        self.last_update_time = last_update_time
+
+
+class WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+def _precondition_failed(message: str):
+    # Same exception type the real client raises
+    from google.api_core.exceptions import FailedPrecondition
+    return FailedPrecondition(message)
+
+
+def _not_found(message: str):
+    from google.api_core.exceptions import NotFound
+    return NotFound(message)
+
+
+def _already_exists(message: str):
+    from google.api_core.exceptions import AlreadyExists
+    return AlreadyExists(message)
+
+
+class DocumentSnapshot:
+    def __init__(self, reference: "DocumentReference", data: Optional[Dict[str, Any]], update_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.update_time = update_time
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str) -> Any:
+        return (self._data or {}).get(field)
+
+
+class DocumentReference:
+    def __init__(self, store: "InMemoryFirestore", collection: str, document_id: str):
+        self._store = store
+        self.collection_id = collection
+        self.id = document_id
+
+    @property
+    def path(self) -> str:
+        return f"{self.collection_id}/{self.id}"
+
+    def get(self) -> DocumentSnapshot:
+        with self._store.lock:
+            data = self._store.collections.get(self.collection_id, {}).get(self.id)
+            return DocumentSnapshot(self, copy.deepcopy(data), self._store.update_time(self))
+
+    def _check(self, option: Optional[LastUpdateOption]):
+        if option is not None and self._store.update_time(self) != option.last_update_time:
+            raise _precondition_failed(f"{self.path} was modified since it was read")
+
+    def create(self, data: Dict[str, Any]) -> WriteResult:
+        """Write a new document; raises AlreadyExists if it exists"""
+        with self._store.lock:
+            documents = self._store.collections.setdefault(self.collection_id, {})
+            if self.id in documents:
+                raise _already_exists(f"{self.path} already exists")
+            self._store.write_count += 1
+            documents[self.id] = copy.deepcopy(data)
+            return WriteResult(self._store.touch(self))
+
+    def set(self, data: Dict[str, Any], merge: bool = False, option: Optional[LastUpdateOption] = None) -> WriteResult:
+        with self._store.lock:
+            self._check(option)
+            self._store.write_count += 1
+            documents = self._store.collections.setdefault(self.collection_id, {})
+            if merge and self.id in documents:
+                documents[self.id].update(copy.deepcopy(data))
+            else:
+                documents[self.id] = copy.deepcopy(data)
+            return WriteResult(self._store.touch(self))
+
+    def update(self, data: Dict[str, Any], option: Optional[LastUpdateOption] = None) -> WriteResult:
+        with self._store.lock:
+            documents = self._store.collections.get(self.collection_id, {})
+            if self.id not in documents:
+                raise _not_found(f"No document to update: {self.path}")
+            self._check(option)
+            self._store.write_count += 1
+            documents[self.id].update(copy.deepcopy(data))
+            return WriteResult(self._store.touch(self))
+
+    def delete(self):
+        with self._store.lock:
+            self._store.write_count += 1
+            self._store.collections.get(self.collection_id, {}).pop(self.id, None)
+            self._store.touch(self)
+
+
+class Query:
+    def __init__(self, store: "InMemoryFirestore", collection: str, filters=(), order=None,
+                 limit: Optional[int] = None, start_after_key=None):
+        self._store = store
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._order = order
+        self._limit = limit
+        self._start_after_key = start_after_key
+
+    def _copy(self, **changes) -> "Query":
+        state = {
+            "filters": self._filters,
+            "order": self._order,
+            "limit": self._limit,
+            "start_after_key": self._start_after_key
+        }
+        state.update(changes)
+        return Query(self._store, self._collection, **state)
+
+    def where(self, field: str, op: str, value: Any) -> "Query":
+        if op not in _OPERATORS:
+            raise ValueError(f"Unsupported operator: {op}")
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field: str) -> "Query":
+        return self._copy(order=field)
+
+    def limit(self, count: int) -> "Query":
+        return self._copy(limit=count)
+
+    def start_after(self, snapshot: DocumentSnapshot) -> "Query":
+        return self._copy(start_after_key=self._sort_key(snapshot.id, snapshot.to_dict() or {}))
+
+    def _sort_key(self, document_id: str, data: Dict[str, Any]):
+        field = self._order or DOCUMENT_ID
+        value = document_id if field == DOCUMENT_ID else data.get(field)
+        return (value, document_id)
+
+    def stream(self) -> Iterator[DocumentSnapshot]:
+        with self._store.lock:
+            documents = list(self._store.collections.get(self._collection, {}).items())
+            self._store.read_count += 1
+
+        matches = []
+        for document_id, data in documents:
+            if all(field in data and _OPERATORS[op](data[field], value) for field, op, value in self._filters):
+                matches.append((self._sort_key(document_id, data), document_id, data))
+        matches.sort(key=lambda match: match[0])
+
+        if self._start_after_key is not None:
+            matches = [match for match in matches if match[0] > self._start_after_key]
+        if self._limit is not None:
+            matches = matches[:self._limit]
+
+        for _, document_id, data in matches:
+            reference = DocumentReference(self._store, self._collection, document_id)
+            yield DocumentSnapshot(reference, copy.deepcopy(data), self._store.update_time(reference))
+
+    def get(self) -> List[DocumentSnapshot]:
+        return list(self.stream())
+
+
+class CollectionReference(Query):
+    def __init__(self, store: "InMemoryFirestore", collection: str):
+        super().__init__(store, collection)
+        self.id = collection
+
+    def document(self, document_id: str) -> DocumentReference:
+        return DocumentReference(self._store, self.id, document_id)
+
+
+class WriteBatch:
+    """Collects writes and applies them together on commit()"""
+
+    MAX_WRITES = 500
+
+    def __init__(self, store: "InMemoryFirestore"):
+        self._store = store
+        self._writes = []
+
+    def set(self, reference: DocumentReference, data: Dict[str, Any], merge: bool = False):
+        self._writes.append(("set", reference, None, lambda: reference.set(data, merge=merge)))
+
+    def update(self, reference: DocumentReference, data: Dict[str, Any], option: Optional[LastUpdateOption] = None):
+        self._writes.append(("update", reference, option, lambda: reference.update(data)))
+
+    def delete(self, reference: DocumentReference):
+        self._writes.append(("delete", reference, None, reference.delete))
+
+    def commit(self):
+        """Apply every write, or none of them if a precondition fails or an updated document is missing"""
+        if len(self._writes) > self.MAX_WRITES:
+            raise ValueError(f"A batch can contain at most {self.MAX_WRITES} writes")
+        with self._store.lock:
+            # Whether each document exists at that point in the batch
+            exists: Dict[str, bool] = {}
+            for kind, reference, option, _ in self._writes:
+                reference._check(option)
+                present = exists.get(reference.path)
+                if present is None:
+                    present = reference.id in self._store.collections.get(reference.collection_id, {})
+                if kind == "update" and not present:
+                    raise _not_found(f"No document to update: {reference.path}")
+                exists[reference.path] = kind != "delete"
+            for _, _, _, write in self._writes:
+                write()
+            self._store.commit_count += 1
+        self._writes = []
+
+
+class InMemoryFirestore:
+    """Drop-in for firestore.client() backed by dictionaries"""
+
+    def __init__(self):
+        # RLock so a batch commit can apply writes through the document references
+        self.lock = threading.RLock()
+        self.collections: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.read_count = 0
+        self.write_count = 0
+        self.commit_count = 0
+        self._update_times: Dict[str, int] = {}
+        self._clock = itertools.count(1)
+
+    def update_time(self, reference: DocumentReference):
+        return self._update_times.get(reference.path)
+
+    def touch(self, reference: DocumentReference) -> int:
+        self._update_times[reference.path] = next(self._clock)
+        return self._update_times[reference.path]
+
+    def collection(self, name: str) -> CollectionReference:
+        return CollectionReference(self, name)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def get_all(self, references: List[DocumentReference]) -> Iterator[DocumentSnapshot]:
+        """Snapshots of several documents (missing ones with exists False)"""
+        for reference in references:
+            yield reference.get()
+
+    def write_option(self, last_update_time=None) -> LastUpdateOption:
+        return LastUpdateOption(last_update_time)
@@ -1,123 +1,353 @@
-from dotenv import load_dotenv
-from openai import OpenAI
-import os
 import logging
+import re
 import requests
 import time
 import json
+from typing import Any, Dict, List, Optional, Union
+from prometheus_client import Counter, Histogram
+from helperFunctions import resilience
+from helperFunctions.clients import get_openai_client
+from helperFunctions.prompt_builder import SYSTEM_PREFIX, Prompt, as_prompt, estimate_tokens
+from helperFunctions.settings import Settings, get_settings
+from helperFunctions.tracing import LATENCY_BUCKETS, http_span, span, traced_request
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def generate_open_ai_summary(system_prompt):
+OPENAI_TOKENS = Counter(
+    "openai_tokens_total",
+    "Tokens used by OpenAI summary calls, by prompt kind (input includes cached_input)",
+    ["prompt", "type"]
+)
+OPENAI_LATENCY = Histogram(
+    "openai_call_seconds",
+    "Latency of OpenAI summary calls by prompt kind",
+    ["prompt"],
+    buckets=LATENCY_BUCKETS
+)
+OPENAI_FIRST_TOKEN = Histogram(
+    "openai_time_to_first_token_seconds",
+    "Time to the first streamed token of OpenAI summary calls by prompt kind",
+    ["prompt"],
+    buckets=LATENCY_BUCKETS
+)
+
+# End of a sentence that is known to be complete: punctuation (and any closing
+# quote or bracket) followed by whitespace, so "$1." is not cut before "50"
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*(?=\s)")
+
+
+def _messages(system: str, user: str) -> List[Dict[str, str]]:
+    # The system message never varies, so it stays a cacheable prefix of every request
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user}
+    ]
+
+
+def _record_usage(kind: str, usage: Any, estimated_input: int, seconds: float, output: str = ""):
+    """Export a call's latency and token usage, estimating the counts the response did not report"""
+    def field(obj, name):
+        return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+    input_tokens = field(usage, "prompt_tokens") if usage is not None else None
+    output_tokens = field(usage, "completion_tokens") if usage is not None else None
+    details = field(usage, "prompt_tokens_details") if usage is not None else None
+    cached_tokens = (field(details, "cached_tokens") if details is not None else None) or 0
+    input_tokens = estimated_input if input_tokens is None else input_tokens
+    output_tokens = estimate_tokens(output) if output_tokens is None else output_tokens
+
+    OPENAI_LATENCY.labels(kind).observe(seconds)
+    OPENAI_TOKENS.labels(kind, "input").inc(input_tokens)
+    OPENAI_TOKENS.labels(kind, "cached_input").inc(cached_tokens)
+    OPENAI_TOKENS.labels(kind, "output").inc(output_tokens)
+    logger.debug("OpenAI %s call: %d input tokens (%d cached, %d estimated), %d output tokens in %.2fs",
+                 kind, input_tokens, cached_tokens, estimated_input, output_tokens, seconds)
+
+def generate_open_ai_summary(system_prompt, settings: Settings = None):
     """
     Generate a summary using OpenAI API with robust error handling and diagnostics.
     
     Args:
-        system_prompt (str): The prompt to send to OpenAI
+        system_prompt (Prompt or str): The prompt to send to OpenAI, ideally built by prompt_builder
+        settings (Settings): Optional settings; defaults to the ones loaded at startup
         
     Returns:
         str: The generated summary or a fallback message
     """
-    # Load environment variables
-    load_dotenv()
+    settings = settings or get_settings()
     
     # Get API key with proper error handling
-    api_key = os.getenv("OPEN_AI_API_KEY")
-    if not api_key:
+    if not settings.open_ai_api_key:
         logger.error("OPEN_AI_API_KEY environment variable not found")
         return "Your personal financial summary. Check your accounts for details."
 
-    # First, let's check connectivity to OpenAI's API
+    summary = request_open_ai_summary(system_prompt, settings)
+    if summary is not None:
+        return summary
+
+    # Generate a more personalized fallback based on the data
+    # Extract key information from the prompt to create a more relevant fallback
     try:
-        logger.info("Testing connectivity to OpenAI API...")
-        # Simple connectivity test
-        response = requests.get("https://api.openai.com", timeout=5)
-        logger.info(f"OpenAI API connectivity test status: {response.status_code}")
-    except Exception as e:
-        logger.error(f"Failed to connect to OpenAI API: {str(e)}")
-        # Continue anyway since this is just a diagnostic test
+        # This is a rough extraction, might need adjustment based on your exact prompt format
+        text = as_prompt(system_prompt).text
+        name_match = text.split("addressed to ")[1].split(" as ")[0]
+        net_worth_match = text.split("net_worth=")[1].split(";")[0]
+        
+        # Create a slightly personalized fallback
+        return f"Hello {name_match}! Here's your financial snapshot with a net worth of ${net_worth_match}. Review your accounts for detailed insights and spending patterns."
+    except Exception:
+        # If extraction fails, fall back to generic message
+        return "Your financial summary and market analysis for today's economic landscape."
+
+
+def request_open_ai_summary(system_prompt, settings: Settings = None) -> Optional[str]:
+    """
+    Ask OpenAI for a summary, without any fallback text.
     
-    # Log the API key length for debugging (without revealing the key)
-    logger.info(f"API key length: {len(api_key)}")
-    logger.info(f"API key first 4 chars: {api_key[:4]}***")
+    The prompt's output budget is sent as max_tokens, and the call's latency
+    and token usage are exported as metrics labelled with the prompt's kind.
+    
+    Returns:
+        The generated summary, or None if OpenAI is not configured or could not be reached
+    """
+    settings = settings or get_settings()
+    api_key = settings.open_ai_api_key
+    if not api_key:
+        return None
+    prompt = as_prompt(system_prompt)
+    messages = _messages(SYSTEM_PREFIX, prompt.text)
+
+    # Connectivity diagnostics cost an extra round trip, so only run them when debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        try:
+            response = traced_request("GET", "https://api.openai.com", "openai", timeout=5)
+            logger.debug("OpenAI API connectivity test status: %s", response.status_code)
+        except Exception as e:
+            logger.debug("Failed to connect to OpenAI API: %s", e)
+            # Continue anyway since this is just a diagnostic test
+        
+        # Log the API key length for debugging (without revealing the key)
+        logger.debug("API key length: %d", len(api_key))
     
     try:
-        # Create OpenAI client with just the API key
-        client = OpenAI(api_key=api_key)
+        # Reuse the shared client (created on first use) and its connection pool
+        client = get_openai_client(api_key)
         
         # Log that we're making the API call
-        logger.info(f"Making OpenAI API call with prompt length: {len(system_prompt)}")
+        logger.debug("Making OpenAI API call with an estimated %d input tokens", prompt.input_tokens)
         
         # More detailed logging
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         # Make the API call with timeout
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful financial assistant."},
-                {"role": "user", "content": system_prompt}
-            ],
-            timeout=30  # Set a timeout for the API call
-        )
+        with http_span("openai"):
+            response = resilience.upstream("openai").call(
+                client.chat.completions.create,
+                model="gpt-3.5-turbo",
+                messages=messages,
+                max_tokens=prompt.max_tokens,
+                timeout=30  # Set a timeout for the API call
+            )
         
         # Calculate time taken
-        time_taken = time.time() - start_time
-        logger.info(f"API call completed in {time_taken:.2f} seconds")
+        time_taken = time.perf_counter() - start_time
+        logger.debug("API call completed in %.2f seconds", time_taken)
         
         # Extract and log the result
         result = response.choices[0].message.content.strip()
-        logger.info(f"Successfully generated summary: '{result[:50]}...' (length: {len(result)})")
+        _record_usage(prompt.kind, getattr(response, "usage", None), prompt.input_tokens, time_taken, result)
+        logger.debug("Successfully generated summary of length %d", len(result))
         return result
         
     except Exception as e:
-        logger.error(f"Error generating summary with OpenAI: {str(e)}")
+        logger.error("Error generating summary with OpenAI: %s", e)
         
         # Try a different approach - using requests directly for diagnostic purposes
-        try:
-            logger.info("Attempting direct API call using requests...")
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}"
-            }
-            payload = {
-                "model": "gpt-3.5-turbo",
-                "messages": [
-                    {"role": "system", "content": "You are a helpful financial assistant."},
-                    {"role": "user", "content": system_prompt}
-                ]
-            }
-            direct_response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=payload,
+        # (pointless while the circuit is open, which fails the request fast anyway)
+        if not isinstance(e, resilience.UpstreamUnavailable):
+            try:
+                logger.debug("Attempting direct API call using requests")
+                headers = {
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {api_key}"
+                }
+                payload = {
+                    "model": "gpt-3.5-turbo",
+                    "messages": messages,
+                    "max_tokens": prompt.max_tokens
+                }
+                start_time = time.perf_counter()
+                direct_response = traced_request(
+                    "POST",
+                    "https://api.openai.com/v1/chat/completions",
+                    "openai",
+                    headers=headers,
+                    json=payload,
+                    timeout=30
+                )
+                logger.debug("Direct API call status: %s", direct_response.status_code)
+                if direct_response.status_code == 200:
+                    response_json = direct_response.json()
+                    direct_result = response_json["choices"][0]["message"]["content"].strip()
+                    _record_usage(prompt.kind, response_json.get("usage"), prompt.input_tokens,
+                                  time.perf_counter() - start_time, direct_result)
+                    logger.debug("Direct API call succeeded")
+                    return direct_result
+                else:
+                    logger.error("Direct API call failed: %s", direct_response.text)
+            except Exception as direct_e:
+                logger.error("Direct API call also failed: %s", direct_e)
+        
+        return None
+
+
+def stream_open_ai_summary(system_prompt, settings: Settings = None, max_sentences: int = 3,
+                           first_token_timeout: Optional[float] = None) -> Optional[str]:
+    """
+    Stream a summary from OpenAI, stopping as soon as max_sentences sentences are complete.
+    
+    The stream is closed once the last wanted sentence ends, so the call takes
+    as long as those sentences rather than the whole completion. With
+    first_token_timeout the call is abandoned (without retries) when OpenAI
+    sends nothing for that many seconds, and the caller falls back.
+    
+    Args:
+        system_prompt (Prompt or str): The prompt to send to OpenAI
+        settings (Settings): Optional settings; defaults to the ones loaded at startup
+        max_sentences (int): Sentences to keep
+        first_token_timeout (float): Seconds to wait for the first token, or None for the usual 30s
+        
+    Returns:
+        The summary, or None if OpenAI is not configured, missed the deadline or failed
+        before a complete sentence arrived
+    """
+    import httpx
+
+    settings = settings or get_settings()
+    if not settings.open_ai_api_key:
+        return None
+    prompt = as_prompt(system_prompt)
+
+    # A read timeout bounds the wait for the first chunk (and any later stall);
+    # retrying would only multiply the deadline
+    timeout = httpx.Timeout(30, connect=3.05, read=first_token_timeout) if first_token_timeout else 30
+    client = get_openai_client(settings.open_ai_api_key).with_options(max_retries=0)
+
+    text = ""
+    first_token = None
+    start_time = time.perf_counter()
+    try:
+        with span("openai.chat_completion_stream"):
+            # The guard holds the slot until the stream is closed below; like
+            # traced_request's streamed calls, the HTTP time covers the response headers only
+            with http_span("openai"):
+                stream = resilience.upstream("openai").call_streaming(
+                    client.chat.completions.create,
+                    model="gpt-3.5-turbo",
+                    messages=_messages(SYSTEM_PREFIX, prompt.text),
+                    max_tokens=prompt.max_tokens,
+                    stream=True,
+                    timeout=timeout
+                )
+            try:
+                for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    if first_token is None:
+                        first_token = time.perf_counter() - start_time
+                        OPENAI_FIRST_TOKEN.labels(prompt.kind).observe(first_token)
+                    text += delta
+                    complete = _complete_sentences(text, max_sentences)
+                    if complete is not None:
+                        text = complete
+                        break
+            finally:
+                stream.close()
+    except Exception as e:
+        if first_token is None:
+            logger.warning("OpenAI stream failed before the first token: %s", e)
+            return None
+        # Keep whatever sentences finished before the stream broke off
+        logger.warning("OpenAI stream failed after %d characters: %s", len(text), e)
+        matches = list(_SENTENCE_END.finditer(text + " "))
+        text = text[:matches[-1].end()] if matches else ""
+
+    text = text.strip()
+    _record_usage(prompt.kind, None, prompt.input_tokens, time.perf_counter() - start_time, text)
+    return text or None
+
+
+def _complete_sentences(text: str, count: int) -> Optional[str]:
+    """The first count sentences of text, or None until that many are complete"""
+    for index, match in enumerate(_SENTENCE_END.finditer(text), 1):
+        if index == count:
+            return text[:match.end()]
+    return None
+
+
+BATCH_INSTRUCTIONS = (
+    "You will receive a JSON array of requests, each with an id and a prompt. "
+    "Answer every prompt independently, as if it were the only one. "
+    'Reply with a JSON object of the form {"results": [{"id": <id>, "text": "<answer>"}]} '
+    "with exactly one entry per request."
+)
+# Output tokens for the id and JSON punctuation around each answer in a batch
+BATCH_ITEM_OVERHEAD_TOKENS = 12
+
+
+def generate_open_ai_summaries(prompts: List[Union[Prompt, str]], settings: Settings = None) -> List[Optional[str]]:
+    """
+    Answer several independent prompts with a single chat completion.
+
+    The prompts are sent as a JSON array and the model replies with a JSON
+    object, which is validated item by item. max_tokens is the sum of the
+    prompts' output budgets plus room for the JSON around each answer.
+
+    Returns:
+    One answer per prompt, in order, with None for any item missing or invalid
+    in the response (or every item, if the request itself failed)
+    """
+    settings = settings or get_settings()
+    answers: List[Optional[str]] = [None] * len(prompts)
+    if not prompts or not settings.open_ai_api_key:
+        return answers
+
+    prompts = [as_prompt(prompt) for prompt in prompts]
+    system = SYSTEM_PREFIX + " " + BATCH_INSTRUCTIONS
+    user = json.dumps([{"id": index, "prompt": prompt.text} for index, prompt in enumerate(prompts)])
+    max_tokens = sum(prompt.max_tokens + BATCH_ITEM_OVERHEAD_TOKENS for prompt in prompts)
+    try:
+        client = get_openai_client(settings.open_ai_api_key)
+        start_time = time.perf_counter()
+        with http_span("openai"):
+            response = resilience.upstream("openai").call(
+                client.chat.completions.create,
+                model="gpt-3.5-turbo",
+                messages=_messages(system, user),
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"},
                 timeout=30
             )
-            logger.info(f"Direct API call status: {direct_response.status_code}")
-            if direct_response.status_code == 200:
-                response_json = direct_response.json()
-                direct_result = response_json["choices"][0]["message"]["content"].strip()
-                logger.info(f"Direct API call success, response: {direct_result[:50]}...")
-                return direct_result
-            else:
-                logger.error(f"Direct API call failed: {direct_response.text}")
-        except Exception as direct_e:
-            logger.error(f"Direct API call also failed: {str(direct_e)}")
-        
-        # Generate a more personalized fallback based on the data
-        # Extract key information from the prompt to create a more relevant fallback
-        try:
-            # This is a rough extraction, might need adjustment based on your exact prompt format
-            name_match = system_prompt.split("directly to ")[1].split(".")[0]
-            net_worth_match = system_prompt.split("net worth: $")[1].split(",")[0]
-            
-            # Create a slightly personalized fallback
-            return f"Hello {name_match}! Here's your financial snapshot with a net worth of ${net_worth_match}. Review your accounts for detailed insights and spending patterns."
-        except Exception:
-            # If extraction fails, fall back to generic message
-            return "Your financial summary and market analysis for today's economic landscape."
+        content = response.choices[0].message.content
+        _record_usage("batch", getattr(response, "usage", None), estimate_tokens(system) + estimate_tokens(user),
+                      time.perf_counter() - start_time, content)
+        results = json.loads(content)["results"]
+    except Exception as e:
+        logger.error("Batched OpenAI request for %d prompts failed: %s", len(prompts), e)
+        return answers
+
+    for item in results if isinstance(results, list) else []:
+        if not isinstance(item, dict):
+            continue
+        index, text = item.get("id"), item.get("text")
+        if isinstance(index, int) and 0 <= index < len(prompts) and isinstance(text, str) and text.strip():
+            answers[index] = text.strip()
+
+    missing = answers.count(None)
+    if missing:
+        logger.warning("Batched OpenAI response was missing %d of %d answers", missing, len(prompts))
+    return answers
 
 
 if __name__ == "__main__":
@@ -0,0 +1,91 @@
+"""
+Seedable source of randomness for the synthetic account generators.
+
+Every create_random_* function and the seeding orchestration draw their
+random numbers, Faker values and dates from a GenerationContext instead of
+the global random module, a fresh Faker and datetime.now(). A context with a
+seed and a reference date always produces the same ledger, so seeded
+customers (and benchmarks run on them) can be compared across versions.
+
+Each account gets a child context derived from its parent's seed and the
+account's position, so an account's transactions do not depend on how many
+random numbers were drawn for the accounts before it.
+
+Without a seed the context behaves as before: unpredictable values, with
+dates relative to the current day. customer_context() seeds each new
+customer's ledger from the GENERATION_SEED and GENERATION_REFERENCE_DATE
+settings, when they are set.
+"""
+import random
+import threading
+from datetime import date, timedelta
+from typing import Optional
+
+from helperFunctions.settings import Settings, get_settings
+
+
+class GenerationContext:
+    def __init__(self, seed: Optional[int] = None, reference_date: Optional[date] = None):
+        """
+        Parameters:
+        - seed: Seed for every random draw; None for an unpredictable context
+        - reference_date: Day generated dates count back from; None for today (evaluated at each draw)
+        """
+        self.seed = seed
+        self.reference_date = reference_date
+        self.random = random.Random(seed)
+        self._faker = None
+        self._faker_lock = threading.Lock()
+
+    @property
+    def faker(self):
+        """A Faker instance seeded from this context, created on first use (Faker is slow to import)"""
+        with self._faker_lock:
+            if self._faker is None:
+                from faker import Faker
+
+                self._faker = Faker()
+                self._faker.seed_instance(self.random.getrandbits(64))
+            return self._faker
+
+    @property
+    def today(self) -> date:
+        return self.reference_date or date.today()
+
+    def random_date(self, min_days_ago: int, max_days_ago: int) -> str:
+        """A date between min_days_ago and max_days_ago before the reference date, as YYYY-MM-DD"""
+        return (self.today - timedelta(days=self.random.randint(min_days_ago, max_days_ago))).strftime("%Y-%m-%d")
+
+    def child(self, key: str) -> "GenerationContext":
+        """
+        A context for one part of the data (e.g., one account), seeded from this
+        context's seed and key rather than from how much of this context has been used.
+        """
+        seed = None
+        if self.seed is not None:
+            # String seeds are hashed with SHA-512, so this is stable across processes
+            seed = random.Random(f"{self.seed}/{key}").getrandbits(64)
+        return GenerationContext(seed, self.reference_date)
+
+
+_default_context = GenerationContext()
+
+
+def default_context() -> GenerationContext:
+    """The unseeded context used when a generator is not given one"""
+    return _default_context
+
+
+def customer_context(customer_id: str, settings: Settings = None) -> GenerationContext:
+    """
+    The context for seeding a customer's accounts: with GENERATION_SEED set, a
+    child of the seeded context keyed by the customer ID, so each customer's
+    ledger is the same whatever order customers are seeded in; the unseeded
+    default context otherwise.
+    """
+    settings = settings or get_settings()
+    if settings.generation_seed is None:
+        return default_context()
+    reference_date = settings.generation_reference_date
+    root = GenerationContext(settings.generation_seed, date.fromisoformat(reference_date) if reference_date else None)
+    return root.child(f"customer-{customer_id}")
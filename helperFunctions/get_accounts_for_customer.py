@@ -1,15 +1,18 @@
-import os
+import logging
 import requests
-from dotenv import load_dotenv
+from helperFunctions.settings import get_settings
+from helperFunctions.tracing import traced_request
+
+logger = logging.getLogger(__name__)
 
 def get_accounts_for_customer(customer_id):
     """Get all accounts for a customer"""
-    load_dotenv()
-    url = f"{os.getenv('NESSIE_API_KEY')}/customers/{customer_id}/accounts?key={os.getenv('NESSIE_API_KEY')}"
+    settings = get_settings()
+    url = f"{settings.nessie_api_url}/customers/{customer_id}/accounts?key={settings.nessie_api_key}"
     try:
-        response = requests.get(url)
+        response = traced_request("GET", url, "nessie")
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
-        print(f"Error getting accounts: {str(e)}")
+        logger.warning("Error getting accounts: %s", e)
         return []
\ No newline at end of file
@@ -1,8 +1,18 @@
+import logging
 import requests
 import pandas as pd
 from datetime import datetime
 import json
-from typing import Dict
+from typing import Dict, Iterator, List, Optional, Tuple, Any
+from helperFunctions.stream_json import iter_json_array, build_frame
+from helperFunctions import ledger_export
+from helperFunctions.settings import Settings, get_settings
+from helperFunctions.tracing import traced_request
+
+logger = logging.getLogger(__name__)
+
+# Size of the raw chunks read from streamed API responses
+STREAM_CHUNK_SIZE = 64 * 1024
 
 class BankDataManager:
     """Class to manage banking data retrieval and organization"""
@@ -23,24 +33,60 @@ class BankDataManager:
         self.merchants_df = None
         self.loans_df = None
         
+        # Per-customer balance and debt index, see build_customer_index()
+        self.customer_index = None
+        self.customer_metrics_df = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings = None) -> "BankDataManager":
+        """Create a manager using the Nessie URL and key from settings (loaded once at startup)"""
+        settings = settings or get_settings()
+        settings.require("nessie_api_key")
+        return cls(settings.nessie_api_url, settings.nessie_api_key)
+        
     def _make_api_request(self, endpoint: str, method: str = "GET", data: Dict = None) -> Dict:
         """Make an API request to the Nessie API"""
         url = f"{self.api_url}/{endpoint}?key={self.api_key}"
         
         try:
             if method == "GET":
-                response = requests.get(url, headers=self.headers)
+                response = traced_request("GET", url, "nessie", headers=self.headers)
             elif method == "POST":
-                response = requests.post(url, headers=self.headers, data=json.dumps(data) if data else None)
+                response = traced_request("POST", url, "nessie", headers=self.headers,
+                                          data=json.dumps(data) if data else None)
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
                 
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
-            print(f"API request error: {str(e)}")
+            logger.warning("API request error: %s", e)
             return {}
     
+    def _stream_api_request(self, endpoint: str) -> Iterator[Dict]:
+        """Stream the elements of a Nessie array response without loading the whole body"""
+        url = f"{self.api_url}/{endpoint}?key={self.api_key}"
+        
+        with traced_request("GET", url, "nessie", headers=self.headers, stream=True) as response:
+            response.raise_for_status()
+            yield from iter_json_array(response.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+    
+    def _fetch_frame(self, endpoint: str, fields: List[Tuple[str, Any, Any]]) -> pd.DataFrame:
+        """
+        Stream an array endpoint straight into a DataFrame.
+        
+        Records are parsed one at a time and their fields appended to typed
+        column buffers, so peak memory is bounded by the columns themselves
+        rather than by several copies of the decoded response.
+        """
+        try:
+            return build_frame(self._stream_api_request(endpoint), fields)
+        except requests.exceptions.RequestException as e:
+            logger.warning("API request error: %s", e)
+        except ValueError as e:
+            logger.warning("API response error for %s: %s", endpoint, e)
+        return pd.DataFrame()
+    
     def get_customer(self, customer_id: str) -> pd.DataFrame:
         """Retrieve a specific customer by ID and return as DataFrame"""
         customer = self._make_api_request(f"customers/{customer_id}")
@@ -72,31 +118,25 @@ class BankDataManager:
     
     def get_customer_accounts(self, customer_id: str) -> pd.DataFrame:
         """Retrieve all accounts for a specific customer"""
-        accounts = self._make_api_request(f"customers/{customer_id}/accounts")
-        
-        if not accounts:
-            return pd.DataFrame()
-        
-        account_records = []
-        for account in accounts:
-            record = {
-                "account_id": account.get("_id", ""),
-                "customer_id": account.get("customer_id", ""),
-                "type": account.get("type", ""),
-                "nickname": account.get("nickname", ""),
-                "rewards": account.get("rewards", 0),
-                "balance": account.get("balance", 0),
-                "account_number": account.get("account_number", "")
-            }
-            account_records.append(record)
-            
-        customer_accounts_df = pd.DataFrame(account_records)
+        customer_accounts_df = self._fetch_frame(f"customers/{customer_id}/accounts", [
+            ("account_id", ("_id",), ""),
+            ("customer_id", ("customer_id",), ""),
+            ("type", ("type",), ""),
+            ("nickname", ("nickname",), ""),
+            ("rewards", ("rewards",), 0),
+            ("balance", ("balance",), 0),
+            ("account_number", ("account_number",), "")
+        ])
+        
+        if customer_accounts_df.empty:
+            return customer_accounts_df
         
         # Update accounts_df or create if it doesn't exist
         if self.accounts_df is None:
             self.accounts_df = customer_accounts_df
         else:
             self.accounts_df = pd.concat([self.accounts_df, customer_accounts_df], ignore_index=True)
+        self.customer_index = None
             
         return customer_accounts_df
     
@@ -126,101 +166,61 @@ class BankDataManager:
     
     def _get_account_deposits(self, account_id: str) -> pd.DataFrame:
         """Get all deposits for an account"""
-        deposits = self._make_api_request(f"accounts/{account_id}/deposits")
-        
-        if not deposits:
-            return pd.DataFrame()
-        
-        deposit_records = []
-        for deposit in deposits:
-            record = {
-                "transaction_id": deposit.get("_id", ""),
-                "account_id": account_id,
-                "transaction_type": "deposit",
-                "amount": deposit.get("amount", 0),
-                "description": deposit.get("description", ""),
-                "transaction_date": deposit.get("transaction_date", ""),
-                "status": deposit.get("status", ""),
-                "medium": deposit.get("medium", ""),
-                "payee_id": deposit.get("payee_id", "")
-            }
-            deposit_records.append(record)
-            
-        return pd.DataFrame(deposit_records)
+        return self._fetch_frame(f"accounts/{account_id}/deposits", [
+            ("transaction_id", ("_id",), ""),
+            ("account_id", None, account_id),
+            ("transaction_type", None, "deposit"),
+            ("amount", ("amount",), 0),
+            ("description", ("description",), ""),
+            ("transaction_date", ("transaction_date",), ""),
+            ("status", ("status",), ""),
+            ("medium", ("medium",), ""),
+            ("payee_id", ("payee_id",), "")
+        ])
     
     def _get_account_withdrawals(self, account_id: str) -> pd.DataFrame:
         """Get all withdrawals for an account"""
-        withdrawals = self._make_api_request(f"accounts/{account_id}/withdrawals")
-        
-        if not withdrawals:
-            return pd.DataFrame()
-        
-        withdrawal_records = []
-        for withdrawal in withdrawals:
-            record = {
-                "transaction_id": withdrawal.get("_id", ""),
-                "account_id": account_id,
-                "transaction_type": "withdrawal",
-                "amount": withdrawal.get("amount", 0),
-                "description": withdrawal.get("description", ""),
-                "transaction_date": withdrawal.get("transaction_date", ""),
-                "status": withdrawal.get("status", ""),
-                "medium": withdrawal.get("medium", ""),
-                "payer_id": withdrawal.get("payer_id", "")
-            }
-            withdrawal_records.append(record)
-            
-        return pd.DataFrame(withdrawal_records)
+        return self._fetch_frame(f"accounts/{account_id}/withdrawals", [
+            ("transaction_id", ("_id",), ""),
+            ("account_id", None, account_id),
+            ("transaction_type", None, "withdrawal"),
+            ("amount", ("amount",), 0),
+            ("description", ("description",), ""),
+            ("transaction_date", ("transaction_date",), ""),
+            ("status", ("status",), ""),
+            ("medium", ("medium",), ""),
+            ("payer_id", ("payer_id",), "")
+        ])
     
     def _get_account_transfers(self, account_id: str) -> pd.DataFrame:
         """Get all transfers for an account"""
-        transfers = self._make_api_request(f"accounts/{account_id}/transfers")
-        
-        if not transfers:
-            return pd.DataFrame()
-        
-        transfer_records = []
-        for transfer in transfers:
-            record = {
-                "transaction_id": transfer.get("_id", ""),
-                "account_id": account_id,
-                "transaction_type": "transfer",
-                "amount": transfer.get("amount", 0) if "amount" in transfer else 0,
-                "description": transfer.get("description", ""),
-                "transaction_date": transfer.get("transaction_date", ""),
-                "status": transfer.get("status", ""),
-                "medium": transfer.get("medium", ""),
-                "payer_id": transfer.get("payer_id", ""),
-                "payee_id": transfer.get("payee_id", "")
-            }
-            transfer_records.append(record)
-            
-        return pd.DataFrame(transfer_records)
+        return self._fetch_frame(f"accounts/{account_id}/transfers", [
+            ("transaction_id", ("_id",), ""),
+            ("account_id", None, account_id),
+            ("transaction_type", None, "transfer"),
+            ("amount", ("amount",), 0),
+            ("description", ("description",), ""),
+            ("transaction_date", ("transaction_date",), ""),
+            ("status", ("status",), ""),
+            ("medium", ("medium",), ""),
+            ("payer_id", ("payer_id",), ""),
+            ("payee_id", ("payee_id",), "")
+        ])
     
     def _get_account_purchases(self, account_id: str) -> pd.DataFrame:
         """Get all purchases for an account"""
-        purchases = self._make_api_request(f"accounts/{account_id}/purchases")
-        
-        if not purchases:
-            return pd.DataFrame()
-        
-        purchase_records = []
-        for purchase in purchases:
-            record = {
-                "transaction_id": purchase.get("_id", ""),
-                "account_id": account_id,
-                "transaction_type": "purchase",
-                "amount": purchase.get("amount", 0),
-                "description": purchase.get("description", ""),
-                "transaction_date": purchase.get("purchase_date", ""),
-                "status": purchase.get("status", ""),
-                "medium": purchase.get("medium", ""),
-                "merchant_id": purchase.get("merchant_id", ""),
-                "payer_id": purchase.get("payer_id", "")
-            }
-            purchase_records.append(record)
-            
-        return pd.DataFrame(purchase_records)
+        return self._fetch_frame(f"accounts/{account_id}/purchases", [
+            ("transaction_id", ("_id",), ""),
+            ("account_id", None, account_id),
+            ("transaction_type", None, "purchase"),
+            ("amount", ("amount",), 0),
+            ("description", ("description",), ""),
+            ("transaction_date", ("purchase_date",), ""),
+            ("status", ("status",), ""),
+            ("medium", ("medium",), ""),
+            ("merchant_id", ("merchant_id",), ""),
+            ("payer_id", ("payer_id",), "")
+        ])
     
     def get_merchant_info(self, merchant_id: str) -> Dict:
         """Get merchant information"""
@@ -228,73 +228,50 @@ class BankDataManager:
     
     def get_account_loans(self, account_id: str) -> pd.DataFrame:
         """Get loans associated with an account"""
-        loans = self._make_api_request(f"accounts/{account_id}/loans")
-        
-        if not loans:
-            return pd.DataFrame()
-        
-        loan_records = []
-        for loan in loans:
-            record = {
-                "loan_id": loan.get("_id", ""),
-                "account_id": account_id,
-                "type": loan.get("type", ""),
-                "status": loan.get("status", ""),
-                "credit_score": loan.get("credit_score", 0),
-                "monthly_payment": loan.get("monthly_payment", 0),
-                "amount": loan.get("amount", 0),
-                "description": loan.get("description", ""),
-                "creation_date": loan.get("creation_date", "")
-            }
-            loan_records.append(record)
-            
-        loans_df = pd.DataFrame(loan_records)
+        loans_df = self._fetch_frame(f"accounts/{account_id}/loans", [
+            ("loan_id", ("_id",), ""),
+            ("account_id", None, account_id),
+            ("type", ("type",), ""),
+            ("status", ("status",), ""),
+            ("credit_score", ("credit_score",), 0),
+            ("monthly_payment", ("monthly_payment",), 0),
+            ("amount", ("amount",), 0),
+            ("description", ("description",), ""),
+            ("creation_date", ("creation_date",), "")
+        ])
+        
+        if loans_df.empty:
+            return loans_df
         
         # Update loans_df or create if it doesn't exist
         if self.loans_df is None:
             self.loans_df = loans_df
         else:
             self.loans_df = pd.concat([self.loans_df, loans_df], ignore_index=True)
+        self.customer_index = None
             
         return loans_df
     
     def get_all_merchant_data(self) -> pd.DataFrame:
         """Get all merchant data and store in DataFrame"""
-        merchants = self._make_api_request("merchants")
-        
-        if not merchants:
-            return pd.DataFrame()
-        
-        merchant_records = []
-        for merchant in merchants:
-            record = {
-                "merchant_id": merchant.get("_id", ""),
-                "name": merchant.get("name", ""),
-                "category": merchant.get("category", "")
-            }
-            
-            # Extract address if present
-            address = merchant.get("address", {})
-            if address:
-                record.update({
-                    "street_number": address.get("street_number", ""),
-                    "street_name": address.get("street_name", ""),
-                    "city": address.get("city", ""),
-                    "state": address.get("state", ""),
-                    "zip": address.get("zip", "")
-                })
-                
-            # Extract geocode if present
-            geocode = merchant.get("geocode", {})
-            if geocode:
-                record.update({
-                    "latitude": geocode.get("lat", 0),
-                    "longitude": geocode.get("lng", 0)
-                })
-                
-            merchant_records.append(record)
-            
-        self.merchants_df = pd.DataFrame(merchant_records)
+        # Address and geocode columns are null for merchants that lack them
+        merchants_df = self._fetch_frame("merchants", [
+            ("merchant_id", ("_id",), ""),
+            ("name", ("name",), ""),
+            ("category", ("category",), ""),
+            ("street_number", ("address", "street_number"), ""),
+            ("street_name", ("address", "street_name"), ""),
+            ("city", ("address", "city"), ""),
+            ("state", ("address", "state"), ""),
+            ("zip", ("address", "zip"), ""),
+            ("latitude", ("geocode", "lat"), 0),
+            ("longitude", ("geocode", "lng"), 0)
+        ])
+        
+        if merchants_df.empty:
+            return merchants_df
+        
+        self.merchants_df = merchants_df
         return self.merchants_df
     
     def fetch_customer_data(self, customer_id: str) -> Dict[str, pd.DataFrame]:
@@ -304,6 +281,7 @@ class BankDataManager:
         self.accounts_df = None
         self.transactions_df = None
         self.loans_df = None
+        self.customer_index = None
         
         # Get customer info directly
         self.customers_df = self.get_customer(customer_id)
@@ -312,7 +290,7 @@ class BankDataManager:
         accounts_df = self.get_customer_accounts(customer_id)
         
         if accounts_df.empty:
-            print(f"No accounts found for customer {customer_id}")
+            logger.info("No accounts found for customer %s", customer_id)
             return {
                 "customers": self.customers_df if self.customers_df is not None else pd.DataFrame(),
                 "accounts": pd.DataFrame(),
@@ -345,6 +323,9 @@ class BankDataManager:
                 if merchant_data:
                     self.merchants_df = self.get_all_merchant_data()
         
+        # Index balances and debt once so metric lookups don't re-filter the frames
+        self.build_customer_index()
+        
         # Return all dataframes
         return {
             "customers": self.customers_df if self.customers_df is not None else pd.DataFrame(),
@@ -354,66 +335,106 @@ class BankDataManager:
             "merchants": self.merchants_df if self.merchants_df is not None else pd.DataFrame()
         }
     
-    def calculate_customer_net_worth(self, customer_id: str) -> float:
-        """Calculate net worth for a customer"""
+    def build_customer_index(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Precompute account ids, balance totals and active-loan totals per customer.
+        
+        Built once when data is loaded (and lazily after accounts or loans change),
+        so net worth, debt and ratio queries are dictionary lookups instead of
+        repeated filtering of accounts_df and loans_df. Call it again after
+        assigning the DataFrames directly.
+        """
+        self.customer_index = {}
+        self.customer_metrics_df = pd.DataFrame(
+            columns=["total_balance", "total_debt", "net_worth", "debt_to_assets"],
+            index=pd.Index([], name="customer_id"),
+            dtype=float
+        )
+        
         if self.accounts_df is None or self.accounts_df.empty:
-            return 0
-            
-        # Get all accounts for this customer
-        customer_accounts = self.accounts_df[self.accounts_df['customer_id'] == customer_id]
+            return self.customer_index
         
-        if customer_accounts.empty:
-            return 0
-            
-        # Sum balances from all accounts
-        total_balance = customer_accounts['balance'].sum()
+        accounts = self.accounts_df
+        balances = accounts.groupby('customer_id', sort=False)['balance'].sum()
+        account_ids = accounts.groupby('customer_id', sort=False)['account_id'].agg(list)
         
-        # Subtract outstanding loans if available
+        # Attribute each active loan to the customer owning its account
+        debts = pd.Series(dtype=float)
         if self.loans_df is not None and not self.loans_df.empty:
-            # Filter loans for customer's accounts
-            customer_account_ids = customer_accounts['account_id'].tolist()
-            customer_loans = self.loans_df[self.loans_df['account_id'].isin(customer_account_ids)]
-            
-            if not customer_loans.empty:
-                # Only consider active loans
-                active_loans = customer_loans[customer_loans['status'] != 'completed']
-                if not active_loans.empty:
-                    total_loan_amount = active_loans['amount'].sum()
-                    total_balance -= total_loan_amount
+            active_loans = self.loans_df[self.loans_df['status'] != 'completed']
+            account_owner = accounts.drop_duplicates('account_id').set_index('account_id')['customer_id']
+            owners = active_loans['account_id'].map(account_owner)
+            debts = active_loans['amount'].groupby(owners).sum()
+        
+        for customer_id, total_balance in balances.items():
+            total_debt = debts[customer_id] if customer_id in debts.index else 0
+            self.customer_index[customer_id] = {
+                "account_ids": account_ids[customer_id],
+                "total_balance": total_balance,
+                "total_debt": total_debt,
+                "net_worth": total_balance - total_debt
+            }
+        
+        metrics = pd.DataFrame({"total_balance": balances})
+        metrics["total_debt"] = debts.reindex(metrics.index, fill_value=0)
+        metrics["net_worth"] = metrics["total_balance"] - metrics["total_debt"]
+        metrics["debt_to_assets"] = metrics["total_debt"] / metrics["total_balance"].where(metrics["total_balance"] != 0)
+        self.customer_metrics_df = metrics
+        
+        return self.customer_index
+    
+    def _get_customer_entry(self, customer_id: str) -> Dict[str, Any]:
+        """Look up a customer in the index, building it first if needed"""
+        if self.customer_index is None:
+            self.build_customer_index()
+        return self.customer_index.get(customer_id)
+    
+    def calculate_customer_net_worth(self, customer_id: str) -> float:
+        """Calculate net worth for a customer"""
+        entry = self._get_customer_entry(customer_id)
+        if entry is None:
+            return 0
         
         # Return without dividing by 100 - display the full value
-        return total_balance
+        return entry["net_worth"]
     
     def calculate_total_debt(self, customer_id: str) -> float:
         """Calculate total debt for a customer"""
-        if self.loans_df is None or self.loans_df.empty:
+        entry = self._get_customer_entry(customer_id)
+        if entry is None:
             return 0
-            
-        # Get all accounts for this customer
-        if self.accounts_df is None or self.accounts_df.empty:
-            return 0
-            
-        customer_accounts = self.accounts_df[self.accounts_df['customer_id'] == customer_id]
         
-        if customer_accounts.empty:
-            return 0
-            
-        # Get account IDs for this customer
-        customer_account_ids = customer_accounts['account_id'].tolist()
+        # Return without dividing by 100 - display the full value
+        return entry["total_debt"]
+    
+    def calculate_debt_to_assets_ratio(self, customer_id: str) -> Optional[float]:
+        """Active loan total divided by total account balance, or None without balances"""
+        entry = self._get_customer_entry(customer_id)
+        if entry is None or not entry["total_balance"]:
+            return None
+        return float(entry["total_debt"] / entry["total_balance"])
+    
+    def calculate_metrics_for_customers(self, customer_ids: List[str] = None) -> pd.DataFrame:
+        """
+        Net worth, debt and ratios for many customers at once
         
-        # Filter loans for customer's accounts
-        customer_loans = self.loans_df[self.loans_df['account_id'].isin(customer_account_ids)]
+        Parameters:
+        - customer_ids: Customers to include; defaults to every customer loaded
         
-        if customer_loans.empty:
-            return 0
-            
-        # Sum amounts from active loans
-        active_loans = customer_loans[customer_loans['status'] != 'completed']
-        if active_loans.empty:
-            return 0
-            
-        # Return without dividing by 100 - display the full value
-        return active_loans['amount'].sum()
+        Returns:
+        DataFrame indexed by customer_id with total_balance, total_debt,
+        net_worth and debt_to_assets columns (zeros for unknown customers)
+        """
+        if self.customer_index is None:
+            self.build_customer_index()
+        if customer_ids is None:
+            return self.customer_metrics_df.copy()
+        
+        metrics = self.customer_metrics_df.reindex(customer_ids)
+        metrics[["total_balance", "total_debt", "net_worth"]] = (
+            metrics[["total_balance", "total_debt", "net_worth"]].fillna(0)
+        )
+        return metrics
     
     def get_transaction_summary(self, customer_id: str, time_period: str = None) -> pd.DataFrame:
         """
@@ -429,17 +450,12 @@ class BankDataManager:
         if self.transactions_df is None or self.transactions_df.empty:
             return pd.DataFrame()
             
-        # Get all accounts for this customer
-        if self.accounts_df is None or self.accounts_df.empty:
-            return pd.DataFrame()
-            
-        customer_accounts = self.accounts_df[self.accounts_df['customer_id'] == customer_id]
-        
-        if customer_accounts.empty:
+        # Get account IDs for this customer
+        entry = self._get_customer_entry(customer_id)
+        if entry is None:
             return pd.DataFrame()
             
-        # Get account IDs for this customer
-        customer_account_ids = customer_accounts['account_id'].tolist()
+        customer_account_ids = entry["account_ids"]
         
         # Filter transactions for customer's accounts
         customer_transactions = self.transactions_df[
@@ -476,6 +492,14 @@ class BankDataManager:
         
         return summary
     
+    def to_arrow_tables(self, customer_id: str) -> Dict:
+        """Export the customer's accounts, transactions, loans and merchants as Arrow tables"""
+        return ledger_export.ledger_tables(self, customer_id)
+    
+    def to_parquet(self, customer_id: str, directory: str) -> List[str]:
+        """Write the customer's ledger tables as Parquet files and return their paths"""
+        return ledger_export.write_ledger_parquet(self.to_arrow_tables(customer_id), directory)
+    
     def to_dict_for_api(self, customer_id: str) -> Dict:
         """Format customer data for API consumption"""
         # Ensure we have data
@@ -494,43 +518,37 @@ class BankDataManager:
         # Get accounts
         accounts = self.accounts_df[self.accounts_df['customer_id'] == customer_id]
         if not accounts.empty:
-            accounts_list = []
+            account_ids = accounts['account_id']
             
-            for _, account in accounts.iterrows():
-                account_id = account['account_id']
-                # Convert account to dict with native Python types
-                account_data = json.loads(account.to_json())
-                
-                # Get transactions for this account
-                if self.transactions_df is not None and not self.transactions_df.empty:
-                    account_transactions = self.transactions_df[
-                        self.transactions_df['account_id'] == account_id
-                    ]
-                    
-                    if not account_transactions.empty:
-                        # Group transactions by type
-                        transactions_by_type = {}
-                        for tx_type, group in account_transactions.groupby('transaction_type'):
-                            # Convert each transaction to dict with native Python types
-                            tx_list = []
-                            for _, tx in group.iterrows():
-                                tx_list.append(json.loads(tx.to_json()))
-                            transactions_by_type[tx_type] = tx_list
-                            
-                        account_data['transactions'] = transactions_by_type
-                
-                # Get loans for this account
-                if self.loans_df is not None and not self.loans_df.empty:
-                    account_loans = self.loans_df[self.loans_df['account_id'] == account_id]
-                    
-                    if not account_loans.empty:
-                        # Convert loans to dict with native Python types
-                        loan_list = []
-                        for _, loan in account_loans.iterrows():
-                            loan_list.append(json.loads(loan.to_json()))
-                        account_data['loans'] = loan_list
+            # Group transactions by account and type in a single pass. Each table is
+            # serialized with one bulk to_json call so values are encoded exactly as
+            # the per-row to_json did (NaN -> null, dates -> epoch ms, float precision).
+            transactions_by_account = {}
+            if self.transactions_df is not None and not self.transactions_df.empty:
+                account_transactions = self.transactions_df[self.transactions_df['account_id'].isin(account_ids)]
+                records = json.loads(account_transactions.to_json(orient='records'))
+                for account_id, tx_type, record in zip(account_transactions['account_id'],
+                                                       account_transactions['transaction_type'], records):
+                    transactions_by_account.setdefault(account_id, {}).setdefault(tx_type, []).append(record)
+            
+            loans_by_account = {}
+            if self.loans_df is not None and not self.loans_df.empty:
+                account_loans = self.loans_df[self.loans_df['account_id'].isin(account_ids)]
+                records = json.loads(account_loans.to_json(orient='records'))
+                for account_id, record in zip(account_loans['account_id'], records):
+                    loans_by_account.setdefault(account_id, []).append(record)
+            
+            accounts_list = json.loads(accounts.to_json(orient='records'))
+            for account_id, account_data in zip(account_ids, accounts_list):
+                transactions_by_type = transactions_by_account.get(account_id)
+                if transactions_by_type:
+                    # groupby() ordered transaction types alphabetically; keep that order
+                    account_data['transactions'] = {
+                        tx_type: transactions_by_type[tx_type] for tx_type in sorted(transactions_by_type)
+                    }
                 
-                accounts_list.append(account_data)
+                if account_id in loans_by_account:
+                    account_data['loans'] = loans_by_account[account_id]
             
             customer_data['accounts'] = accounts_list
         
@@ -542,10 +560,7 @@ class BankDataManager:
         transaction_summary = self.get_transaction_summary(customer_id)
         if not transaction_summary.empty:
             # Convert summary to dict with native Python types
-            summary_list = []
-            for _, summary in transaction_summary.iterrows():
-                summary_list.append(json.loads(summary.to_json()))
-            customer_data['transaction_summary'] = summary_list
+            customer_data['transaction_summary'] = json.loads(transaction_summary.to_json(orient='records'))
         
         return customer_data
 
@@ -561,14 +576,11 @@ def process_customer(customer_id: str, time_period: str = None) -> Dict:
     Dictionary with customer data and metrics
     """
     # Initialize the manager
-    api_url = "http://api.nessieisreal.com"
-    api_key = "9699a5b7260039b6a8fac75cf9dae5d0"
-    
-    bank_manager = BankDataManager(api_url, api_key)
+    bank_manager = BankDataManager.from_settings()
     
-    print(f"Processing data for customer ID: {customer_id}")
+    logger.info("Processing data for customer ID: %s", customer_id)
     if time_period:
-        print(f"Using time filter: {time_period}")
+        logger.info("Using time filter: %s", time_period)
     
     # Fetch data for just this customer
     data = bank_manager.fetch_customer_data(customer_id)
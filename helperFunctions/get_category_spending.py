@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List, Any
+
+
+def get_category_spending(transactions_df: pd.DataFrame, merchants_df: pd.DataFrame,
+                          timestamp: str = None) -> List[Dict[str, Any]]:
+    """
+    Summarize purchase spending by merchant category.
+
+    Purchases are joined to merchants on merchant_id through a hash index on the
+    merchant table, then spend and counts for the current and previous period are
+    computed in a single groupby. Everything stays vectorized so customers with
+    tens of thousands of purchases are handled in one pass.
+
+    Parameters:
+    - transactions_df: Unfiltered transactions for the customer (all types)
+    - merchants_df: Merchant table with merchant_id and category columns
+    - timestamp: Optional period length (e.g., "7d", "30d"). The previous period
+      is the window of the same length immediately before it.
+
+    Returns:
+    List of dictionaries sorted by current-period spend, highest first
+    """
+    if transactions_df is None or transactions_df.empty or 'merchant_id' not in transactions_df.columns:
+        return []
+
+    purchases = transactions_df.loc[
+        transactions_df['transaction_type'] == 'purchase',
+        ['merchant_id', 'amount', 'transaction_date']
+    ]
+    if purchases.empty:
+        return []
+
+    # Hash join: Series.map against a uniquely indexed Series is a hash lookup per row
+    if merchants_df is not None and not merchants_df.empty and 'category' in merchants_df.columns:
+        category_index = merchants_df.drop_duplicates('merchant_id').set_index('merchant_id')['category']
+        categories = purchases['merchant_id'].map(category_index)
+    else:
+        categories = pd.Series(np.nan, index=purchases.index, dtype=object)
+    categories = categories.replace('', np.nan).fillna('Other')
+
+    # Label each purchase with the period it falls in
+    if timestamp and timestamp.endswith('d'):
+        days = int(timestamp[:-1])
+        dates = pd.to_datetime(purchases['transaction_date'], errors='coerce')
+        current_start = datetime.now() - pd.Timedelta(days=days)
+        previous_start = current_start - pd.Timedelta(days=days)
+        periods = np.select(
+            [dates >= current_start, dates >= previous_start],
+            ['current', 'previous'],
+            default='older'
+        )
+    else:
+        periods = np.full(len(purchases), 'current', dtype=object)
+
+    grouped = pd.DataFrame({
+        'category': categories.to_numpy(),
+        'period': periods,
+        'amount': purchases['amount'].to_numpy()
+    }).groupby(['category', 'period'])['amount'].agg(['sum', 'count']).unstack('period', fill_value=0)
+
+    def period_column(stat, period):
+        if (stat, period) in grouped.columns:
+            return grouped[(stat, period)]
+        return pd.Series(0, index=grouped.index)
+
+    summary = pd.DataFrame({
+        'amount': period_column('sum', 'current'),
+        'count': period_column('count', 'current'),
+        'previous_amount': period_column('sum', 'previous')
+    })
+    summary = summary[summary['count'] > 0]
+    if summary.empty:
+        return []
+
+    summary['change'] = summary['amount'] - summary['previous_amount']
+    summary['change_percent'] = (
+        summary['change'] / summary['previous_amount'].where(summary['previous_amount'] != 0) * 100
+    )
+    summary = summary.sort_values('amount', ascending=False).round(2)
+
+    records = []
+    for category, amount, count, previous_amount, change, change_percent in zip(
+            summary.index, summary['amount'], summary['count'], summary['previous_amount'],
+            summary['change'], summary['change_percent']):
+        records.append({
+            "category": category,
+            "amount": float(amount),
+            "count": int(count),
+            "previous_amount": float(previous_amount),
+            "change": float(change),
+            "change_percent": None if pd.isna(change_percent) else float(change_percent)
+        })
+    return records
@@ -1,52 +1,55 @@
-import os
+import logging
 from datetime import datetime
 import requests
-from dotenv import load_dotenv
 from helperFunctions.generate_open_ai_summary import generate_open_ai_summary
+from helperFunctions.prompt_builder import news_summary_prompt
+from helperFunctions.settings import Settings, get_settings
+from helperFunctions.tracing import span, traced_request
 
-def get_news_articles_and_summary():
+logger = logging.getLogger(__name__)
+
+# The headlines are the same for every newsletter, so the last good result is
+# served while NewsAPI is failing or its circuit is open
+_last_good_news = None
+
+def get_news_articles_and_summary(settings: Settings = None):
     """Get latest business news articles and generate a summary"""
-    load_dotenv()
+    global _last_good_news
+    settings = settings or get_settings()
     # Use the top-headlines endpoint for more reliable results
-    url = (f'https://newsapi.org/v2/top-headlines?'
+    url = (f'{settings.news_api_url}?'
            f'country=us&'
            f'category=business&'
-           f'apiKey={os.getenv("NEWS_API_KEY")}')
+           f'apiKey={settings.news_api_key}')
     
-    response = requests.get(url)
     articles = []
+    try:
+        response = traced_request("GET", url, "newsapi")
+    except requests.exceptions.RequestException as e:
+        logger.warning("Failed to fetch news: %s", e)
+        response = None
     
-    if response.status_code == 200:
+    if response is not None and response.status_code == 200:
         data = response.json()
         all_articles = data.get('articles', [])
         if all_articles:
             articles = all_articles[:5]
         else:
-            print("No articles found.")
-    else:
-        print(f"Failed to fetch news. Status code: {response.status_code}")
-        if response.content:
-            try:
-                print(response.json())
-            except:
-                print(response.content)
+            logger.warning("No articles found.")
+    elif response is not None:
+        logger.warning("Failed to fetch news. Status code: %s, body: %s", response.status_code, response.text[:500])
     
     news_summary = ""
     if articles:
-        headlines = "\n".join([f"- {article['title']} ({article['source']['name']})"
-                              for article in articles])
-        summary_prompt = (
-            f"Here are today's top financial news headlines:\n{headlines}\n\n"
-            f"Create a brief, insightful summary of these financial headlines in 1-2 sentences. "
-            f"Focus on the most important trends or events."
-        )
+        summary_prompt = news_summary_prompt(articles)
         try:
-            news_summary = generate_open_ai_summary(summary_prompt)
+            with span("openai.news_summary"):
+                news_summary = generate_open_ai_summary(summary_prompt, settings)
         except Exception as e:
-            print(f"Error generating news summary: {e}")
+            logger.warning("Error generating news summary: %s", e)
             news_summary = "Unable to generate news summary."
     
-    return {
+    news_data = {
         "articles": [
             {
                 "title": article["title"],
@@ -57,4 +60,16 @@ def get_news_articles_and_summary():
             for article in articles
         ],
         "summary": news_summary
-    }
\ No newline at end of file
+    }
+    if articles and news_summary:
+        _last_good_news = news_data
+    elif _last_good_news is not None:
+        return dict(_last_good_news)
+    return news_data
+
+
+def cached_news_articles_and_summary():
+    """The last good news result, or an empty one, without calling NewsAPI"""
+    if _last_good_news is not None:
+        return dict(_last_good_news)
+    return {"articles": [], "summary": ""}
@@ -1,59 +1,82 @@
-import yfinance as yf
+import logging
+from helperFunctions import resilience
+from helperFunctions.tracing import http_span
+
+logger = logging.getLogger(__name__)
+
+# Last price seen per ticker, preferred over the hardcoded fallbacks while Yahoo Finance is failing
+_last_good = {}
 
 def get_stocks_data(tickers):
     """
     Get stock data with guaranteed fallback data.
     This function will always return valid data even if Yahoo Finance API fails.
     """
+    # yfinance is slow to import, so load it on first use
+    import yfinance as yf
+
     result = []
     for ticker in tickers:
         try:
             # Try to get data from Yahoo Finance
             stock = yf.Ticker(ticker)
-            hist = stock.history(period="2d", interval="1h")
+            with http_span("yfinance", "GET"):
+                hist = resilience.upstream("yfinance").call(
+                    stock.history, period="2d", interval="1h", is_failure=lambda hist: hist.empty
+                )
             
             if not hist.empty:
                 latest_price = hist["Close"].iloc[-1]
                 yesterday_price = hist["Close"].iloc[0]
                 status = "Up" if latest_price > yesterday_price else "Down"
                 
-                result.append({
+                _last_good[ticker] = {
                     "ticker": ticker,
                     "price": int(latest_price),
                     "status": status
-                })
+                }
+                result.append(dict(_last_good[ticker]))
             else:
                 # Use fallback if history is empty
                 raise ValueError(f"Empty history for {ticker}")
         except Exception as e:
-            print(f"Failed to get ticker '{ticker}' reason: {str(e)}")
+            logger.warning("Failed to get ticker '%s' reason: %s", ticker, e)
             
-            # Use fallback data
-            if ticker == "^GSPC":
-                result.append({
-                    "ticker": "^GSPC",
-                    "price": 5769,
-                    "status": "Down"
-                })
-            elif ticker == "^DJI":
-                result.append({
-                    "ticker": "^DJI",
-                    "price": 42794,
-                    "status": "Up"
-                })
-            elif ticker == "^IXIC":
-                result.append({
-                    "ticker": "^IXIC",
-                    "price": 18193,
-                    "status": "Down"
-                })
-            else:
-                # Generic fallback for unknown tickers
-                import random
-                result.append({
-                    "ticker": ticker,
-                    "price": random.randint(50, 1000),
-                    "status": random.choice(["Up", "Down"])
-                })
+            result.append(fallback_stock_quote(ticker))
     
-    return result
\ No newline at end of file
+    return result
+
+def fallback_stock_quote(ticker):
+    """The last price seen for a ticker, or a hardcoded one if it has never been fetched"""
+    if ticker in _last_good:
+        return dict(_last_good[ticker])
+    if ticker == "^GSPC":
+        return {
+            "ticker": "^GSPC",
+            "price": 5769,
+            "status": "Down"
+        }
+    if ticker == "^DJI":
+        return {
+            "ticker": "^DJI",
+            "price": 42794,
+            "status": "Up"
+        }
+    if ticker == "^IXIC":
+        return {
+            "ticker": "^IXIC",
+            "price": 18193,
+            "status": "Down"
+        }
+    # Generic fallback for unknown tickers
+    import random
+    return {
+        "ticker": ticker,
+        "price": random.randint(50, 1000),
+        "status": random.choice(["Up", "Down"])
+    }
+
+
+def fallback_stocks_data(tickers):
+    """Fallback quotes for every ticker, without calling Yahoo Finance"""
+    return [fallback_stock_quote(ticker) for ticker in tickers]
@@ -0,0 +1,103 @@
+"""
+Batch headline prompts from many customers into one OpenAI request.
+
+During a cron run every worker thread builds a headline prompt for its
+customer. A HeadlineBatcher shared by the workers holds the prompts until
+batch_size are pending (or the oldest has waited max_wait seconds), sends them
+with generate_open_ai_summaries as one structured request and hands each
+worker its own answer. Items missing from a successful response fall back to
+a single request_open_ai_summary call in the worker's own thread; when the
+whole request fails, every item gets no headline rather than all of them
+retrying at once.
+
+A batch can only be as large as the number of workers waiting on it, so
+Settings rejects a HEADLINE_BATCH_SIZE larger than CRON_WORKERS.
+"""
+import contextvars
+import logging
+import threading
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from helperFunctions.generate_open_ai_summary import generate_open_ai_summaries, request_open_ai_summary
+from helperFunctions.prompt_builder import Prompt
+from helperFunctions.settings import Settings
+from helperFunctions.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class HeadlineBatcher:
+    def __init__(self, batch_size: int = 20, max_wait: float = 0.5, settings: Settings = None):
+        """
+        Parameters:
+        - batch_size: Send as soon as this many prompts are pending
+        - max_wait: Send after the oldest pending prompt has waited this many seconds
+        - settings: Optional settings; defaults to the ones loaded at startup
+        """
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.settings = settings
+        self.requests_sent = 0
+        self._pending: List[Tuple[Prompt, Future]] = []
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def summarize(self, prompt: Prompt) -> Optional[str]:
+        """
+        Generate one headline, batched with other threads' prompts; blocks until it is ready.
+
+        Returns:
+        The headline, or None if OpenAI could not produce one
+        """
+        future = Future()
+        batch = None
+        with self._lock:
+            self._pending.append((prompt, future))
+            if len(self._pending) >= self.batch_size:
+                batch = self._take_pending()
+            elif self._timer is None:
+                # The timer thread sends a partial batch inside this run's tracing context
+                self._timer = threading.Timer(self.max_wait, contextvars.copy_context().run, args=(self.flush,))
+                self._timer.daemon = True
+                self._timer.start()
+
+        if batch:
+            self._send(batch)
+
+        try:
+            answer = future.result()
+        except Exception:
+            # The batch request failed; retrying every item individually would send a burst of requests
+            return None
+        if answer is None:
+            answer = request_open_ai_summary(prompt, self.settings)
+        return answer
+
+    def flush(self):
+        """Send whatever is pending now"""
+        with self._lock:
+            batch = self._take_pending()
+        if batch:
+            self._send(batch)
+
+    def _take_pending(self) -> List[Tuple[Prompt, Future]]:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        return batch
+
+    def _send(self, batch: List[Tuple[Prompt, Future]]):
+        try:
+            with span("openai.headline_batch"):
+                answers = generate_open_ai_summaries([prompt for prompt, _ in batch], self.settings)
+            with self._lock:
+                self.requests_sent += 1
+        except Exception as e:
+            logger.error("Headline batch of %d failed: %s", len(batch), e)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), answer in zip(batch, answers):
+            future.set_result(answer)
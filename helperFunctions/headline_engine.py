@@ -0,0 +1,221 @@
+"""
+Tiered headline generation for newsletters.
+
+Two tiers produce the personalized headline at the top of a newsletter:
+- template: a deterministic headline written straight from the summary
+  metrics (net worth, spending, deposits, debt, trend, top categories and
+  largest transaction); takes microseconds and never fails
+- llm: the OpenAI headline, optionally batched with other customers', or
+  (with HEADLINE_STREAMING) streamed and cut off after three sentences
+
+When an LLM headline fails or misses its first-token deadline, the headline
+from the customer's last newsletter is reused if their numbers have not
+changed materially since (the cached tier); otherwise the template is used.
+
+A HeadlinePolicy decides per customer. Without limits every customer gets the
+LLM tier (falling back to the template if the call fails). With a cost budget
+(a maximum number of LLM headlines per run), the budget is spent only on
+customers whose metrics changed materially since their last newsletter. With
+a deadline, the LLM tier stops being used once a call is no longer expected
+to finish before it, so a large cron run finishes on time.
+
+Tier choices are exported as the newsletter_headline_tier_total metric.
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter
+
+from helperFunctions.generate_open_ai_summary import request_open_ai_summary, stream_open_ai_summary
+from helperFunctions.prompt_builder import Prompt
+from helperFunctions.settings import Settings, get_settings
+from helperFunctions.tracing import span
+
+TEMPLATE = "template"
+LLM = "llm"
+CACHED = "cached"
+
+HEADLINE_SENTENCES = 3
+
+HEADLINE_TIERS = Counter(
+    "newsletter_headline_tier_total",
+    "Newsletter headlines by tier and the reason it was chosen",
+    ["tier", "reason"]
+)
+
+CHANGE_METRICS = ("net_worth", "money_spent", "money_added", "money_owed")
+
+
+def _money(value: float) -> str:
+    return f"-${abs(value):,.2f}" if value < 0 else f"${value:,.2f}"
+
+
+def _join(items: List[str]) -> str:
+    if len(items) <= 1:
+        return "".join(items)
+    return ", ".join(items[:-1]) + " and " + items[-1]
+
+
+def template_headline(metrics: Dict[str, Any]) -> str:
+    """
+    Write a 2-3 sentence headline from a banking summary without calling an LLM.
+
+    Parameters:
+    - metrics: Summary from report_data.summarize_banking_data
+
+    Returns:
+    The headline
+    """
+    first_name = metrics.get("first_name") or ""
+    greeting = first_name if first_name and first_name != "Unknown" else "Hi there"
+    net_worth = float(metrics.get("net_worth") or 0)
+    owed = float(metrics.get("money_owed") or 0)
+    spent = float(metrics.get("money_spent") or 0)
+    added = float(metrics.get("money_added") or 0)
+
+    sentences = [f"{greeting}, your net worth stands at {_money(net_worth)}"
+                 + (f" with {_money(owed)} in debt." if owed > 0 else ".")]
+
+    if added >= spent:
+        sentences.append(f"You added {_money(added)} and spent {_money(spent)}, "
+                         f"keeping {_money(added - spent)} more than went out.")
+    else:
+        sentences.append(f"You spent {_money(spent)} against {_money(added)} in deposits, "
+                         f"{_money(spent - added)} more than came in.")
+
+    top_categories = list(metrics.get("top_categories") or [])[:3]
+    trend = metrics.get("spending_trend") or ""
+    largest = metrics.get("largest_transactions") or []
+    if top_categories:
+        sentences.append(f"Most of it went to {_join(top_categories)}"
+                         + (f", and your spending is {trend}." if trend else "."))
+    elif trend:
+        sentences.append(f"Your spending is {trend}.")
+    elif largest:
+        sentences.append(f"Your biggest purchase was {_money(abs(float(largest[0]['amount'])))} "
+                         f"for {largest[0]['description']}.")
+    return " ".join(sentences)
+
+
+def metrics_changed(current: Dict[str, Any], previous: Optional[Dict[str, Any]], threshold: float = 0.1) -> bool:
+    """
+    Whether a customer's summary differs materially from their last newsletter's.
+
+    A money metric counts as changed when it moved by more than threshold of its
+    previous value (at least $100, so small balances don't flap); a new spending
+    trend or a new top category also counts.
+    """
+    if not previous:
+        return True
+    for key in CHANGE_METRICS:
+        now, before = float(current.get(key) or 0), float(previous.get(key) or 0)
+        if abs(now - before) > threshold * max(abs(before), 100.0):
+            return True
+    if current.get("spending_trend") != previous.get("spending_trend"):
+        return True
+    return (current.get("top_categories") or [])[:1] != (previous.get("top_categories") or [])[:1]
+
+
+class HeadlinePolicy:
+    """Chooses the headline tier for each customer in a run"""
+
+    def __init__(self, llm_budget: Optional[int] = None, deadline: Optional[float] = None,
+                 change_threshold: float = 0.1):
+        """
+        Parameters:
+        - llm_budget: Maximum LLM headlines; None for no limit
+        - deadline: time.monotonic() value after which no LLM call should still be running; None for none
+        - change_threshold: Relative change in a metric that counts as material
+        """
+        self.llm_budget = llm_budget
+        self.deadline = deadline
+        self.change_threshold = change_threshold
+        self.llm_used = 0
+        # Running estimate of an LLM headline's latency, to judge whether one still fits before the deadline
+        self._llm_seconds = 2.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "HeadlinePolicy":
+        """Policy for a run starting now, from HEADLINE_LLM_BUDGET and HEADLINE_DEADLINE_SECONDS"""
+        return cls(
+            llm_budget=settings.headline_llm_budget or None,
+            deadline=time.monotonic() + settings.headline_deadline_seconds if settings.headline_deadline_seconds else None
+        )
+
+    def choose(self, metrics: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> Tuple[str, str]:
+        """
+        Pick a tier, reserving LLM budget if the LLM tier is chosen.
+
+        Returns:
+        Tuple of the tier and the reason for it
+        """
+        with self._lock:
+            if self.deadline is not None and time.monotonic() + self._llm_seconds > self.deadline:
+                return TEMPLATE, "deadline"
+            if self.llm_budget is not None:
+                if self.llm_used >= self.llm_budget:
+                    return TEMPLATE, "budget"
+                if not metrics_changed(metrics, previous, self.change_threshold):
+                    return TEMPLATE, "unchanged"
+            self.llm_used += 1
+            return LLM, "changed" if self.llm_budget is not None else "default"
+
+    def observe_llm_latency(self, seconds: float):
+        with self._lock:
+            self._llm_seconds = 0.8 * self._llm_seconds + 0.2 * seconds
+
+
+class HeadlineEngine:
+    """Generates headlines with the tier its policy picks, optionally batching LLM calls"""
+
+    def __init__(self, policy: HeadlinePolicy = None, batcher=None, settings: Settings = None):
+        """
+        Parameters:
+        - policy: Tier policy; defaults to the LLM tier for everyone
+        - batcher: Optional HeadlineBatcher shared with other customers in the run
+        - settings: Optional settings; defaults to the ones loaded at startup
+        """
+        self.policy = policy or HeadlinePolicy()
+        self.batcher = batcher
+        self.settings = settings
+
+    def headline(self, metrics: Dict[str, Any], prompt: Optional[Prompt],
+                 previous: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Generate a customer's headline.
+
+        Parameters:
+        - metrics: Summary from report_data.summarize_banking_data
+        - prompt: LLM prompt for the headline, or None to use the template
+        - previous: The summary stored with the customer's last newsletter, if any
+        """
+        tier, reason = self.policy.choose(metrics, previous) if prompt else (TEMPLATE, "no_prompt")
+        if tier == LLM:
+            start = time.perf_counter()
+            with span("openai.headline"):
+                text = self._llm_headline(prompt)
+            self.policy.observe_llm_latency(time.perf_counter() - start)
+            if text:
+                HEADLINE_TIERS.labels(LLM, reason).inc()
+                return text
+            reason = "llm_failed"
+            cached = (previous or {}).get("accounts_summary")
+            if cached and not metrics_changed(metrics, previous, self.policy.change_threshold):
+                HEADLINE_TIERS.labels(CACHED, reason).inc()
+                return cached
+
+        with span("headline.template"):
+            text = template_headline(metrics)
+        HEADLINE_TIERS.labels(TEMPLATE, reason).inc()
+        return text
+
+    def _llm_headline(self, prompt: Prompt) -> Optional[str]:
+        if self.batcher is not None:
+            return self.batcher.summarize(prompt)
+        settings = self.settings or get_settings()
+        if settings.headline_streaming:
+            return stream_open_ai_summary(prompt, settings, HEADLINE_SENTENCES,
+                                          settings.headline_first_token_ms / 1000 or None)
+        return request_open_ai_summary(prompt, settings)
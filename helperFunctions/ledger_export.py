@@ -0,0 +1,171 @@
+import io
+import os
+from typing import Dict, Iterable, Iterator, List
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Fixed schemas so every export (and every batch of a bulk export) lines up,
+# regardless of which transaction types or optional fields a customer has
+LEDGER_SCHEMAS = {
+    "accounts": pa.schema([
+        ("account_id", pa.string()),
+        ("customer_id", pa.string()),
+        ("type", pa.string()),
+        ("nickname", pa.string()),
+        ("rewards", pa.int64()),
+        ("balance", pa.float64()),
+        ("account_number", pa.string())
+    ]),
+    "transactions": pa.schema([
+        ("customer_id", pa.string()),
+        ("transaction_id", pa.string()),
+        ("account_id", pa.string()),
+        ("transaction_type", pa.string()),
+        ("amount", pa.float64()),
+        ("description", pa.string()),
+        ("transaction_date", pa.string()),
+        ("status", pa.string()),
+        ("medium", pa.string()),
+        ("payee_id", pa.string()),
+        ("payer_id", pa.string()),
+        ("merchant_id", pa.string())
+    ]),
+    "loans": pa.schema([
+        ("customer_id", pa.string()),
+        ("loan_id", pa.string()),
+        ("account_id", pa.string()),
+        ("type", pa.string()),
+        ("status", pa.string()),
+        ("credit_score", pa.int64()),
+        ("monthly_payment", pa.float64()),
+        ("amount", pa.float64()),
+        ("description", pa.string()),
+        ("creation_date", pa.string())
+    ]),
+    "merchants": pa.schema([
+        ("customer_id", pa.string()),
+        ("merchant_id", pa.string()),
+        ("name", pa.string()),
+        ("category", pa.string()),
+        ("street_number", pa.string()),
+        ("street_name", pa.string()),
+        ("city", pa.string()),
+        ("state", pa.string()),
+        ("zip", pa.string()),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64())
+    ])
+}
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+
+def frame_to_table(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """Convert a DataFrame to an Arrow table with the given schema, filling absent columns with nulls"""
+    df = df if df is not None else pd.DataFrame()
+    arrays = []
+    for field in schema:
+        if field.name in df.columns:
+            column = df[field.name]
+            if pd.api.types.is_datetime64_any_dtype(column):
+                column = column.dt.strftime('%Y-%m-%d')
+            arrays.append(pa.array(column, type=field.type, from_pandas=True))
+        else:
+            arrays.append(pa.nulls(len(df), type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def ledger_tables(bank_manager, customer_id: str) -> Dict[str, pa.Table]:
+    """
+    Build Arrow tables for a customer's accounts, transactions, loans and merchants.
+
+    Parameters:
+    - bank_manager: BankDataManager with the customer's data already fetched
+    - customer_id: ID of the customer
+
+    Returns:
+    Dictionary mapping table name to an Arrow table
+    """
+    frames = ledger_frames(bank_manager, customer_id)
+    return {name: frame_to_table(frame, LEDGER_SCHEMAS[name]) for name, frame in frames.items()}
+
+
+def ledger_frames(bank_manager, customer_id: str) -> Dict[str, pd.DataFrame]:
+    """The rows of a customer's accounts, transactions, loans and merchants, in their original dtypes"""
+    accounts = bank_manager.accounts_df
+    if accounts is None or accounts.empty:
+        accounts = pd.DataFrame(columns=["account_id", "customer_id"])
+    accounts = accounts[accounts['customer_id'] == customer_id]
+    account_ids = accounts['account_id']
+
+    transactions = bank_manager.transactions_df
+    if transactions is None or transactions.empty:
+        transactions = pd.DataFrame(columns=["account_id"])
+    transactions = transactions[transactions['account_id'].isin(account_ids)].assign(customer_id=customer_id)
+
+    loans = bank_manager.loans_df
+    if loans is None or loans.empty:
+        loans = pd.DataFrame(columns=["account_id"])
+    loans = loans[loans['account_id'].isin(account_ids)].assign(customer_id=customer_id)
+
+    # Only the merchants this customer actually purchased from
+    merchants = bank_manager.merchants_df
+    if merchants is None or merchants.empty or 'merchant_id' not in transactions.columns:
+        merchants = pd.DataFrame(columns=["merchant_id"])
+    else:
+        merchants = merchants[merchants['merchant_id'].isin(transactions['merchant_id'])]
+    merchants = merchants.assign(customer_id=customer_id)
+
+    return {"accounts": accounts, "transactions": transactions, "loans": loans, "merchants": merchants}
+
+
+def write_ledger_parquet(tables: Dict[str, pa.Table], directory: str) -> List[str]:
+    """
+    Write each ledger table to <directory>/<name>.parquet.
+
+    Returns:
+    List of written file paths
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, table in tables.items():
+        path = os.path.join(directory, f"{name}.parquet")
+        pq.write_table(table, path)
+        paths.append(path)
+    return paths
+
+
+def table_to_ipc_bytes(table: pa.Table) -> bytes:
+    """Serialize a table in the Arrow IPC streaming format"""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def table_to_parquet_bytes(table: pa.Table) -> bytes:
+    """Serialize a table as an in-memory Parquet file"""
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink)
+    return sink.getvalue().to_pybytes()
+
+
+def iter_ipc_stream(schema: pa.Schema, tables: Iterable[pa.Table]) -> Iterator[bytes]:
+    """
+    Encode tables as one Arrow IPC stream, yielding bytes as each table is written.
+
+    Lets a bulk export start sending record batches for the first customer
+    while later customers are still being fetched.
+    """
+    buffer = io.BytesIO()
+    writer = pa.ipc.new_stream(buffer, schema)
+    for table in tables:
+        writer.write_table(table)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    writer.close()
+    yield buffer.getvalue()
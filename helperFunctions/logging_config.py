@@ -0,0 +1,125 @@
+"""
+Structured, non-blocking logging setup.
+
+Call configure_logging() once at startup. Records are put on an in-memory
+queue by the calling thread and formatted/written to stdout by a background
+listener thread, so request handlers and batch loops never block on stdout.
+
+Environment variables:
+- LOG_LEVEL: root level (default INFO)
+- LOG_LEVELS: per-module overrides, e.g. "helperFunctions.get_bank_data=DEBUG,main=WARNING"
+- LOG_FORMAT: "json" (default) or "text"
+- LOG_SAMPLE_RATE: fraction of per-item events to keep (default 0.01)
+
+Per-item events in hot loops should pass extra=SAMPLED so only a fraction of
+them are emitted, and use %-style arguments so no string formatting happens
+when the level is disabled:
+
+    logger.debug("Created purchase for account %s", account_id, extra=SAMPLED)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from typing import Dict
+
+# Pass as extra= on per-item log calls to subject them to sampling
+SAMPLED = {"sampled": True}
+
+# Attributes every LogRecord has; anything else came from extra= and is emitted as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and key != "sampled":
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues records unformatted.
+
+    The stock prepare() formats the message (and the traceback) in the calling
+    thread. The queue here never leaves the process, so the record can be
+    passed as it is and formatted by the listener's handler instead. Log
+    arguments are therefore rendered slightly later, and should not be objects
+    the caller goes on to mutate.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records marked with extra=SAMPLED; other records always pass"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "sampled", False):
+            return random.random() < self.rate
+        return True
+
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    """Parse "module=LEVEL,module=LEVEL" into a dictionary"""
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging():
+    """Install the queue-backed handler on the root logger (safe to call more than once)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    else:
+        formatter = JsonFormatter()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    # Drop sampled-out records before they are formatted or enqueued
+    queue_handler.addFilter(SamplingFilter(float(os.getenv("LOG_SAMPLE_RATE", "0.01"))))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    for name, level in _parse_levels(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -0,0 +1,157 @@
+"""
+Compact prompts and token budgets for the OpenAI summary calls.
+
+Every call starts with the same SYSTEM_PREFIX, byte for byte, and only the
+user message varies, so requests share a stable prefix that OpenAI's prompt
+caching can reuse (cached input tokens are exported with the call metrics).
+The user message is a one-line task followed by the facts as key=value
+pairs instead of prose instructions.
+
+Each prompt kind has an input and an output budget in tokens. The input
+budget is enforced when the prompt is built: optional facts are dropped
+(least important first) until the estimate fits, and the text is cut as a
+last resort. The output budget is sent as max_tokens.
+
+Token counts are a local estimate (about one token per short word or
+punctuation mark, and one per four characters of longer words), close
+enough to budget with and free of a tokenizer dependency.
+"""
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+SYSTEM_PREFIX = (
+    "You are a helpful financial assistant. Facts are key=value pairs, amounts in USD. "
+    "Reply with the requested text only."
+)
+
+# (input, output) token budgets per prompt kind
+BUDGETS: Dict[str, Tuple[int, int]] = {
+    "headline": (200, 120),
+    "news_summary": (300, 90),
+    "adhoc": (1000, 250)
+}
+
+# Longest NewsAPI title kept in the news prompt, in tokens
+MAX_HEADLINE_TOKENS = 40
+
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate how many tokens text is for a GPT tokenizer"""
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text or ""):
+        if piece.isdigit():
+            # Numbers are split into groups of up to three digits
+            tokens += (len(piece) + 2) // 3
+        else:
+            tokens += max(1, (len(piece) + 3) // 4) if len(piece) > 6 else 1
+    return tokens
+
+
+@dataclass(frozen=True)
+class Prompt:
+    """A user message with the budget it was built for"""
+    kind: str
+    text: str
+    max_tokens: int
+
+    @property
+    def input_tokens(self) -> int:
+        return estimate_tokens(SYSTEM_PREFIX) + estimate_tokens(self.text)
+
+
+def as_prompt(prompt) -> Prompt:
+    """Wrap a plain string in an "adhoc" Prompt; Prompts are returned as they are"""
+    if isinstance(prompt, Prompt):
+        return prompt
+    input_budget, output_budget = BUDGETS["adhoc"]
+    return Prompt("adhoc", truncate_to_tokens(str(prompt), input_budget), output_budget)
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Cut text at a word boundary so that its estimate fits budget"""
+    if estimate_tokens(text) <= budget:
+        return text
+    words = text.split(" ")
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(" ".join(words[:middle])) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low])
+
+
+def build_prompt(kind: str, task: str, facts: Sequence[Tuple[str, Any]],
+                 optional_facts: Sequence[Tuple[str, Any]] = ()) -> Prompt:
+    """
+    Build a compact prompt within the kind's budgets.
+
+    Parameters:
+    - kind: Key into BUDGETS, also used to label the call's metrics
+    - task: One-line instruction
+    - facts: (key, value) pairs that are always included
+    - optional_facts: (key, value) pairs in order of importance, dropped from the end to fit the input budget
+
+    Returns:
+    The Prompt, with max_tokens set to the kind's output budget
+    """
+    input_budget, output_budget = BUDGETS[kind]
+    budget = input_budget - estimate_tokens(SYSTEM_PREFIX)
+    facts = [(key, value) for key, value in facts if value not in (None, "", [])]
+    optional = [(key, value) for key, value in optional_facts if value not in (None, "", [])]
+
+    def render(pairs):
+        return task + "\n" + "; ".join(f"{key}={value}" for key, value in pairs)
+
+    text = render(facts + optional)
+    while optional and estimate_tokens(text) > budget:
+        optional.pop()
+        text = render(facts + optional)
+    return Prompt(kind, truncate_to_tokens(text, budget), output_budget)
+
+
+def _money(value: float) -> str:
+    return f"{float(value):.2f}"
+
+
+def headline_prompt(summary: Dict[str, Any], timestamp: Optional[str] = None) -> Prompt:
+    """
+    Prompt for a customer's newsletter headline.
+
+    Parameters:
+    - summary: Banking summary from report_data.summarize_banking_data
+    - timestamp: Report period (e.g., "30d"), if the amounts are for one
+    """
+    largest = summary.get("largest_transactions") or []
+    period = f"last {timestamp}" if timestamp else "recent"
+    return build_prompt(
+        "headline",
+        f"Write a friendly 2-3 sentence newsletter headline addressed to {summary['name']} as \"you\", "
+        f"focused on insights rather than numbers. Amounts ({period}):",
+        [
+            ("net_worth", _money(summary["net_worth"])),
+            ("spent", _money(summary["money_spent"])),
+            ("deposits", _money(summary["money_added"])),
+            ("debt", _money(summary["money_owed"]))
+        ],
+        [
+            ("trend", summary.get("spending_trend")),
+            ("top_categories", ", ".join(summary.get("top_categories") or [])),
+            ("largest", f"{_money(abs(largest[0]['amount']))} {largest[0]['description']}" if largest else None)
+        ]
+    )
+
+
+def news_summary_prompt(articles: List[Dict[str, Any]]) -> Prompt:
+    """Prompt summarizing NewsAPI articles (raw NewsAPI format) in 1-2 sentences"""
+    return build_prompt(
+        "news_summary",
+        "Summarize these financial headlines in 1-2 insightful sentences on the main trends:",
+        [],
+        [(index, f"{truncate_to_tokens(article['title'], MAX_HEADLINE_TOKENS)} ({article['source']['name']})")
+         for index, article in enumerate(articles, 1)]
+    )
@@ -0,0 +1,457 @@
+"""
+Resilience for calls to upstream APIs (Nessie, OpenAI, NewsAPI, Resend, Yahoo Finance).
+
+Every upstream gets a guard with:
+- an adaptive concurrency limit (AIMD): the limit grows by about one per
+  limit's worth of fast, successful calls and is halved when a call errors
+  or takes longer than the upstream's latency target, so a slow upstream
+  sees less load instead of a growing pile of blocked callers
+- a circuit breaker: after failure_threshold consecutive failures calls fail
+  fast with UpstreamUnavailable for reset_seconds, then a single probe call
+  decides whether to close it again
+- a default timeout for every request
+- streamed calls (call_streaming) hold their slot, and have their latency and
+  outcome recorded, until the stream has been consumed or closed
+- optional hedging of idempotent GETs: if the first attempt has not answered
+  within hedge_after seconds and the limit has room, a second identical
+  request is sent and whichever answers first wins
+
+UpstreamUnavailable is a requests ConnectionError, so callers that already
+fall back on request errors (cached news, default stock prices, empty Nessie
+frames) fail fast onto their fallbacks while an upstream is down.
+
+Limit changes, circuit transitions, rejections and hedges are exported as
+Prometheus metrics next to the tracing histograms.
+"""
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple, Union
+
+import requests
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CONCURRENCY_LIMIT = Gauge(
+    "upstream_concurrency_limit",
+    "Current adaptive concurrency limit per upstream",
+    ["upstream"]
+)
+IN_FLIGHT = Gauge(
+    "upstream_in_flight_requests",
+    "Calls currently in flight per upstream",
+    ["upstream"]
+)
+LIMIT_CHANGES = Counter(
+    "upstream_concurrency_limit_changes_total",
+    "Changes of the adaptive concurrency limit",
+    ["upstream", "direction"]
+)
+CIRCUIT_STATE = Gauge(
+    "upstream_circuit_state",
+    "Circuit breaker state per upstream (0 closed, 1 half open, 2 open)",
+    ["upstream"]
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "upstream_circuit_transitions_total",
+    "Circuit breaker state changes",
+    ["upstream", "state"]
+)
+REJECTED = Counter(
+    "upstream_rejected_calls_total",
+    "Calls failed fast without reaching the upstream",
+    ["upstream", "reason"]
+)
+HEDGES = Counter(
+    "upstream_hedged_requests_total",
+    "Hedged GET requests by which attempt answered first",
+    ["upstream", "winner"]
+)
+
+
+class UpstreamUnavailable(requests.exceptions.ConnectionError):
+    """Raised instead of calling an upstream whose circuit is open or whose concurrency limit is exhausted"""
+
+
+@dataclass(frozen=True)
+class UpstreamPolicy:
+    # requests timeout: (connect, read) seconds, or None for clients that manage their own
+    timeout: Optional[Union[float, Tuple[float, float]]] = (3.05, 15)
+    # Calls slower than this count as a congestion signal
+    latency_target: float = 2.0
+    initial_limit: int = 8
+    min_limit: int = 1
+    max_limit: int = 64
+    failure_threshold: int = 5
+    reset_seconds: float = 30.0
+    # Send a second GET after this many seconds without a response; None disables hedging
+    hedge_after: Optional[float] = None
+
+
+POLICIES: Dict[str, UpstreamPolicy] = {
+    "nessie": UpstreamPolicy(latency_target=1.0, initial_limit=16, hedge_after=0.75),
+    "newsapi": UpstreamPolicy(timeout=(3.05, 10), latency_target=2.0, initial_limit=4, max_limit=16, hedge_after=1.0),
+    "openai": UpstreamPolicy(timeout=(3.05, 30), latency_target=10.0, max_limit=32),
+    "resend": UpstreamPolicy(timeout=(3.05, 10), latency_target=2.0, max_limit=16),
+    "yfinance": UpstreamPolicy(timeout=None, latency_target=3.0, initial_limit=4, max_limit=16)
+}
+DEFAULT_POLICY = UpstreamPolicy()
+
+# Runs GET attempts so the caller can wait for whichever answers first
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+
+
+class AdaptiveLimiter:
+    """Additive-increase/multiplicative-decrease concurrency limit"""
+
+    def __init__(self, name: str, policy: UpstreamPolicy):
+        self.name = name
+        self.policy = policy
+        self._limit = float(policy.initial_limit)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+        CONCURRENCY_LIMIT.labels(name).set(self.limit)
+
+    @property
+    def limit(self) -> int:
+        return max(self.policy.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a free slot; returns False if none freed up within timeout"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._in_flight < self.limit, timeout):
+                return False
+            self._take()
+            return True
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now"""
+        with self._condition:
+            if self._in_flight >= self.limit:
+                return False
+            self._take()
+            return True
+
+    def _take(self):
+        self._in_flight += 1
+        IN_FLIGHT.labels(self.name).inc()
+
+    def release(self, latency: Optional[float] = None, failed: bool = False):
+        """Free a slot and, if latency is given, adjust the limit from the call's outcome"""
+        with self._condition:
+            self._in_flight -= 1
+            IN_FLIGHT.labels(self.name).dec()
+            if latency is not None:
+                self._adjust(latency, failed)
+            self._condition.notify_all()
+
+    def _adjust(self, latency: float, failed: bool):
+        before = self.limit
+        if failed or latency > self.policy.latency_target:
+            # Back off at most once per latency target, so a burst of slow calls
+            # that were all started under the old limit only counts once
+            now = time.monotonic()
+            if now - self._last_decrease < self.policy.latency_target:
+                return
+            self._last_decrease = now
+            self._limit = max(float(self.policy.min_limit), self._limit / 2)
+        else:
+            self._limit = min(float(self.policy.max_limit), self._limit + 1 / self._limit)
+
+        after = self.limit
+        if after != before:
+            CONCURRENCY_LIMIT.labels(self.name).set(after)
+            LIMIT_CHANGES.labels(self.name, "up" if after > before else "down").inc()
+            if after < before:
+                logger.info("Concurrency limit for %s lowered to %s", self.name, after)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets a single probe through after reset_seconds"""
+
+    def __init__(self, name: str, policy: UpstreamPolicy):
+        self.name = name
+        self.policy = policy
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.labels(name).set(_STATE_VALUES[CLOSED])
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now"""
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.policy.reset_seconds:
+                    return False
+                self._transition(HALF_OPEN)
+            if self._state == HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def cancel(self):
+        """Give back a call allowed by allow() that was never made"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record(self, failed: bool):
+        with self._lock:
+            self._probe_in_flight = False
+            if not failed:
+                self._failures = 0
+                if self._state != CLOSED:
+                    self._transition(CLOSED)
+                return
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.policy.failure_threshold:
+                self._opened_at = time.monotonic()
+                if self._state != OPEN:
+                    self._transition(OPEN)
+
+    def _transition(self, state: str):
+        logger.warning("Circuit for %s is now %s", self.name, state)
+        self._state = state
+        CIRCUIT_STATE.labels(self.name).set(_STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.labels(self.name, state).inc()
+
+
+def _is_failure(response) -> bool:
+    """Server errors and rate limiting count as failures; other responses are left to the caller"""
+    status = getattr(response, "status_code", None)
+    return status is not None and (status >= 500 or status == 429)
+
+
+class UpstreamGuard:
+    """Concurrency limit, circuit breaker, timeout and hedging for one upstream"""
+
+    def __init__(self, name: str, policy: UpstreamPolicy):
+        self.name = name
+        self.policy = policy
+        self.limiter = AdaptiveLimiter(name, policy)
+        self.breaker = CircuitBreaker(name, policy)
+
+    def call(self, fn: Callable, *args, is_failure: Callable = _is_failure, **kwargs):
+        """
+        Call fn under the breaker and the concurrency limit.
+
+        Raises:
+        UpstreamUnavailable if the circuit is open or no slot frees up within the upstream's timeout
+        """
+        start = self._enter()
+        failed = True
+        try:
+            result = fn(*args, **kwargs)
+            failed = is_failure(result)
+            return result
+        finally:
+            self._exit(start, failed)
+
+    def call_streaming(self, fn: Callable, *args, is_failure: Callable = _is_failure, **kwargs) -> "GuardedStream":
+        """
+        Like call, for a call that returns a stream (a streamed requests.Response or an OpenAI Stream).
+
+        The slot stays taken until the stream has been read to the end or
+        closed, and the call's latency covers the whole body, so slow or
+        broken bodies count against the limit and the breaker.
+
+        Returns:
+        The stream wrapped in a GuardedStream; close it (or use it as a context manager)
+        """
+        start = self._enter()
+        try:
+            stream = fn(*args, **kwargs)
+        except BaseException:
+            self._exit(start, True)
+            raise
+        failed = is_failure(stream)
+        return GuardedStream(stream, lambda body_failed: self._exit(start, failed or body_failed))
+
+    def _enter(self) -> float:
+        if not self.breaker.allow():
+            REJECTED.labels(self.name, "circuit_open").inc()
+            raise UpstreamUnavailable(f"Circuit for {self.name} is open")
+        if not self.limiter.acquire(timeout=self._queue_timeout()):
+            self.breaker.cancel()
+            REJECTED.labels(self.name, "concurrency_limit").inc()
+            raise UpstreamUnavailable(f"No capacity for {self.name} (limit {self.limiter.limit})")
+        return time.perf_counter()
+
+    def _exit(self, start: float, failed: bool):
+        self.limiter.release(time.perf_counter() - start, failed)
+        self.breaker.record(failed)
+
+    def _queue_timeout(self) -> Optional[float]:
+        timeout = self.policy.timeout
+        if isinstance(timeout, tuple):
+            return sum(timeout)
+        return timeout
+
+    def hedged(self, send: Callable[[], requests.Response]) -> requests.Response:
+        """
+        Run an idempotent request, sending a second copy if the first is slow.
+
+        The hedge only goes out if the concurrency limit has a free slot, so
+        hedging never adds load to an upstream that is already saturated.
+        """
+        if self.policy.hedge_after is None:
+            return send()
+
+        primary = _hedge_executor.submit(contextvars.copy_context().run, send)
+        done, _ = wait([primary], timeout=self.policy.hedge_after)
+        if done or not self.limiter.try_acquire():
+            return primary.result()
+
+        def send_hedge():
+            try:
+                return send()
+            finally:
+                self.limiter.release()
+
+        hedge = _hedge_executor.submit(contextvars.copy_context().run, send_hedge)
+        attempts = {primary: "primary", hedge: "hedge"}
+        pending = set(attempts)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and not _is_failure(future.result()):
+                    HEDGES.labels(self.name, attempts[future]).inc()
+                    for other in pending:
+                        other.add_done_callback(_close_response)
+                    return future.result()
+        # Both attempts failed; report the primary's outcome
+        return primary.result()
+
+
+class GuardedStream:
+    """
+    A stream whose guard slot is released when it is closed (or read to the end).
+
+    Iteration, directly or through iter_content/iter_lines, is watched for
+    errors, which count as a failed call; stopping early does not. Other
+    attributes are passed through to the wrapped stream.
+    """
+
+    def __init__(self, stream, finish: Callable[[bool], None]):
+        self._stream = stream
+        self._finish = finish
+        self._failed = False
+        self._finished = False
+        self._lock = threading.Lock()
+
+    def _watch(self, iterator):
+        try:
+            yield from iterator
+        except GeneratorExit:
+            # The consumer stopped reading early
+            raise
+        except BaseException:
+            self._failed = True
+            self.close()
+            raise
+        self.close()
+
+    def __iter__(self):
+        return self._watch(iter(self._stream))
+
+    def iter_content(self, *args, **kwargs):
+        return self._watch(self._stream.iter_content(*args, **kwargs))
+
+    def iter_lines(self, *args, **kwargs):
+        return self._watch(self._stream.iter_lines(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            with self._lock:
+                finished, self._finished = self._finished, True
+            if not finished:
+                self._finish(self._failed)
+
+    def __enter__(self) -> "GuardedStream":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        # Last resort for a stream that was never closed, so its slot is not lost for good
+        if not getattr(self, "_finished", True):
+            self.close()
+
+
+def _close_response(future):
+    if future.exception() is None:
+        future.result().close()
+
+
+class RateLimiter:
+    """
+    Spaces calls out to at most rate per second, allowing bursts of up to burst calls.
+
+    Unlike the adaptive limit, which caps calls in flight, this caps how often
+    calls start, for upstreams with a requests-per-second quota.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = rate
+        self.burst = burst
+        # When the next call would be due if calls had been evenly spaced
+        self._next_due = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the next call may start"""
+        with self._lock:
+            now = time.monotonic()
+            due = max(self._next_due, now)
+            wait = due - (self.burst - 1) / self.rate - now
+            self._next_due = due + 1 / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+_guards: Dict[str, UpstreamGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def upstream(name: str) -> UpstreamGuard:
+    """The shared guard for an upstream, created on first use"""
+    with _guards_lock:
+        guard = _guards.get(name)
+        if guard is None:
+            guard = _guards[name] = UpstreamGuard(name, POLICIES.get(name, DEFAULT_POLICY))
+        return guard
+
+
+def reset(name: str = None):
+    """Forget the state of one upstream's guard (or all of them), e.g. between benchmark runs"""
+    with _guards_lock:
+        if name is None:
+            _guards.clear()
+        else:
+            _guards.pop(name, None)
@@ -0,0 +1,158 @@
+"""
+Application settings.
+
+The environment (and .env, if present) is read and validated once, on the
+first call to get_settings(), instead of on every request or helper call.
+Clients take their URLs and keys from the Settings object rather than
+reading the environment themselves.
+
+Environment variables:
+- NESSIE_API_URL (default http://api.nessieisreal.com), NESSIE_API_KEY
+- OPEN_AI_API_KEY
+- NEWS_API_URL (default https://newsapi.org/v2/top-headlines), NEWS_API_KEY
+- RESEND_API_KEY
+- FIREBASE_SERVICE_ACCOUNT: service account JSON
+- WARM_UP_ON_STARTUP: true/false (default false)
+- COHORT_PAGE_SIZE: users fetched per Firestore page in cron runs (default 500)
+- CRON_WORKERS: newsletters sent concurrently in cron runs (default 4)
+- CRON_QUEUE_SIZE: users buffered between the cohort query and the workers (default 100)
+- CRON_SHARDS: split cron runs into this many shards for shard_worker.py
+  processes (default 0: send in the request's own process)
+- COMPUTE_IN_PROCESSES: true/false (default false); run the pandas work and
+  HTML rendering of cron runs in a process pool sized to the core count
+- HEADLINE_BATCH_SIZE: headline prompts sent to OpenAI per request in cron
+  runs (default 1: one request per customer); needs CRON_WORKERS at least as large
+- HEADLINE_LLM_BUDGET: most LLM headlines per cron run, spent on customers whose
+  numbers changed since their last newsletter; the rest get the template
+  headline (default 0: no limit)
+- HEADLINE_DEADLINE_SECONDS: stop starting LLM headlines once one would not
+  finish this many seconds into a cron run (default 0: no deadline)
+- HEADLINE_STREAMING: true/false (default false); stream unbatched LLM
+  headlines and stop reading after three sentences
+- HEADLINE_FIRST_TOKEN_MS: with streaming, give up on an LLM headline with no
+  first token after this many milliseconds and use the last newsletter's
+  headline or the template instead (default 3000; 0: no deadline)
+- BULK_IMPORT_WORKERS: users created and onboarded concurrently by bulk
+  imports (default 4)
+- BULK_IMPORT_RATE: most Nessie customers created per second by bulk imports
+  (default 5)
+- GENERATION_SEED: seed for the synthetic accounts and transactions created
+  for new customers; each customer's ledger is derived from it and their
+  customer ID (default unset: unpredictable ledgers)
+- GENERATION_REFERENCE_DATE: YYYY-MM-DD day the seeded ledgers' dates count
+  back from (default today)
+"""
+import json
+import os
+from dataclasses import dataclass, fields
+from datetime import date
+from functools import lru_cache
+from typing import Mapping, Optional
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+_TRUE = ("1", "true", "yes", "on")
+_FALSE = ("0", "false", "no", "off", "")
+
+
+class SettingsError(ValueError):
+    """Raised when a setting is missing or invalid"""
+
+
+@dataclass(frozen=True)
+class Settings:
+    nessie_api_url: str = "http://api.nessieisreal.com"
+    nessie_api_key: Optional[str] = None
+    open_ai_api_key: Optional[str] = None
+    news_api_url: str = "https://newsapi.org/v2/top-headlines"
+    news_api_key: Optional[str] = None
+    resend_api_key: Optional[str] = None
+    firebase_service_account: Optional[str] = None
+    warm_up_on_startup: bool = False
+    cohort_page_size: int = 500
+    cron_workers: int = 4
+    cron_queue_size: int = 100
+    cron_shards: int = 0
+    compute_in_processes: bool = False
+    headline_batch_size: int = 1
+    headline_llm_budget: int = 0
+    headline_deadline_seconds: int = 0
+    headline_streaming: bool = False
+    headline_first_token_ms: int = 3000
+    bulk_import_workers: int = 4
+    bulk_import_rate: int = 5
+    generation_seed: Optional[int] = None
+    generation_reference_date: Optional[str] = None
+
+    def __post_init__(self):
+        for name in ("nessie_api_url", "news_api_url"):
+            url = getattr(self, name)
+            parsed = urlparse(url)
+            if parsed.scheme not in ("http", "https") or not parsed.netloc:
+                raise SettingsError(f"{name.upper()} must be an http(s) URL, got {url!r}")
+            # Callers append paths with a leading slash
+            object.__setattr__(self, name, url.rstrip("/"))
+
+        if self.firebase_service_account:
+            try:
+                json.loads(self.firebase_service_account)
+            except ValueError as e:
+                raise SettingsError(f"FIREBASE_SERVICE_ACCOUNT is not valid JSON: {e}")
+
+        for name in ("cohort_page_size", "cron_workers", "cron_queue_size", "headline_batch_size",
+                     "bulk_import_workers", "bulk_import_rate"):
+            if getattr(self, name) < 1:
+                raise SettingsError(f"{name.upper()} must be at least 1")
+        for name in ("cron_shards", "headline_llm_budget", "headline_deadline_seconds", "headline_first_token_ms"):
+            if getattr(self, name) < 0:
+                raise SettingsError(f"{name.upper()} must not be negative")
+        if self.generation_reference_date:
+            try:
+                date.fromisoformat(self.generation_reference_date)
+            except ValueError:
+                raise SettingsError(f"GENERATION_REFERENCE_DATE must be a YYYY-MM-DD date, "
+                                    f"got {self.generation_reference_date!r}")
+        # A headline batch only fills up with as many prompts as there are workers waiting on it
+        if self.headline_batch_size > self.cron_workers:
+            raise SettingsError(f"HEADLINE_BATCH_SIZE ({self.headline_batch_size}) must not be larger "
+                                f"than CRON_WORKERS ({self.cron_workers})")
+
+    def require(self, *names: str):
+        """Raise SettingsError naming every one of the given settings that is not set"""
+        missing = [name.upper() for name in names if not getattr(self, name)]
+        if missing:
+            raise SettingsError(f"Missing required settings: {', '.join(missing)}")
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] = None) -> "Settings":
+        """
+        Build settings from environment variables named after the fields in upper case.
+        Empty values are treated as unset.
+        """
+        environ = os.environ if environ is None else environ
+        values = {}
+        for field in fields(cls):
+            raw = environ.get(field.name.upper())
+            if raw is None or not raw.strip():
+                continue
+            raw = raw.strip()
+            if field.type is bool:
+                if raw.lower() not in _TRUE + _FALSE:
+                    raise SettingsError(f"{field.name.upper()} must be true or false, got {raw!r}")
+                values[field.name] = raw.lower() in _TRUE
+            elif field.type in (int, Optional[int]):
+                try:
+                    values[field.name] = int(raw)
+                except ValueError:
+                    raise SettingsError(f"{field.name.upper()} must be an integer, got {raw!r}")
+            else:
+                values[field.name] = raw
+        return cls(**values)
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Load and validate settings the first time they are needed"""
+    load_dotenv()
+    return Settings.from_env()
@@ -0,0 +1,216 @@
+"""
+Single-flight deduplication for concurrent requests on the same customer.
+
+Calls are keyed by an operation and a key (e.g., ("report", customer_id)).
+While one call for a key is running, other calls for the same key in the same
+process wait for it and get its result (or its exception) instead of doing
+the work again.
+
+Given a Firestore client, the call that does the work also holds a lease on a
+flight_leases document, so the same key is deduplicated across workers: a
+caller in another process polls the lease until the running call finishes,
+then returns the result it stored (when the result is small enough to store),
+or runs the call itself afterwards, when it will see whatever the first call
+wrote (e.g., the user created by /register). Leases cost Firestore writes on
+every call and make other workers wait, so pass db only where mutual exclusion
+across workers is the point (registration, seeding); calls whose results are
+not to be kept in Firestore (e.g., reports) are deduplicated in-process only.
+Leases are created and taken over with write preconditions and renewed while
+the call runs, so a worker that dies only holds up other callers until its
+lease expires.
+
+A stored result is only read by callers that were already waiting, and is
+cleared when the lease is next taken. Every lease document also carries an
+expire_at timestamp RECORD_TTL_SECONDS after its last write; configure a
+Firestore TTL policy on flight_leases.expire_at so finished leases (and any
+result in them) are deleted.
+
+Results are shared between callers, so they must not be mutated.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from google.api_core.exceptions import Conflict, FailedPrecondition
+from prometheus_client import Counter
+
+LEASES_COLLECTION = "flight_leases"
+DEFAULT_LEASE_SECONDS = 60
+POLL_SECONDS = 0.25
+# Results larger than this are not stored in the lease; waiting workers run the call themselves
+MAX_SHARED_RESULT_BYTES = 512 * 1024
+# How long a lease document is kept after its last write (see the TTL policy above)
+RECORD_TTL_SECONDS = 3600
+
+FLIGHT_CALLS = Counter(
+    "single_flight_calls_total",
+    "Deduplicated calls by operation and how the result was obtained",
+    ["operation", "role"]
+)
+
+logger = logging.getLogger(__name__)
+
+_flights: Dict[Tuple[str, str], Future] = {}
+_flights_lock = threading.Lock()
+_worker_id = uuid.uuid4().hex
+
+
+def single_flight(operation: str, key: str, fn: Callable[[], Any], db=None,
+                  wait_seconds: float = 120, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Any:
+    """
+    Run fn once for all concurrent callers with the same operation and key.
+
+    Parameters:
+    - operation: Name of the operation (e.g., "register"), also used to label metrics
+    - key: What the operation is for (e.g., a customer ID)
+    - fn: The call to deduplicate
+    - db: Optional Firestore client to also deduplicate across workers
+    - wait_seconds: Longest to wait for another worker's call before running fn anyway
+    - lease_seconds: How long a lease lasts without being renewed
+
+    Returns:
+    fn's result, possibly from another caller's call
+    """
+    flight_key = (operation, key)
+    with _flights_lock:
+        future = _flights.get(flight_key)
+        leader = future is None
+        if leader:
+            future = _flights[flight_key] = Future()
+
+    if not leader:
+        FLIGHT_CALLS.labels(operation, "follower").inc()
+        return future.result()
+
+    try:
+        if db is None:
+            FLIGHT_CALLS.labels(operation, "leader").inc()
+            result = fn()
+        else:
+            result = _run_leased(db, operation, key, fn, wait_seconds, lease_seconds)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(flight_key, None)
+
+
+class _Lease:
+    def __init__(self, reference, update_time):
+        self.reference = reference
+        self.update_time = update_time
+        self.lock = threading.Lock()
+        self.lost = False
+
+
+def _document_id(operation: str, key: str) -> str:
+    # Document IDs cannot contain slashes
+    return f"{operation}:{key}".replace("/", "_")
+
+
+def _expire_at(lease_seconds: float = 0) -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=lease_seconds + RECORD_TTL_SECONDS)
+
+
+def _acquire(db, reference, lease_seconds: float) -> Optional[_Lease]:
+    """Create the lease, or take it over if it is not held; None if another worker holds it"""
+    # Taking the lease also clears the previous call's result
+    fields = {"owner": _worker_id, "status": "running", "expires_at": time.time() + lease_seconds,
+              "started_at": time.time(), "result_json": None, "expire_at": _expire_at(lease_seconds)}
+    try:
+        return _Lease(reference, reference.create(fields).update_time)
+    except Conflict:
+        pass
+
+    snapshot = reference.get()
+    if snapshot.exists and snapshot.get("status") == "running" and snapshot.get("expires_at") > time.time():
+        return None
+    try:
+        write = reference.update(fields, option=db.write_option(last_update_time=snapshot.update_time))
+    except FailedPrecondition:
+        # Another worker took it first
+        return None
+    return _Lease(reference, write.update_time)
+
+
+def _write(db, lease: _Lease, fields: Dict[str, Any]):
+    with lease.lock:
+        if lease.lost:
+            return
+        try:
+            write = lease.reference.update(fields, option=db.write_option(last_update_time=lease.update_time))
+        except FailedPrecondition:
+            lease.lost = True
+            logger.warning("Lost the lease %s", lease.reference.id)
+            return
+        lease.update_time = write.update_time
+
+
+def _keep_lease(db, lease: _Lease, lease_seconds: float, stop: threading.Event):
+    """Renew the lease every third of its duration until stopped"""
+    while not stop.wait(lease_seconds / 3) and not lease.lost:
+        try:
+            _write(db, lease, {"expires_at": time.time() + lease_seconds, "expire_at": _expire_at(lease_seconds)})
+        except Exception as e:
+            logger.warning("Failed to renew lease %s: %s", lease.reference.id, e)
+
+
+def _release(db, lease: _Lease, heartbeat: threading.Thread, stop: threading.Event, fields: Dict[str, Any]):
+    stop.set()
+    heartbeat.join()
+    try:
+        _write(db, lease, dict(fields, expires_at=0, finished_at=time.time(), expire_at=_expire_at()))
+    except Exception as e:
+        # The lease expires on its own; the call itself succeeded or failed regardless
+        logger.warning("Failed to release lease %s: %s", lease.reference.id, e)
+
+
+def _shareable(result: Any) -> Optional[str]:
+    try:
+        encoded = json.dumps(result)
+    except (TypeError, ValueError):
+        return None
+    return encoded if len(encoded) <= MAX_SHARED_RESULT_BYTES else None
+
+
+def _run_leased(db, operation: str, key: str, fn: Callable[[], Any],
+                wait_seconds: float, lease_seconds: float) -> Any:
+    reference = db.collection(LEASES_COLLECTION).document(_document_id(operation, key))
+    waiting_since = time.time()
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        lease = _acquire(db, reference, lease_seconds)
+        if lease is not None:
+            break
+        if time.monotonic() > deadline:
+            logger.warning("Gave up waiting for another worker's %s of %s", operation, key)
+            FLIGHT_CALLS.labels(operation, "timed_out").inc()
+            return fn()
+        time.sleep(POLL_SECONDS)
+        snapshot = reference.get()
+        if (snapshot.get("status") == "done" and snapshot.get("result_json") is not None
+                and (snapshot.get("finished_at") or 0) >= waiting_since):
+            FLIGHT_CALLS.labels(operation, "remote_follower").inc()
+            return json.loads(snapshot.get("result_json"))
+
+    FLIGHT_CALLS.labels(operation, "leader").inc()
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_keep_lease, args=(db, lease, lease_seconds, stop), daemon=True)
+    heartbeat.start()
+    try:
+        result = fn()
+    except BaseException:
+        # Waiting workers take over and run the call themselves
+        _release(db, lease, heartbeat, stop, {"status": "failed"})
+        raise
+    _release(db, lease, heartbeat, stop, {"status": "done", "result_json": _shareable(result)})
+    return result
+
@@ -0,0 +1,201 @@
+"""
+Run pipeline stages as a dependency graph.
+
+Stages that do not depend on each other run concurrently, so a report takes
+as long as its longest chain of stages rather than the sum of all of them.
+Each graph gets its own threads (one per stage at most), so stages are never
+queued behind other graphs' work. Each stage can have a timeout, counted from
+when the stage starts running, and a fallback: when the stage raises or runs
+past its timeout the fallback's value is used instead (a timed-out stage
+keeps running in the background on its graph's thread, but its result is
+ignored).
+
+Every stage is timed as a tracing span, and the critical path (the chain of
+stages that determined the total time) is returned and recorded on the
+current run as critical_path.<stage> spans.
+"""
+import contextvars
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from helperFunctions import tracing
+
+logger = logging.getLogger(__name__)
+
+# How often to check whether a launched stage has started, so its timeout can begin
+_START_POLL_SECONDS = 0.05
+
+
+@dataclass
+class Stage:
+    """
+    One unit of work in a graph.
+
+    fn is called with the results of the stages in depends_on as keyword
+    arguments named after those stages.
+    """
+    name: str
+    fn: Callable[..., Any]
+    depends_on: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    fallback: Optional[Callable[[], Any]] = None
+
+
+@dataclass
+class StageRun:
+    results: Dict[str, Any] = field(default_factory=dict)
+    # (start, end) in seconds since the graph started
+    timings: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    # Stages whose fallback was used, with the reason
+    degraded: Dict[str, str] = field(default_factory=dict)
+    critical_path: List[str] = field(default_factory=list)
+
+    @property
+    def elapsed(self) -> float:
+        return max((end for _, end in self.timings.values()), default=0.0)
+
+
+class StageTimedOut(TimeoutError):
+    """Raised when a stage without a fallback runs past its timeout"""
+
+
+def _validate(stages: Sequence[Stage]) -> Dict[str, Stage]:
+    by_name = {}
+    for stage in stages:
+        if stage.name in by_name:
+            raise ValueError(f"Duplicate stage: {stage.name}")
+        by_name[stage.name] = stage
+    for stage in stages:
+        for dependency in stage.depends_on:
+            if dependency not in by_name:
+                raise ValueError(f"Stage {stage.name} depends on unknown stage {dependency}")
+
+    # Reject cycles up front rather than waiting forever
+    visiting, done = set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle through stage {name}")
+        visiting.add(name)
+        for dependency in by_name[name].depends_on:
+            visit(dependency)
+        visiting.discard(name)
+        done.add(name)
+
+    for name in by_name:
+        visit(name)
+    return by_name
+
+
+def _run_stage(stage: Stage, kwargs: Dict[str, Any], started: Dict[str, float]):
+    started[stage.name] = time.perf_counter()
+    with tracing.span(stage.name):
+        return stage.fn(**kwargs)
+
+
+def run_stages(stages: Sequence[Stage]) -> StageRun:
+    """
+    Run stages as soon as their dependencies have finished.
+
+    Parameters:
+    - stages: The stages of the graph, in any order
+
+    Returns:
+    StageRun with each stage's result, timings, the stages that fell back and the critical path
+
+    Raises:
+    The stage's own exception if a stage without a fallback fails, or
+    StageTimedOut if it runs past its timeout
+    """
+    by_name = _validate(stages)
+    run = StageRun()
+    start = time.perf_counter()
+    running = {}  # future -> stage name
+    started: Dict[str, float] = {}  # stage name -> perf_counter() when it began running
+    # Threads of timed-out stages stay with this graph instead of a shared pool
+    executor = ThreadPoolExecutor(max_workers=max(1, len(by_name)), thread_name_prefix="stage")
+
+    def launch_ready():
+        for stage in by_name.values():
+            # Stages get their timings entry when they are launched
+            if stage.name in run.timings:
+                continue
+            if all(dependency in run.results for dependency in stage.depends_on):
+                kwargs = {dependency: run.results[dependency] for dependency in stage.depends_on}
+                launched = time.perf_counter()
+                run.timings[stage.name] = (launched - start, launched - start)
+                future = executor.submit(contextvars.copy_context().run, _run_stage, stage, kwargs, started)
+                running[future] = stage.name
+
+    def deadline(name: str) -> Optional[float]:
+        timeout = by_name[name].timeout
+        if timeout is None:
+            return None
+        if name not in started:
+            # Not running yet: look again shortly
+            return time.perf_counter() + _START_POLL_SECONDS
+        return started[name] + timeout
+
+    def finish(name: str, value: Any):
+        launched, _ = run.timings[name]
+        run.timings[name] = (launched, time.perf_counter() - start)
+        run.results[name] = value
+
+    def fall_back(name: str, reason: str, error: BaseException = None):
+        stage = by_name[name]
+        if stage.fallback is None:
+            if error is not None:
+                raise error
+            raise StageTimedOut(f"Stage {name} {reason}")
+        logger.warning("Stage %s %s; using its fallback", name, reason)
+        run.degraded[name] = reason
+        finish(name, stage.fallback())
+
+    try:
+        launch_ready()
+        while running:
+            deadlines = [deadline(name) for name in running.values() if by_name[name].timeout is not None]
+            timeout = max(0.0, min(deadlines) - time.perf_counter()) if deadlines else None
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name = running.pop(future)
+                error = future.exception()
+                if error is None:
+                    finish(name, future.result())
+                else:
+                    fall_back(name, f"failed: {error}", error)
+
+            now = time.perf_counter()
+            for future, name in list(running.items()):
+                if by_name[name].timeout is not None and name in started and now >= deadline(name):
+                    running.pop(future)
+                    fall_back(name, f"timed out after {by_name[name].timeout}s")
+
+            launch_ready()
+    finally:
+        # Don't wait for timed-out stages; their threads exit when they finish
+        executor.shutdown(wait=False)
+
+    run.critical_path = _critical_path(by_name, run.timings)
+    trace = tracing.current_run()
+    if trace is not None:
+        for name in run.critical_path:
+            begin, end = run.timings[name]
+            trace.record(f"critical_path.{name}", end - begin)
+    return run
+
+
+def _critical_path(by_name: Dict[str, Stage], timings: Dict[str, Tuple[float, float]]) -> List[str]:
+    """Walk back from the last stage to finish through the dependency that finished last"""
+    if not timings:
+        return []
+    path = [max(timings, key=lambda name: timings[name][1])]
+    while by_name[path[-1]].depends_on:
+        path.append(max(by_name[path[-1]].depends_on, key=lambda name: timings[name][1]))
+    return list(reversed(path))
@@ -0,0 +1,177 @@
+import codecs
+import json
+import math
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class _ArrayParser:
+    """State for parsing a JSON array whose text arrives in pieces"""
+
+    def __init__(self):
+        self.buffer = ""
+        self.started = False
+        self.finished = False
+
+    def feed(self, text: str, final: bool = False) -> List[Any]:
+        """Add text and return every element that is now complete"""
+        self.buffer += text
+        buffer = self.buffer
+        length = len(buffer)
+        items = []
+        pos = 0
+
+        while not self.finished:
+            while pos < length and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= length:
+                break
+            char = buffer[pos]
+            if not self.started:
+                if char != "[":
+                    raise ValueError("Expected a JSON array response")
+                self.started = True
+                pos += 1
+            elif char == "]":
+                self.finished = True
+                pos += 1
+            elif char == ",":
+                pos += 1
+            else:
+                try:
+                    item, end = _decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise ValueError("Truncated JSON array response")
+                    break
+                # A bare number at the end of the buffer may continue in the next chunk
+                if end >= length and not final:
+                    break
+                items.append(item)
+                pos = end
+
+        self.buffer = buffer[pos:]
+        if final and self.started and not self.finished:
+            raise ValueError("Truncated JSON array response")
+        return items
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Incrementally parse a top-level JSON array, yielding one element at a time.
+
+    Only the element currently being decoded and the unconsumed tail of the
+    last chunk are held in memory, so peak memory is bounded by the largest
+    single element rather than by the length of the array.
+
+    Parameters:
+    - chunks: Iterable of raw bytes, e.g. requests' response.iter_content()
+
+    Yields:
+    Each decoded element of the array
+    """
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    parser = _ArrayParser()
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        yield from parser.feed(text_decoder.decode(chunk))
+        if parser.finished:
+            return
+
+    yield from parser.feed(text_decoder.decode(b"", final=True), final=True)
+
+
+class NumericColumn:
+    """Append-only numeric column backed by a typed array instead of Python objects"""
+
+    def __init__(self):
+        self.values = array("q")
+
+    def append(self, value):
+        try:
+            self.values.append(value)
+        except (TypeError, OverflowError):
+            self._promote(value)
+
+    def _promote(self, value):
+        if isinstance(self.values, array):
+            if self.values.typecode == "d" and value is None:
+                # Nulls in a float column are NaN; the buffer stays typed
+                pass
+            elif self.values.typecode == "q" and (value is None or isinstance(value, float)):
+                self.values = array("d", self.values)
+            else:
+                # Non-numeric data: fall back to a plain object column
+                self.values = list(self.values)
+        if value is None and isinstance(self.values, array):
+            value = math.nan
+        self.values.append(value)
+
+    def to_numpy(self):
+        if isinstance(self.values, array):
+            dtype = np.int64 if self.values.typecode == "q" else np.float64
+            return np.frombuffer(self.values, dtype=dtype)
+        return self.values
+
+
+def build_frame(items: Iterable[Dict], fields: List[Tuple[str, Optional[Tuple[str, ...]], Any]]) -> pd.DataFrame:
+    """
+    Append fields from a stream of records straight into column buffers.
+
+    Each record is dropped as soon as its fields are extracted, so the decoded
+    list of record dicts is never held. The buffers themselves still hold the
+    whole stream, though: peak memory is the column buffers plus the finished
+    DataFrame, which grows with the length of the history.
+
+    Parameters:
+    - items: Iterable of record dictionaries (typically from iter_json_array)
+    - fields: List of (column, path, default). The path is a tuple of keys into
+      the record and a numeric default selects a typed numeric buffer. A path of
+      None makes the column a constant equal to default.
+
+    Returns:
+    DataFrame with columns in the order of fields, or an empty DataFrame
+    """
+    columns = {}
+    extracted = []
+    for column, path, default in fields:
+        if path is None:
+            continue
+        numeric = isinstance(default, (int, float)) and not isinstance(default, bool)
+        columns[column] = NumericColumn() if numeric else []
+        extracted.append((columns[column], path, default))
+
+    row_count = 0
+    for item in items:
+        row_count += 1
+        for buffer, path, default in extracted:
+            value = item
+            for key in path[:-1]:
+                value = value.get(key) or None
+                if value is None:
+                    break
+            if value is None:
+                # The nested object is absent altogether
+                buffer.append(None)
+            else:
+                buffer.append(value.get(path[-1], default))
+
+    if row_count == 0:
+        return pd.DataFrame()
+
+    data = {}
+    for column, path, default in fields:
+        if path is None:
+            data[column] = [default] * row_count
+        else:
+            buffer = columns[column]
+            data[column] = buffer.to_numpy() if isinstance(buffer, NumericColumn) else buffer
+    return pd.DataFrame(data)
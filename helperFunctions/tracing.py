@@ -0,0 +1,184 @@
+"""
+Lightweight tracing for the newsletter pipeline.
+
+Spans time each pipeline stage and outbound HTTP call. Every span is exported
+as a Prometheus histogram (served by the /metrics endpoint) and, when a run is
+active, also recorded on the current RunTrace so a per-run breakdown can be
+stored next to the cron log.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import requests
+from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
+
+from helperFunctions import resilience
+
+# Buckets span fast in-process stages up to slow LLM calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_LATENCY = Histogram(
+    "newsletter_stage_seconds",
+    "Time spent in each newsletter pipeline stage",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_LATENCY = Histogram(
+    "outbound_http_seconds",
+    "Latency of outbound HTTP calls by upstream",
+    ["upstream", "method", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+_current_run = contextvars.ContextVar("current_run", default=None)
+
+
+class RunTrace:
+    """Collects span durations for a single run (e.g., one cron invocation)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations: Dict[str, List[float]] = {}
+        self.started_at = time.perf_counter()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self._durations.setdefault(name, []).append(seconds)
+
+    def durations(self) -> Dict[str, List[float]]:
+        """Raw span durations in seconds, keyed by span name"""
+        with self._lock:
+            return {name: list(values) for name, values in self._durations.items()}
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-span count, total, mean, p50, p95 and max in milliseconds"""
+        with self._lock:
+            durations = {name: sorted(values) for name, values in self._durations.items()}
+
+        summary = {}
+        for name, values in durations.items():
+            count = len(values)
+            summary[name] = {
+                "count": count,
+                "total_ms": round(sum(values) * 1000, 2),
+                "mean_ms": round(sum(values) / count * 1000, 2),
+                "p50_ms": round(_percentile(values, 50) * 1000, 2),
+                "p95_ms": round(_percentile(values, 95) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2)
+            }
+        summary["run"] = {
+            "count": 1,
+            "total_ms": round((time.perf_counter() - self.started_at) * 1000, 2)
+        }
+        return summary
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(percent / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def current_run() -> Optional[RunTrace]:
+    """Return the RunTrace active in this context, if any"""
+    return _current_run.get()
+
+
+@contextmanager
+def run_trace():
+    """Start collecting a per-run timing breakdown for everything traced inside the block"""
+    trace = RunTrace()
+    token = _current_run.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_run.reset(token)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage).observe(elapsed)
+        trace = _current_run.get()
+        if trace is not None:
+            trace.record(stage, elapsed)
+
+
+def traced_request(method: str, url: str, upstream: str, **kwargs) -> requests.Response:
+    """
+    Make an HTTP request with requests and record its latency under the upstream's name.
+
+    The request goes through the upstream's resilience guard (concurrency
+    limit, circuit breaker and default timeout), and non-streamed GETs may be
+    hedged. Raises resilience.UpstreamUnavailable, a requests ConnectionError,
+    when the guard fails the call fast.
+
+    For streamed responses the recorded time covers the response headers only;
+    the guard's slot is held until the returned response is closed, so close
+    it (e.g., use it as a context manager) once the body has been read.
+    """
+    guard = resilience.upstream(upstream)
+    if guard.policy.timeout is not None:
+        kwargs.setdefault("timeout", guard.policy.timeout)
+
+    def send():
+        return _timed_request(method, url, upstream, **kwargs)
+
+    if kwargs.get("stream"):
+        return guard.call_streaming(send)
+    if method.upper() == "GET":
+        return guard.call(guard.hedged, send)
+    return guard.call(send)
+
+
+def _timed_request(method: str, url: str, upstream: str, **kwargs) -> requests.Response:
+    start = time.perf_counter()
+    status = "error"
+    try:
+        response = requests.request(method, url, **kwargs)
+        status = str(response.status_code)
+        return response
+    finally:
+        _record_http(upstream, method, status, time.perf_counter() - start)
+
+
+@contextmanager
+def http_span(upstream: str, method: str = "POST"):
+    """
+    Time an outbound HTTP call made through a client library (e.g., the OpenAI
+    SDK) rather than traced_request, recording it the way traced_request does.
+    The status is 200 on success, or the raised error's status_code if it has one.
+    """
+    start = time.perf_counter()
+    status = "200"
+    try:
+        yield
+    except Exception as e:
+        status = str(getattr(e, "status_code", None) or "error")
+        raise
+    finally:
+        _record_http(upstream, method, status, time.perf_counter() - start)
+
+
+def _record_http(upstream: str, method: str, status: str, elapsed: float):
+    HTTP_LATENCY.labels(upstream, method.upper(), status).observe(elapsed)
+    trace = _current_run.get()
+    if trace is not None:
+        trace.record(f"http.{upstream}", elapsed)
+
+
+def metrics_payload() -> bytes:
+    """Prometheus text exposition of all registered metrics"""
+    return generate_latest()
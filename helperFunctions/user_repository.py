@@ -0,0 +1,251 @@
+"""
+Data access for the Firestore "users" collection.
+
+UserRepository loads whole cohorts with paginated queries, caches user
+lookups by email and customer ID, and carries each user's document
+reference along so newsletter results can be written back without another
+lookup. Writes are queued and committed in WriteBatch chunks.
+
+Every user document carries a shard_point, a stable hash of its ID, so a
+sharded cron run can query just one shard's slice of a cohort (see
+cron_shards). Documents written before the field existed are filled in by
+backfill_shard_points(), which a sharded run calls for its cohort before
+enqueueing the shards.
+
+Works with the real Firestore client or with
+helperFunctions.firestore_emulator.InMemoryFirestore.
+"""
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from google.api_core.exceptions import NotFound
+
+from helperFunctions.firestore_emulator import DOCUMENT_ID
+from helperFunctions.tracing import span
+
+logger = logging.getLogger(__name__)
+
+USERS_COLLECTION = "users"
+
+# Firestore's maximum number of writes in one batch
+MAX_BATCH_WRITES = 500
+DEFAULT_PAGE_SIZE = 500
+# Documents read per get_all call
+GET_ALL_CHUNK = 100
+
+SHARD_POINT_FIELD = "shard_point"
+# shard_point values lie in [0, SHARD_SPACE)
+SHARD_SPACE = 2 ** 32
+
+
+def shard_point(user_id: str) -> int:
+    """Stable hash of a user's document ID (their email), the same in every process and on every node"""
+    return int.from_bytes(hashlib.sha1(user_id.encode("utf-8")).digest()[:4], "big")
+
+
+@dataclass
+class UserRecord:
+    """A user document together with the reference needed to write back to it"""
+    id: str
+    reference: Any
+    data: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def email(self) -> Optional[str]:
+        return self.data.get("email")
+
+    @property
+    def customer_id(self) -> Optional[str]:
+        return self.data.get("customer_id")
+
+    @classmethod
+    def from_snapshot(cls, snapshot) -> "UserRecord":
+        return cls(id=snapshot.id, reference=snapshot.reference, data=snapshot.to_dict() or {})
+
+
+class UserRepository:
+    """
+    Parameters:
+    - db: Firestore client (or InMemoryFirestore)
+    - page_size: Documents fetched per query page
+    - batch_size: Writes per committed WriteBatch (at most 500)
+    """
+
+    def __init__(self, db, page_size: int = DEFAULT_PAGE_SIZE, batch_size: int = MAX_BATCH_WRITES):
+        if not 0 < batch_size <= MAX_BATCH_WRITES:
+            raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_WRITES}")
+        self.db = db
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self._by_email: Dict[str, UserRecord] = {}
+        self._by_customer_id: Dict[str, UserRecord] = {}
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def _remember(self, user: UserRecord) -> UserRecord:
+        self._by_email[user.id] = user
+        if user.email:
+            self._by_email[user.email] = user
+        if user.customer_id:
+            self._by_customer_id[user.customer_id] = user
+        return user
+
+    def iter_cohort(self, frequency: str, cache: bool = True,
+                    point_range: Optional[Tuple[int, int]] = None) -> Iterator[UserRecord]:
+        """
+        Yield every user with the given newsletter frequency, one query page at a time.
+
+        The next page is only requested once the consumer has taken every user
+        of the current one. Pass cache=False when streaming a large cohort so
+        memory stays flat instead of growing with the lookup cache.
+
+        With point_range (start, end), only users whose shard_point is in
+        [start, end) are read; this needs a composite index on frequency and
+        shard_point.
+        """
+        query = self.db.collection(USERS_COLLECTION).where("frequency", "==", frequency)
+        if point_range is None:
+            query = query.order_by(DOCUMENT_ID)
+        else:
+            query = (query.where(SHARD_POINT_FIELD, ">=", point_range[0])
+                     .where(SHARD_POINT_FIELD, "<", point_range[1])
+                     .order_by(SHARD_POINT_FIELD))
+        query = query.limit(self.page_size)
+        last_snapshot = None
+        while True:
+            page = query.start_after(last_snapshot) if last_snapshot is not None else query
+            with span("firestore.cohort_page"):
+                snapshots = list(page.stream())
+            for snapshot in snapshots:
+                user = UserRecord.from_snapshot(snapshot)
+                yield self._remember(user) if cache else user
+            if len(snapshots) < self.page_size:
+                return
+            last_snapshot = snapshots[-1]
+
+    def load_cohort(self, frequency: str) -> List[UserRecord]:
+        """Load every user with the given newsletter frequency"""
+        return list(self.iter_cohort(frequency))
+
+    def find_user(self, email: str, customer_id: str = None) -> Optional[UserRecord]:
+        """
+        Look a user up by email (the document ID), falling back to customer_id.
+        Results of earlier cohort loads and lookups are served from the cache.
+        """
+        if email in self._by_email:
+            return self._by_email[email]
+        if customer_id and customer_id in self._by_customer_id:
+            return self._by_customer_id[customer_id]
+
+        users = self.db.collection(USERS_COLLECTION)
+        snapshot = users.document(email).get()
+        if snapshot.exists:
+            return self._remember(UserRecord.from_snapshot(snapshot))
+
+        if customer_id:
+            for snapshot in users.where("customer_id", "==", customer_id).limit(1).stream():
+                return self._remember(UserRecord.from_snapshot(snapshot))
+        return None
+
+    def existing_ids(self, emails: List[str]) -> Set[str]:
+        """Which of the given emails (document IDs) already have a user document, read in chunks"""
+        users = self.db.collection(USERS_COLLECTION)
+        existing = set()
+        for start in range(0, len(emails), GET_ALL_CHUNK):
+            references = [users.document(email) for email in emails[start:start + GET_ALL_CHUNK]]
+            with span("firestore.get_all"):
+                existing.update(snapshot.id for snapshot in self.db.get_all(references) if snapshot.exists)
+        return existing
+
+    def backfill_shard_points(self, frequency: Optional[str] = None) -> int:
+        """
+        Add shard_point to every user document without one (only users with the
+        given newsletter frequency, if one is given), returning how many were updated
+        """
+        query = self.db.collection(USERS_COLLECTION)
+        if frequency is not None:
+            query = query.where("frequency", "==", frequency)
+        query = query.order_by(DOCUMENT_ID).limit(self.page_size)
+        last_snapshot, updated = None, 0
+        while True:
+            page = query.start_after(last_snapshot) if last_snapshot is not None else query
+            snapshots = list(page.stream())
+            for snapshot in snapshots:
+                if snapshot.get(SHARD_POINT_FIELD) is None:
+                    self.queue_update(UserRecord.from_snapshot(snapshot), {SHARD_POINT_FIELD: shard_point(snapshot.id)})
+                    updated += 1
+            if len(snapshots) < self.page_size:
+                break
+            last_snapshot = snapshots[-1]
+        self.flush()
+        return updated
+
+    def create(self, email: str, data: Dict[str, Any]) -> UserRecord:
+        """
+        Write a new user document straight away, only if there is none for the email yet.
+
+        Returns:
+        The record, for further queued updates
+
+        Raises:
+        google.api_core.exceptions.Conflict (AlreadyExists) if the user already exists
+        """
+        data = dict(data, **{SHARD_POINT_FIELD: shard_point(email)})
+        user = UserRecord(email, self.db.collection(USERS_COLLECTION).document(email), dict(data))
+        user.reference.create(data)
+        return self._remember(user)
+
+    def queue_update(self, user: UserRecord, fields: Dict[str, Any]):
+        """Queue an update to a user document; a full batch is committed automatically"""
+        self._queue((user.reference, fields))
+
+    def _queue(self, write):
+        with self._lock:
+            self._pending.append(write)
+            if len(self._pending) < self.batch_size:
+                return
+            writes, self._pending = self._pending, []
+        self._commit(writes)
+
+    def queue_newsletter_data(self, user: UserRecord, data: Dict[str, Any], date_range: str):
+        """Queue the 'last_newsletter_data' update for a user"""
+        self.queue_update(user, {
+            "last_newsletter_data": {
+                "data": data,
+                "date": datetime.now().isoformat(),
+                "date_range": date_range
+            }
+        })
+
+    def flush(self) -> int:
+        """Commit all queued writes, returning how many were written"""
+        with self._lock:
+            writes, self._pending = self._pending, []
+        for start in range(0, len(writes), self.batch_size):
+            self._commit(writes[start:start + self.batch_size])
+        return len(writes)
+
+    def _commit(self, writes):
+        batch = self.db.batch()
+        for reference, fields in writes:
+            batch.update(reference, fields)
+        try:
+            batch.commit()
+        except NotFound:
+            # A batch is all or nothing, so one user deleted mid-run would drop
+            # every other write in it; write them one at a time instead
+            for reference, fields in writes:
+                try:
+                    reference.update(fields)
+                except NotFound:
+                    logger.warning("Skipped an update to deleted user %s", reference.id)
+
+    def __enter__(self) -> "UserRepository":
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
@@ -0,0 +1,68 @@
+"""
+Bounded producer/consumer processing for streams of work items.
+"""
+import contextvars
+import logging
+import queue
+import threading
+from typing import Any, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def process_stream(items: Iterable[Any], handler: Callable[[Any], None],
+                   workers: int = 4, queue_size: int = 100) -> int:
+    """
+    Feed items from an iterable into a bounded queue drained by worker threads.
+
+    The calling thread produces: it pulls the next item only when the queue has
+    room, so a lazily paginated source is read no faster than it is processed
+    and at most queue_size + workers items are in memory at once. Workers run
+    in a copy of the caller's context, so tracing spans still land on the
+    caller's RunTrace.
+
+    Parameters:
+    - items: Iterable of work items, typically a generator
+    - handler: Called once per item; it should handle its own errors
+      (exceptions are logged and the worker moves on)
+    - workers: Number of worker threads
+    - queue_size: Maximum number of items waiting in the queue
+
+    Returns:
+    Number of items produced
+
+    Raises:
+    Whatever the iterable raises, after the workers finish the queued items
+    """
+    work = queue.Queue(maxsize=queue_size)
+
+    def worker():
+        while True:
+            item = work.get()
+            if item is _STOP:
+                return
+            try:
+                handler(item)
+            except Exception:
+                logger.exception("Unhandled error processing work item")
+
+    threads = [
+        threading.Thread(target=contextvars.copy_context().run, args=(worker,), daemon=True)
+        for _ in range(max(1, workers))
+    ]
+    for thread in threads:
+        thread.start()
+
+    produced = 0
+    try:
+        for item in items:
+            work.put(item)
+            produced += 1
+    finally:
+        for _ in threads:
+            work.put(_STOP)
+        for thread in threads:
+            thread.join()
+    return produced
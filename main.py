@@ -1,38 +1,37 @@
-import os
 from datetime import datetime
-from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-import yfinance as yf
+from typing import List, Optional
 import requests
 import json
-import firebase_admin
-from firebase_admin import credentials, firestore
-import pandas as pd
-from helperFunctions.generate_open_ai_summary import generate_open_ai_summary
-from helperFunctions.get_bank_data import BankDataManager
-from helperFunctions.get_news_articles_and_summary import get_news_articles_and_summary
-from helperFunctions.get_stocks_data import get_stocks_data
-from helperFunctions.create_account_transactions import populate_and_create_all_accounts_with_transactions
-import generate_newsletter
+import re
+from helperFunctions import clients
+from helperFunctions import tracing
+from helperFunctions import resilience
+from helperFunctions.single_flight import single_flight
+from helperFunctions.settings import get_settings
+from helperFunctions.user_repository import SHARD_POINT_FIELD, shard_point
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
-import send_email
-import resend
+import logging
+from helperFunctions.logging_config import configure_logging
 
-load_dotenv()
+# Heavy modules (pandas, pyarrow, openai, yfinance, firebase_admin, resend, Faker)
+# are imported inside the endpoints that need them to keep cold starts fast.
+# Settings are loaded first so .env can supply the LOG_* variables.
+get_settings()
+configure_logging()
+logger = logging.getLogger(__name__)
 
-if os.environ.get("FIREBASE_SERVICE_ACCOUNT"):
-    try:
-        service_account_info = json.loads(os.environ.get("FIREBASE_SERVICE_ACCOUNT"))
-        cred = credentials.Certificate(service_account_info)
-        firebase_admin.initialize_app(cred)
-        db = firestore.client()
-        print("Firebase initialized with environment variables")
-    except Exception as e:
-        print(f"Error initializing Firebase with environment variable: {str(e)}")
 
+def get_db():
+    """Return the Firestore client, initializing Firebase on first use"""
+    db = clients.get_firestore_db()
+    if db is None:
+        raise HTTPException(status_code=503, detail="Firestore is not configured")
+    return db
 
-tickers = ["^GSPC", "^DJI", "^IXIC"]
 
 app = FastAPI()
 app.add_middleware(
@@ -43,6 +42,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def warm_up():
+    """
+    Optional warm-up hook (WARM_UP_ON_STARTUP=true): import the heavy modules and
+    create the shared clients before the first request instead of during it.
+    """
+    if not get_settings().warm_up_on_startup:
+        return
+    with tracing.span("startup.warm_up"):
+        import send_email  # noqa: F401 (pulls in report_data, pandas and the bank/news helpers)
+        import resend  # noqa: F401
+        import yfinance  # noqa: F401
+        from helperFunctions import ledger_export  # noqa: F401
+
+        clients.get_firestore_db()
+        if get_settings().open_ai_api_key:
+            clients.get_openai_client(get_settings().open_ai_api_key)
+    logger.info("Warm-up complete")
+
 # This adds a root endpoint to prevent 404 errors
 @app.get("/")
 def read_root():
@@ -53,10 +71,17 @@ def read_root():
         "version": "1.0.0",
         "endpoints": [
             "/register",
+            "/bulk_import",
+            "/bulk_import/{job_id}",
             "/get_all_user_data/{customer_id}",
+            "/report/{customer_id}",
+            "/export/{customer_id}/{table}",
+            "/bulk_export/{table}",
             "/cron/send_weekly_newsletters",
             "/cron/send_monthly_newsletters",
-            "/send_demo_email/{email}"
+            "/cron/runs/{run_id}",
+            "/send_demo_email/{email}",
+            "/metrics"
         ]
     }
     
@@ -74,6 +99,9 @@ class RegisterRequest(BaseModel):
     email: str
     frequency: str
 
+class BulkExportRequest(BaseModel):
+    customer_ids: List[str]
+
 def convert_numpy_types(obj):
     """Convert numpy types to Python native types recursively in dictionaries and lists."""
     import numpy as np
@@ -98,6 +126,16 @@ def convert_numpy_types(obj):
 
 @app.post("/register")
 def register_user(request: RegisterRequest):
+    db = get_db()
+    # A retry racing the original registration waits for it and gets its response
+    # instead of creating a second Nessie customer
+    return single_flight("register", request.email, lambda: _register_user(request, db), db=db)
+
+def _register_user(request: RegisterRequest, db):
+    from google.api_core.exceptions import Conflict
+    import send_email
+    from helperFunctions.create_account_transactions import populate_and_create_all_accounts_with_transactions
+
     user_ref = db.collection("users").document(request.email)
     user_doc = user_ref.get()
 
@@ -204,45 +242,29 @@ def register_user(request: RegisterRequest):
     }
 
     try:
-        # Get API details from environment variables
-        api_url = os.getenv('NESSIE_API_URL', 'http://api.nessieisreal.com')
-        api_key = os.getenv('NESSIE_API_KEY')
-
-        # Debug prints - remove in production
-        print(f"Using API URL: {api_url}")
-        print(f"Using API Key: {api_key[:5]}...") # Print only first 5 chars for security
-
-        # Construct URL with proper error handling
-        if not api_url or not api_key:
-            raise ValueError("Missing NESSIE_API_URL or NESSIE_API_KEY environment variables")
-
-        # Ensure the URL is properly constructed
-        if api_url.endswith('/'):
-            api_url = api_url[:-1]  # Remove trailing slash if present
+        # Settings are validated at load; the URL never has a trailing slash
+        settings = get_settings()
+        settings.require("nessie_api_key")
 
-        url = f"{api_url}/customers?key={api_key}"
-
-        # Debug the request before sending
-        print(f"Making request to: {url}")
-        print(f"With headers: {headers}")
-        print(f"With data: {json.dumps(capital_one_data)}")
+        url = f"{settings.nessie_api_url}/customers?key={settings.nessie_api_key}"
 
         # Make the request with proper error handling
         json_data = json.dumps(capital_one_data)
-        response = requests.post(
+        logger.debug("Creating Nessie customer for %s (%d byte payload)", request.email, len(json_data))
+        response = tracing.traced_request(
+            "POST",
             url,
+            "nessie",
             data=json_data,
             headers=headers
         )
 
-        # Debug the response
-        print(f"Response status: {response.status_code}")
-        print(f"Response body: {response.text}")
+        logger.debug("Nessie customer create returned status %s", response.status_code)
 
         # Handle response status code explicitly
         if response.status_code == 400:
             error_detail = f"Bad request to Capital One API. Response: {response.text}"
-            print(error_detail)
+            logger.warning(error_detail)
             raise HTTPException(status_code=400, detail=error_detail)
 
         response.raise_for_status()
@@ -281,8 +303,9 @@ def register_user(request: RegisterRequest):
             }
         }
 
-        db.collection("users").document(request.email).set(user_data)
-        populate_and_create_all_accounts_with_transactions.fill_accounts_with_data(customer_id)
+        # Create-only, so a bulk import that got there first is never overwritten
+        db.collection("users").document(request.email).create(dict(user_data, **{SHARD_POINT_FIELD: shard_point(request.email)}))
+        populate_and_create_all_accounts_with_transactions.fill_accounts_with_data(customer_id, db=db)
 
         # Send the email newsletter
         date_range = "30d"  # Default to 30 days - adjust as needed based on your requirements
@@ -300,308 +323,269 @@ def register_user(request: RegisterRequest):
 
     except requests.exceptions.RequestException as e:
         error_detail = f"Error calling Capital One API: {str(e)}"
-        print(error_detail)
+        logger.error(error_detail)
         if hasattr(e, 'response') and e.response:
             error_detail += f" Response: {e.response.text}"
         raise HTTPException(status_code=500, detail=error_detail)
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
+    except Conflict:
+        raise HTTPException(status_code=409, detail=f"User {request.email} was created by another request")
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")
+        logger.exception("Unexpected error registering %s", request.email)
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
+
+@app.post("/bulk_import", status_code=202)
+async def start_bulk_import(request: Request, background_tasks: BackgroundTasks, format: Optional[str] = None,
+                            seed_accounts: bool = True, send_welcome: bool = True):
+    """
+    Import many users from a CSV (with a header row) or JSON Lines upload sent as the request body.
+
+    Rows are validated and normalized up front; the Nessie customers, user
+    documents, account seeding and welcome emails are then handled by a
+    background job whose progress is available from /bulk_import/{job_id}.
+
+    Parameters:
+    - format: "csv" or "jsonl" (defaults from the Content-Type, CSV unless it names JSON)
+    - seed_accounts: Seed accounts and transactions for each new customer
+    - send_welcome: Send each new user their first newsletter
+
+    Returns:
+    The queued job's progress, including its job_id and any rejected rows
+    """
+    import bulk_import
+
+    body = await request.body()
+    format = format or bulk_import.format_from_content_type(request.headers.get("content-type"))
+    db = get_db()
+    try:
+        # Parsing and validation are pandas work, kept off the event loop
+        job = await run_in_threadpool(bulk_import.create_job, db, body, format, seed_accounts, send_welcome)
+    except bulk_import.BulkImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    background_tasks.add_task(job.run)
+    return job.status()
+
+@app.get("/bulk_import/{job_id}")
+def get_bulk_import(job_id: str):
+    """Progress of a bulk import job"""
+    import bulk_import
+
+    status = bulk_import.get_job_status(get_db(), job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return status
         
 @app.post("/get_all_user_data/{customer_id}")
 def get_all_user_data(customer_id:str):
-    bank_manager = BankDataManager(os.getenv('NESSIE_API_URL'), os.getenv('NESSIE_API_KEY'))
-    timestamp = "30d"
-    bank_manager.fetch_customer_data(customer_id)
+    # Concurrent requests for the same customer in this process share one report
+    # (reports hold customers' financial data, so they are not shared through Firestore)
+    return single_flight("report", customer_id, lambda: _build_user_data(customer_id))
 
-    result = {}
+def _build_user_data(customer_id: str):
+    import report_data
 
-    if bank_manager.customers_df is not None and not bank_manager.customers_df.empty:
-        customer_info = bank_manager.customers_df.iloc[0]
-        result["first_name"] = customer_info['first_name']
-        result["last_name"] = customer_info['last_name']
-        result["name"] = f"{customer_info['first_name']} {customer_info['last_name']}".strip()
-    else:
-        result["first_name"] = "Unknown"
-        result["last_name"] = "Customer"
-        result["name"] = "Unknown Customer"
+    # Banking summary, news and stocks are fetched concurrently
+    result = report_data.get_report_data(customer_id, "30d")
 
-    result["net_worth"] = round(bank_manager.calculate_customer_net_worth(customer_id), 2)
-    result["money_owed"] = round(bank_manager.calculate_total_debt(customer_id), 2)
+    return convert_numpy_types(result)
+
+@app.get("/report/{customer_id}")
+def get_report(customer_id: str, fields: Optional[str] = None, date_range: str = "30d"):
+    """
+    Selected fields of a customer's report. Only the sections those fields come
+    from are computed, so e.g. fields=net_worth,account_balances makes no LLM,
+    news or stock calls.
 
-    money_spent = 0
-    money_added = 0
-    largest_transactions = []
-    largest_deposits = []
+    Parameters:
+    - fields: Comma-separated report fields, plus "html" for the rendered newsletter; every data field if omitted
+      (an empty selector is rejected)
+    - date_range: Period for the transaction metrics as a number of days (e.g., "7d", "30d")
 
-    if bank_manager.transactions_df is not None and not bank_manager.transactions_df.empty:
-        transactions = bank_manager.transactions_df
+    Returns:
+    The requested fields
+    """
+    import report_data
 
-        if timestamp:
-            transactions['transaction_date'] = pd.to_datetime(
-                transactions['transaction_date'], errors='coerce'
-            )
-            if timestamp.endswith('d'):
-                days = int(timestamp[:-1])
-                cutoff_date = datetime.now() - pd.Timedelta(days=days)
-                transactions = transactions[transactions['transaction_date'] >= cutoff_date]
-
-        expenses = transactions[transactions['transaction_type'].isin(['purchase', 'withdrawal'])]
-        if not expenses.empty:
-            money_spent = round(expenses['amount'].sum(), 2)
-
-        deposits = transactions[transactions['transaction_type'] == 'deposit']
-        if not deposits.empty:
-            money_added = round(deposits['amount'].sum(), 2)
-
-        transactions_copy = transactions.copy()
-        transactions_copy['abs_amount'] = transactions_copy['amount'].abs()
-        transactions_copy = transactions_copy.sort_values('abs_amount', ascending=False)
-
-        if len(transactions_copy) > 0:
-            largest_tx = transactions_copy[
-                transactions_copy['transaction_type'].isin(['purchase', 'withdrawal'])
-            ].head(3)
-
-            if not largest_tx.empty:
-                largest_transactions = largest_tx[['transaction_id', 'amount', 'description', 'transaction_date']].to_dict('records')
-                for tx in largest_transactions:
-                    if isinstance(tx['transaction_date'], str) and ' ' in tx['transaction_date']:
-                        tx['transaction_date'] = tx['transaction_date'].split()[0]
-                    elif hasattr(tx['transaction_date'], 'date'):
-                        tx['transaction_date'] = tx['transaction_date'].date().isoformat()
-
-        if len(deposits) > 0:
-            largest_deps = deposits.sort_values('amount', ascending=False).head(3)
-            if not largest_deps.empty:
-                largest_deposits = largest_deps[['transaction_id', 'amount', 'description', 'transaction_date']].to_dict('records')
-                for dep in largest_deposits:
-                    if isinstance(dep['transaction_date'], str) and ' ' in dep['transaction_date']:
-                        dep['transaction_date'] = dep['transaction_date'].split()[0]
-                    elif hasattr(dep['transaction_date'], 'date'):
-                        dep['transaction_date'] = dep['transaction_date'].date().isoformat()
-
-    result["money_spent"] = abs(money_spent)
-    result["money_added"] = money_added
-    result["largest_transactions"] = largest_transactions
-    result["largest_deposits"] = largest_deposits
-
-    account_balances = {}
-    if bank_manager.accounts_df is not None and not bank_manager.accounts_df.empty:
-        accounts = bank_manager.accounts_df[bank_manager.accounts_df['customer_id'] == customer_id]
-        for _, account in accounts.iterrows():
-            account_balances[account['nickname'] or f"Account {account['account_id']}"] = round(account['balance'], 2)
-
-    result["account_balances"] = account_balances
+    if not re.fullmatch(r"\d+d", date_range):
+        raise HTTPException(status_code=400, detail='date_range must be a number of days, e.g. "30d"')
 
+    requested = None
+    if fields is not None:
+        requested = sorted({name.strip() for name in fields.split(",") if name.strip()})
+        if not requested:
+            raise HTTPException(status_code=400, detail="fields must name at least one report field")
     try:
-        transaction_categories = {}
-        if bank_manager.transactions_df is not None and not bank_manager.transactions_df.empty:
-            purchases = bank_manager.transactions_df[bank_manager.transactions_df['transaction_type'] == 'purchase']
-            if not purchases.empty and 'description' in purchases.columns:
-                transaction_categories = purchases['description'].value_counts().to_dict()
-
-        top_categories = ""
-        if transaction_categories:
-            top_3_categories = dict(sorted(transaction_categories.items(), key=lambda x: x[1], reverse=True)[:3])
-            top_categories = ", ".join(f"{cat}" for cat in top_3_categories.keys())
-
-        spending_trend = ""
-        if bank_manager.transactions_df is not None and not bank_manager.transactions_df.empty:
-            purchases = bank_manager.transactions_df[bank_manager.transactions_df['transaction_type'] == 'purchase']
-            if not purchases.empty and len(purchases) > 1:
-                purchases = purchases.copy()
-                purchases['transaction_date'] = pd.to_datetime(purchases['transaction_date'], errors='coerce')
-                purchases = purchases.sort_values('transaction_date')
-
-                half_point = len(purchases) // 2
-                first_half = purchases.iloc[:half_point]
-                second_half = purchases.iloc[half_point:]
-
-                first_half_total = first_half['amount'].sum()
-                second_half_total = second_half['amount'].sum()
-
-                if second_half_total > first_half_total:
-                    spending_trend = "increasing"
-                elif second_half_total < first_half_total:
-                    spending_trend = "decreasing"
-                else:
-                    spending_trend = "stable"
-
-        summary_prompt = (
-            f"Create a friendly, personalized financial headline for a newsletter addressed directly to {result['name']}. "
-            f"Reference their current financial situation (net worth: ${result['net_worth']:.2f}, recent spending: ${result['money_spent']:.2f}, "
-            f"deposits: ${result['money_added']:.2f}{' in the specified time period' if timestamp else ''}, debt: ${result['money_owed']:.2f}) "
-            f"but focus on insights rather than just numbers. Use 'you' instead of 'they'. Keep it to 2-3 engaging sentences."
-        )
+        report_data.report_sections([name for name in requested if name != "html"] if requested else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        if top_categories:
-            summary_prompt += f"Their top spending categories include {top_categories}. "
+    key = f"{customer_id}:{date_range}:{','.join(requested or ['all'])}"
+    return single_flight("report_fields", key, lambda: _build_report(customer_id, date_range, requested))
 
-        if spending_trend:
-            summary_prompt += f"Their spending trend is {spending_trend}. "
+def _build_report(customer_id: str, date_range: str, fields: Optional[List[str]]):
+    import generate_newsletter
+    import report_data
 
-        if largest_transactions and len(largest_transactions) > 0:
-            summary_prompt += f"Their largest recent transaction was ${abs(largest_transactions[0]['amount']):.2f} for {largest_transactions[0]['description']}. "
+    if not fields or "html" not in fields:
+        return convert_numpy_types(report_data.build_report(customer_id, date_range, fields))
 
-        result["accounts_summary"] = generate_open_ai_summary(summary_prompt)
-    except Exception as e:
-        result["accounts_summary"] = (
-            f"{result['name']} has a net worth of ${result['net_worth']:.2f} with ${result['money_owed']:.2f} in debt. "
-            f"Recently {'spent' if result['money_spent'] > result['money_added'] else 'saved'} more than "
-            f"{'earned' if result['money_spent'] > result['money_added'] else 'spent'}."
-        )
+    # The newsletter shows every section
+    result = convert_numpy_types(report_data.build_report(customer_id, date_range))
+    result["html"] = generate_newsletter.generate_newsletter(result)
+    return {name: result[name] for name in fields}
+
+def _fetch_ledger_table(customer_id: str, table: str):
+    """Fetch one customer's data and return the requested ledger table as Arrow"""
+    from helperFunctions.get_bank_data import BankDataManager
+
+    bank_manager = BankDataManager.from_settings()
+    bank_manager.fetch_customer_data(customer_id)
+    return bank_manager.to_arrow_tables(customer_id)[table]
 
+@app.get("/export/{customer_id}/{table}")
+def export_customer_table(customer_id: str, table: str, format: str = "arrow"):
+    """
+    Export one of a customer's ledger tables (accounts, transactions, loans, merchants)
+    as an Arrow IPC stream or a Parquet file.
+    """
+    from helperFunctions import ledger_export
+
+    if table not in ledger_export.LEDGER_SCHEMAS:
+        raise HTTPException(status_code=404, detail=f"Unknown table: {table}")
+    if format not in ("arrow", "parquet"):
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+
+    arrow_table = _fetch_ledger_table(customer_id, table)
+    if format == "parquet":
+        return Response(
+            content=ledger_export.table_to_parquet_bytes(arrow_table),
+            media_type=ledger_export.PARQUET_MEDIA_TYPE
+        )
+    return Response(
+        content=ledger_export.table_to_ipc_bytes(arrow_table),
+        media_type=ledger_export.ARROW_STREAM_MEDIA_TYPE
+    )
 
+@app.post("/bulk_export/{table}")
+def bulk_export(table: str, request: BulkExportRequest):
+    """
+    Export a ledger table for many customers as a single Arrow IPC stream.
+    Each customer is written as its own record batch as soon as it is fetched.
+    """
+    from helperFunctions import ledger_export
 
-    result["stocks"] = get_stocks_data(tickers)
-    news_data = get_news_articles_and_summary()
-    result["news_ai_summary"] = news_data["summary"]
-    result["news_articles"] = news_data["articles"]
+    if table not in ledger_export.LEDGER_SCHEMAS:
+        raise HTTPException(status_code=404, detail=f"Unknown table: {table}")
 
-    result = convert_numpy_types(result)
+    tables = (_fetch_ledger_table(customer_id, table) for customer_id in request.customer_ids)
+    return StreamingResponse(
+        ledger_export.iter_ipc_stream(ledger_export.LEDGER_SCHEMAS[table], tables),
+        media_type=ledger_export.ARROW_STREAM_MEDIA_TYPE
+    )
 
-    generate_newsletter.generate_newsletter(result)
+def send_cohort_newsletters(frequency: str, date_range: str) -> dict:
+    """
+    Send newsletters to every user with the given frequency in this process
+    and store the run summary in cron_logs (or the error, when the run fails).
 
-    return result
+    Returns:
+        dict: Summary of the operation results
+    """
+    import newsletter_cron
 
-# Add this endpoint to your main.py file
+    db = get_db()
+    log_id = newsletter_cron.cron_log_id(frequency)
+    try:
+        results = newsletter_cron.send_cohort(db, frequency, date_range)
+    except Exception as e:
+        # Record the failed run too, so it shows up in monitoring
+        newsletter_cron.store_cron_log(db, log_id, {
+            "status": "failed",
+            "error": str(e),
+            "timestamp": datetime.now().isoformat()
+        })
+        raise
+
+    # Add timestamp for logging purposes
+    results["timestamp"] = datetime.now().isoformat()
+
+    # Store the results in Firestore for monitoring
+    newsletter_cron.store_cron_log(db, log_id, results)
+    return results
+
+def run_cron(frequency: str, date_range: str, shards: Optional[int]) -> dict:
+    """
+    Run a cron cohort in this process, or, when sharded, enqueue one task per
+    shard for shard_worker.py processes and return the run ID immediately.
+    """
+    shards = get_settings().cron_shards if shards is None else shards
+    if shards < 1:
+        return send_cohort_newsletters(frequency, date_range)
+
+    from helperFunctions import cron_shards
+    from helperFunctions.user_repository import UserRepository
+
+    db = get_db()
+    # Shards query users by shard_point, so users without one would get nothing
+    missing = UserRepository(db).backfill_shard_points(frequency)
+    if missing:
+        logger.warning("Added shard points to %d %s users that would have been left out of the run", missing, frequency)
+    run_id = cron_shards.enqueue_run(db, frequency, date_range, shards)
+    logger.info("Enqueued %d shards for %s", shards, run_id)
+    return {"status": "enqueued", "run_id": run_id, "shards": shards}
 
 @app.get("/cron/send_weekly_newsletters")
-def send_weekly_newsletters():
+def send_weekly_newsletters(shards: Optional[int] = None):
     """
     Endpoint to be called by a cron job to send newsletters to all users
     with frequency set to "weekly".
+
+    Parameters:
+    - shards: Split the cohort into this many shards for shard workers (defaults to CRON_SHARDS)
     
     Returns:
-        dict: Summary of the operation results
+        dict: Summary of the operation results, or the run ID when sharded
     """
     try:
-
-        global db
-        
-        # Query Firestore for users with frequency="weekly"
-        users_ref = db.collection("users")
-        weekly_users_query = users_ref.where("frequency", "==", "weekly")
-        weekly_users = weekly_users_query.get()
-        
-        results = {
-            "total_users": 0,
-            "successful": 0,
-            "failed": 0,
-            "errors": []
-        }
-        
-        # Iterate through weekly users
-        for user_doc in weekly_users:
-            user_data = user_doc.to_dict()
-            results["total_users"] += 1
-            
-            # Check if user has required fields
-            if not user_data.get("email") or not user_data.get("customer_id"):
-                error_msg = f"User {user_doc.id} missing email or customer_id"
-                results["errors"].append(error_msg)
-                results["failed"] += 1
-                continue
-            
-            try:
-                # Send weekly newsletter (7 days data)
-                send_email.send_financial_newsletter(
-                    customer_id=user_data["customer_id"],
-                    date_range="7d",
-                    recipient_email=user_data["email"]
-                )
-                results["successful"] += 1
-            except Exception as e:
-                error_msg = f"Failed to send newsletter to {user_data.get('email')}: {str(e)}"
-                results["errors"].append(error_msg)
-                results["failed"] += 1
-                print(error_msg)
-        
-        # Add timestamp for logging purposes
-        results["timestamp"] = datetime.now().isoformat()
-        
-        # Store the results in Firestore for monitoring
-        try:
-            db.collection("cron_logs").document(f"weekly_newsletter_{datetime.now().strftime('%Y%m%d_%H%M%S')}").set(results)
-        except Exception as e:
-            print(f"Failed to log cron results to Firestore: {str(e)}")
-        
-        return results
-    
+        # Send weekly newsletter (7 days data)
+        return run_cron("weekly", "7d", shards)
     except Exception as e:
         error_detail = f"Error processing weekly newsletters: {str(e)}"
-        print(error_detail)
+        logger.error(error_detail)
         raise HTTPException(status_code=500, detail=error_detail)
 
-
 @app.get("/cron/send_monthly_newsletters")
-def send_monthly_newsletters():
+def send_monthly_newsletters(shards: Optional[int] = None):
     """
     Endpoint to be called by a cron job to send newsletters to all users
     with frequency set to "monthly".
+
+    Parameters:
+    - shards: Split the cohort into this many shards for shard workers (defaults to CRON_SHARDS)
     
     Returns:
-        dict: Summary of the operation results
+        dict: Summary of the operation results, or the run ID when sharded
     """
     try:
-        # Query Firestore for users with frequency="monthly"
-        users_ref = db.collection("users")
-        monthly_users_query = users_ref.where("frequency", "==", "monthly")
-        monthly_users = monthly_users_query.get()
-        
-        results = {
-            "total_users": 0,
-            "successful": 0,
-            "failed": 0,
-            "errors": []
-        }
-        
-        # Iterate through monthly users
-        for user_doc in monthly_users:
-            user_data = user_doc.to_dict()
-            results["total_users"] += 1
-            
-            # Check if user has required fields
-            if not user_data.get("email") or not user_data.get("customer_id"):
-                error_msg = f"User {user_doc.id} missing email or customer_id"
-                results["errors"].append(error_msg)
-                results["failed"] += 1
-                continue
-            
-            try:
-                # Send monthly newsletter (30 days data)
-                send_email.send_financial_newsletter(
-                    customer_id=user_data["customer_id"],
-                    date_range="30d",
-                    recipient_email=user_data["email"]
-                )
-                results["successful"] += 1
-            except Exception as e:
-                error_msg = f"Failed to send newsletter to {user_data.get('email')}: {str(e)}"
-                results["errors"].append(error_msg)
-                results["failed"] += 1
-                print(error_msg)
-        
-        # Add timestamp for logging purposes
-        results["timestamp"] = datetime.now().isoformat()
-        
-        # Store the results in Firestore for monitoring
-        try:
-            db.collection("cron_logs").document(f"monthly_newsletter_{datetime.now().strftime('%Y%m%d_%H%M%S')}").set(results)
-        except Exception as e:
-            print(f"Failed to log cron results to Firestore: {str(e)}")
-        
-        return results
-    
+        # Send monthly newsletter (30 days data)
+        return run_cron("monthly", "30d", shards)
     except Exception as e:
         error_detail = f"Error processing monthly newsletters: {str(e)}"
-        print(error_detail)
+        logger.error(error_detail)
         raise HTTPException(status_code=500, detail=error_detail)
 
+@app.get("/cron/runs/{run_id}")
+def get_cron_run(run_id: str):
+    """Status of a sharded cron run and each of its shards"""
+    from helperFunctions import cron_shards
+
+    status = cron_shards.get_run_status(get_db(), run_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown run: {run_id}")
+    return status
+
 @app.get("/send_demo_email/{email}")
 async def send_demo_email(email: str):
     """
@@ -615,11 +599,12 @@ async def send_demo_email(email: str):
     - JSON response with status of the email sending operation
     """
     try:
+        import resend
+
         # Set Resend API key
-        
-        RESEND_API_KEY = os.getenv('RESEND_API_KEY')
-        # Set Resend API key
-        resend.api_key = RESEND_API_KEY
+        settings = get_settings()
+        settings.require("resend_api_key")
+        resend.api_key = settings.resend_api_key
         # Read the pre-designed newsletter HTML template
         with open('financial_newsletter.html', 'r') as file:
             newsletter_html = file.read()
@@ -636,7 +621,7 @@ async def send_demo_email(email: str):
         }
 
         # Send the email
-        email_response = resend.Emails.send(params)
+        email_response = resilience.upstream("resend").call(resend.Emails.send, params)
         
         return {
             "status": "success",
@@ -646,5 +631,10 @@ async def send_demo_email(email: str):
         
     except Exception as e:
         error_detail = f"Error sending demo newsletter: {str(e)}"
-        print(error_detail)
-        raise HTTPException(status_code=500, detail=error_detail)
\ No newline at end of file
+        logger.error(error_detail)
+        raise HTTPException(status_code=500, detail=error_detail)
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics: per-stage and outbound HTTP latency histograms"""
+    return Response(content=tracing.metrics_payload(), media_type=tracing.METRICS_CONTENT_TYPE)
@@ -23,6 +23,11 @@ def get_report_data(customer_id, time_period):
             "Savings Account": 28765.43,
             "Investment Account": 105557.64
         },
+        "category_spending": [
+            {"category": "Food", "amount": 1245.30, "count": 18, "previous_amount": 1102.75, "change": 142.55, "change_percent": 12.93},
+            {"category": "Retail", "amount": 987.12, "count": 9, "previous_amount": 1210.40, "change": -223.28, "change_percent": -18.45},
+            {"category": "Entertainment", "amount": 312.45, "count": 5, "previous_amount": 0.0, "change": 312.45, "change_percent": None}
+        ],
         "largest_transactions": [
             {"transaction_id": "tx123", "amount": -1234.56, "description": "Home Repair", "transaction_date": "2025-02-15"},
             {"transaction_id": "tx456", "amount": -876.54, "description": "Annual Insurance Premium", "transaction_date": "2025-02-10"},
@@ -0,0 +1,168 @@
+"""
+Cohort newsletter runs shared by the cron endpoints and the shard workers.
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import send_email
+from helperFunctions import tracing
+from helperFunctions.headline_batcher import HeadlineBatcher
+from helperFunctions.headline_engine import HeadlineEngine, HeadlinePolicy
+from helperFunctions.settings import Settings, get_settings
+from helperFunctions.user_repository import UserRecord, UserRepository
+from helperFunctions.work_queue import process_stream
+
+logger = logging.getLogger(__name__)
+
+CRON_LOGS_COLLECTION = "cron_logs"
+# User document field holding the ID of the last run that sent the user a newsletter
+LAST_RUN_FIELD = "last_newsletter_run"
+
+
+def _until_set(items: Iterator, event: threading.Event) -> Iterator:
+    """Yield items until event is set"""
+    for item in items:
+        if event.is_set():
+            return
+        yield item
+
+
+def send_cohort(db, frequency: str, date_range: str,
+                user_filter: Optional[Callable[[UserRecord], bool]] = None,
+                settings: Settings = None, point_range: Optional[Tuple[int, int]] = None,
+                run_id: Optional[str] = None,
+                cancel: Optional[threading.Event] = None) -> Dict:
+    """
+    Send newsletters to every user with the given frequency.
+
+    Users are streamed from Firestore one page at a time into a bounded queue
+    drained by CRON_WORKERS threads, so the first newsletters go out as soon as
+    the first page arrives and memory does not grow with the cohort size.
+    With COMPUTE_IN_PROCESSES set, the workers hand the pandas work and HTML
+    rendering to the shared process pool and only do the I/O themselves. With
+    HEADLINE_BATCH_SIZE above 1, the workers' headline prompts are sent to
+    OpenAI in batches instead of one request per customer. HEADLINE_LLM_BUDGET
+    and HEADLINE_DEADLINE_SECONDS switch customers to the template headline once
+    the run's LLM budget or time is used up.
+
+    Parameters:
+    - db: Firestore client
+    - frequency: "weekly" or "monthly"
+    - date_range: Report period for each newsletter (e.g., "7d", "30d")
+    - user_filter: Optional predicate selecting which users to send to
+    - settings: Optional settings; defaults to the ones loaded at startup
+    - point_range: Optional [start, end) range of user shard points to read (one shard of a run)
+    - run_id: Optional ID of the run; each user is marked as sent for it as soon as
+      their newsletter goes out, and users already marked are skipped, so a retried
+      shard does not email them again
+    - cancel: Optional event; once set, no further users are taken from the stream
+      or sent to (e.g., when a shard worker loses its lease)
+
+    Returns:
+    Dictionary with total_users, successful, failed, already_sent, errors and a per-stage timings breakdown
+    """
+    settings = settings or get_settings()
+    with tracing.run_trace() as trace:
+        repository = UserRepository(db, page_size=settings.cohort_page_size)
+        compute = None
+        if settings.compute_in_processes:
+            import compute_pool
+            compute = compute_pool.get_compute_pool()
+        headline_batcher = None
+        if settings.headline_batch_size > 1:
+            headline_batcher = HeadlineBatcher(settings.headline_batch_size, settings=settings)
+        headline_engine = HeadlineEngine(HeadlinePolicy.from_settings(settings), headline_batcher, settings)
+
+        results = {
+            "total_users": 0,
+            "successful": 0,
+            "failed": 0,
+            "already_sent": 0,
+            "errors": []
+        }
+        results_lock = threading.Lock()
+
+        def record_failure(error_msg):
+            with results_lock:
+                results["errors"].append(error_msg)
+                results["failed"] += 1
+
+        def send(user):
+            if cancel is not None and cancel.is_set():
+                return
+            with results_lock:
+                results["total_users"] += 1
+
+            if run_id is not None and user.data.get(LAST_RUN_FIELD) == run_id:
+                with results_lock:
+                    results["already_sent"] += 1
+                return
+
+            # Check if user has required fields
+            if not user.email or not user.customer_id:
+                record_failure(f"User {user.id} missing email or customer_id")
+                return
+
+            try:
+                with tracing.span("newsletter.total"):
+                    send_email.send_financial_newsletter(
+                        customer_id=user.customer_id,
+                        date_range=date_range,
+                        recipient_email=user.email,
+                        repository=repository,
+                        user=user,
+                        compute_pool=compute,
+                        headline_engine=headline_engine
+                    )
+                with results_lock:
+                    results["successful"] += 1
+            except Exception as e:
+                error_msg = f"Failed to send newsletter to {user.email}: {str(e)}"
+                record_failure(error_msg)
+                logger.error(error_msg)
+                return
+
+            if run_id is not None:
+                # Written straight away rather than batched, so it survives a crash later in the run
+                try:
+                    with tracing.span("firestore.mark_sent"):
+                        user.reference.update({LAST_RUN_FIELD: run_id})
+                except Exception as e:
+                    logger.error("Failed to mark %s as sent for %s: %s", user.email, run_id, e)
+
+        users = repository.iter_cohort(frequency, cache=False, point_range=point_range)
+        if user_filter is not None:
+            users = (user for user in users if user_filter(user))
+        if cancel is not None:
+            users = _until_set(users, cancel)
+
+        try:
+            process_stream(users, send, workers=settings.cron_workers, queue_size=settings.cron_queue_size)
+        finally:
+            # Commit the remaining batched last_newsletter_data updates, also for the
+            # users already sent to when the stream fails partway through
+            try:
+                with tracing.span("firestore.flush_newsletter_data"):
+                    repository.flush()
+            except Exception as e:
+                logger.error("Failed to store newsletter data in Firestore: %s", e)
+
+        # Per-stage timing breakdown for this run
+        results["timings"] = trace.summary()
+
+    return results
+
+
+def store_cron_log(db, document_id: str, results: Dict):
+    """Store a run summary in cron_logs for monitoring; failures are logged and swallowed"""
+    try:
+        db.collection(CRON_LOGS_COLLECTION).document(document_id).set(results)
+    except Exception as e:
+        logger.error("Failed to log cron results to Firestore: %s", e)
+
+
+def cron_log_id(frequency: str, when: datetime = None) -> str:
+    """cron_logs document ID for a run, e.g. weekly_newsletter_20250101_090000"""
+    return f"{frequency}_newsletter_{(when or datetime.now()).strftime('%Y%m%d_%H%M%S')}"
@@ -1,36 +1,95 @@
 from helperFunctions.get_bank_data import BankDataManager
-from helperFunctions.get_stocks_data import get_stocks_data
-from helperFunctions.get_news_articles_and_summary import get_news_articles_and_summary
-from helperFunctions.generate_open_ai_summary import generate_open_ai_summary
+from helperFunctions.get_stocks_data import get_stocks_data, fallback_stocks_data
+from helperFunctions.get_news_articles_and_summary import get_news_articles_and_summary, cached_news_articles_and_summary
+from helperFunctions.headline_engine import HeadlineEngine
+from helperFunctions.prompt_builder import Prompt, headline_prompt
+from helperFunctions.get_category_spending import get_category_spending
+from helperFunctions.tracing import span
+from helperFunctions.stage_graph import Stage, run_stages
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 import json
-import os
-from dotenv import load_dotenv  # Add this import
+import logging
+from helperFunctions.settings import get_settings
 
+logger = logging.getLogger(__name__)
 
-def get_customer_banking_summary(customer_id: str, timestamp: str = None) -> Dict[str, Any]:
+TICKERS = ["^GSPC", "^DJI", "^IXIC"]
+
+# News and market data are shared by every newsletter and have fallbacks, so a
+# slow upstream should not hold up a report for longer than this
+NEWS_STAGE_TIMEOUT = 20
+STOCKS_STAGE_TIMEOUT = 15
+
+# Report fields by the section that produces them. A section is only computed
+# when one of its fields is requested: the banking section needs Nessie, the
+# headline section also needs the LLM, and the news and stocks sections call
+# NewsAPI (plus the LLM for the summary) and Yahoo Finance.
+REPORT_SECTIONS: Dict[str, Tuple[str, ...]] = {
+    "banking": ("first_name", "last_name", "name", "net_worth", "money_owed", "money_spent", "money_added",
+                "largest_transactions", "largest_deposits", "account_balances", "category_spending",
+                "top_categories", "spending_trend"),
+    "headline": ("accounts_summary",),
+    "stocks": ("stocks",),
+    "news": ("news_ai_summary", "news_articles")
+}
+REPORT_FIELDS = tuple(name for fields in REPORT_SECTIONS.values() for name in fields)
+
+
+def fetch_banking_data(customer_id: str) -> BankDataManager:
+    """Fetch a customer's accounts, transactions, loans and merchants from Nessie"""
+    bank_manager = BankDataManager.from_settings()
+    with span("nessie.fetch_customer_data"):
+        bank_manager.fetch_customer_data(customer_id)
+    return bank_manager
+
+
+def get_customer_banking_summary(customer_id: str, timestamp: str = None, compute_pool=None,
+                                 headline_engine: HeadlineEngine = None,
+                                 previous_report: Dict[str, Any] = None) -> Dict[str, Any]:
     """
     Retrieves comprehensive banking data for a customer and organizes it into a structured dictionary.
     
     Parameters:
     - customer_id: ID of the customer
     - timestamp: Optional time period for filtering transactions (e.g., "1d", "7d", "30d")
+    - compute_pool: Optional ComputePool to run the pandas work in a worker process
+    - headline_engine: Optional HeadlineEngine shared by a run; picks the headline tier and batches LLM calls
+    - previous_report: The summary stored with the customer's last newsletter, if any
     
     Returns:
     Dictionary with comprehensive customer financial data
     """
+    result, summary_prompt = get_banking_metrics(customer_id, timestamp, compute_pool)
+    result["accounts_summary"] = generate_accounts_summary(result, summary_prompt, headline_engine, previous_report)
+    return result
+
+
+def get_banking_metrics(customer_id: str, timestamp: str = None,
+                        compute_pool=None) -> Tuple[Dict[str, Any], Optional[Prompt]]:
+    """Fetch a customer's data and summarize it, without the headline (so without any LLM call)"""
+    bank_manager = fetch_banking_data(customer_id)
+    if compute_pool is None:
+        return summarize_banking_data(bank_manager, customer_id, timestamp)
+    return compute_pool.summarize_banking_data(bank_manager, customer_id, timestamp)
+
+
+def summarize_banking_data(bank_manager: BankDataManager, customer_id: str,
+                           timestamp: str = None) -> Tuple[Dict[str, Any], Optional[Prompt]]:
+    """
+    Compute a customer's banking summary from already-fetched data, without any network calls.
     
-    # Initialize bank manager
-    api_url = "http://api.nessieisreal.com"
-    api_key = "9699a5b7260039b6a8fac75cf9dae5d0"
-    bank_manager = BankDataManager(api_url, api_key)
-    
-    # Fetch all customer data
-    bank_manager.fetch_customer_data(customer_id)
+    Parameters:
+    - bank_manager: BankDataManager with the customer's data fetched
+    - customer_id: ID of the customer
+    - timestamp: Optional time period for filtering transactions (e.g., "1d", "7d", "30d")
     
+    Returns:
+    Tuple of the summary dictionary (without accounts_summary) and the prompt for
+    the AI headline, or None if the prompt could not be built
+    """
     # Initialize result dictionary
     result = {}
     
@@ -125,20 +184,31 @@ def get_customer_banking_summary(customer_id: str, timestamp: str = None) -> Dic
     
     result["account_balances"] = account_balances
     
-    # Generate LLM summary
+    # Spending by merchant category, using the full history for period-over-period deltas
+    result["category_spending"] = get_category_spending(
+        bank_manager.transactions_df, bank_manager.merchants_df, timestamp
+    )
+    
+    # Build the prompt for the LLM summary; the headline template uses the same facts
+    summary_prompt = None
+    result["top_categories"] = []
+    result["spending_trend"] = ""
     try:
         # Get transaction categories and frequencies if available
         transaction_categories = {}
-        if bank_manager.transactions_df is not None and not bank_manager.transactions_df.empty:
+        if not result["category_spending"] and bank_manager.transactions_df is not None and not bank_manager.transactions_df.empty:
             purchases = bank_manager.transactions_df[bank_manager.transactions_df['transaction_type'] == 'purchase']
             if not purchases.empty and 'description' in purchases.columns:
                 transaction_categories = purchases['description'].value_counts().to_dict()
         
         # Format transaction categories for the prompt
-        top_categories = ""
-        if transaction_categories:
+        top_categories = []
+        if result["category_spending"]:
+            top_categories = [item["category"] for item in result["category_spending"][:3]]
+        elif transaction_categories:
             top_3_categories = dict(sorted(transaction_categories.items(), key=lambda x: x[1], reverse=True)[:3])
-            top_categories = ", ".join(f"{cat}" for cat in top_3_categories.keys())
+            top_categories = [str(cat) for cat in top_3_categories.keys()]
+        result["top_categories"] = top_categories
         
         # Calculate spending trend
         spending_trend = ""
@@ -163,43 +233,26 @@ def get_customer_banking_summary(customer_id: str, timestamp: str = None) -> Dic
                     spending_trend = "decreasing"
                 else:
                     spending_trend = "stable"
+        result["spending_trend"] = spending_trend
         
-        summary_prompt = (
-            f"Create a friendly, personalized financial headline for a newsletter addressed directly to {result['name']}. "
-            f"Reference their current financial situation (net worth: ${result['net_worth']:.2f}, recent spending: ${result['money_spent']:.2f}, "
-            f"deposits: ${result['money_added']:.2f}{' in the specified time period' if timestamp else ''}, debt: ${result['money_owed']:.2f}) "
-            f"but focus on insights rather than just numbers. Use 'you' instead of 'they'. Keep it to 2-3 engaging sentences."
-        )
-        
-        if top_categories:
-            summary_prompt += f" Their top spending categories include {top_categories}."
-        
-        if spending_trend:
-            summary_prompt += f" Their spending trend is {spending_trend}."
-            
-        if largest_transactions and len(largest_transactions) > 0:
-            summary_prompt += f" Their largest recent transaction was ${abs(largest_transactions[0]['amount']):.2f} for {largest_transactions[0]['description']}."
-        
-        # Log the prompt for debugging
-        print(f"Generating summary with prompt: {summary_prompt}")
-        
-        # Use the centralized function for summary generation
-        result["accounts_summary"] = generate_open_ai_summary(summary_prompt)
-        
-        # Log success
-        print(f"Successfully generated AI summary: {result['accounts_summary']}")
-        
+        summary_prompt = headline_prompt(result, timestamp)
     except Exception as e:
-        # More detailed error message
-        print(f"Error generating AI summary: {str(e)}")
-        result["accounts_summary"] = (
-            f"{result['name']} has a net worth of ${result['net_worth']:.2f} with ${result['money_owed']:.2f} in debt. "
-            f"Recently {'spent' if result['money_spent'] > result['money_added'] else 'saved'} more than "
-            f"{'earned' if result['money_spent'] > result['money_added'] else 'spent'}."
-        )
-        print(f"Using fallback summary: {result['accounts_summary']}")
+        summary_prompt = None
+        logger.warning("Error building AI summary prompt: %s", e)
     
-    return result
+    return result, summary_prompt
+
+
+def generate_accounts_summary(result: Dict[str, Any], summary_prompt: Optional[Prompt],
+                              headline_engine: HeadlineEngine = None,
+                              previous_report: Dict[str, Any] = None) -> str:
+    """Generate the headline for a banking summary with the engine's chosen tier"""
+    engine = headline_engine or _default_headline_engine
+    return engine.headline(result, summary_prompt, previous_report)
+
+
+# Used outside cron runs: the LLM tier for everyone, falling back to the template
+_default_headline_engine = HeadlineEngine()
 
 def save_to_json(data, filename="customer_summary.json"):
     """Save data dictionary to a JSON file"""
@@ -246,36 +299,98 @@ def save_to_json(data, filename="customer_summary.json"):
     
     print(f"Data saved to {filename}")
 
-def get_report_data(customer_id, time_period):
-    summary = get_customer_banking_summary(customer_id, time_period)
-    news_data = get_news_articles_and_summary()
-    tickers = ["^GSPC","^DJI","^IXIC"]
-    summary["stocks"] = get_stocks_data(tickers)
-    summary["news_ai_summary"] = news_data["summary"]
-    summary["news_articles"] = news_data["articles"]
+def get_report_data(customer_id, time_period, compute_pool=None, headline_engine=None, previous_report=None):
+    """
+    Build all the data for a customer's newsletter.
+    
+    The banking summary, news and stocks stages share no inputs, so they run
+    concurrently and the report takes as long as the slowest of them. News
+    and stocks fall back to cached or default data if they fail or time out.
+    """
+    return build_report(customer_id, time_period, None, compute_pool, headline_engine, previous_report)
+
+
+def report_sections(fields: Optional[List[str]] = None) -> List[str]:
+    """
+    The sections needed for the given report fields.
+
+    Raises:
+    ValueError naming any unknown fields
+    """
+    if fields is None:
+        return list(REPORT_SECTIONS)
+    unknown = [name for name in fields if name not in REPORT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown report fields: {', '.join(unknown)}")
+    return [section for section, section_fields in REPORT_SECTIONS.items()
+            if any(name in fields for name in section_fields)]
+
 
-    return summary
+def build_report(customer_id: str, time_period: str, fields: Optional[List[str]] = None, compute_pool=None,
+                 headline_engine: HeadlineEngine = None, previous_report: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Build the requested fields of a customer's report, computing only the sections they need.
+
+    Parameters:
+    - customer_id: ID of the customer
+    - time_period: Time period for filtering transactions (e.g., "30d")
+    - fields: Fields from REPORT_FIELDS to include; None for all of them
+    - compute_pool, headline_engine, previous_report: As for get_customer_banking_summary
+
+    Returns:
+    Dictionary with the requested fields
+
+    Raises:
+    ValueError naming any unknown fields
+    """
+    sections = report_sections(fields)
+    stages = []
+    if "banking" in sections or "headline" in sections:
+        stages.append(Stage("report.banking_summary", lambda: get_banking_metrics(
+            customer_id, time_period, compute_pool
+        )))
+    if "headline" in sections:
+        stages.append(Stage("report.headline", lambda **results: generate_accounts_summary(
+            *results["report.banking_summary"], headline_engine, previous_report
+        ), depends_on=("report.banking_summary",)))
+    if "news" in sections:
+        stages.append(Stage("report.news", get_news_articles_and_summary,
+                            timeout=NEWS_STAGE_TIMEOUT, fallback=cached_news_articles_and_summary))
+    if "stocks" in sections:
+        stages.append(Stage("report.stocks", lambda: get_stocks_data(TICKERS),
+                            timeout=STOCKS_STAGE_TIMEOUT, fallback=lambda: fallback_stocks_data(TICKERS)))
+    stages = run_stages(stages)
+    logger.debug("Report sections %s for %s took %.2fs; critical path %s",
+                 sections, customer_id, stages.elapsed, " -> ".join(stages.critical_path))
+
+    summary = {}
+    if "report.banking_summary" in stages.results:
+        summary, _ = stages.results["report.banking_summary"]
+    if "report.headline" in stages.results:
+        summary["accounts_summary"] = stages.results["report.headline"]
+    if "report.stocks" in stages.results:
+        summary["stocks"] = stages.results["report.stocks"]
+    if "report.news" in stages.results:
+        news_data = stages.results["report.news"]
+        summary["news_ai_summary"] = news_data["summary"]
+        summary["news_articles"] = news_data["articles"]
+
+    if fields is None:
+        return summary
+    return {name: summary[name] for name in fields}
 
 
 # Example usage
 if __name__ == "__main__":
-    # Load environment variables
-    load_dotenv()
-    
     # Check if OpenAI API key exists
-    if not os.getenv("OPEN_AI_API_KEY"):
+    if not get_settings().open_ai_api_key:
         print("WARNING: OPEN_AI_API_KEY not found in environment variables.")
         print("Please set this in your .env file or environment.")
     
     customer_id = "67cb640c9683f20dd518d16f"
     time_period = "30d"
     
-    summary = get_customer_banking_summary(customer_id, time_period)
-    news_data = get_news_articles_and_summary()
-    tickers = ["^GSPC","^DJI","^IXIC"]
-    summary["stocks"] = get_stocks_data(tickers)
-    summary["news_ai_summary"] = news_data["summary"]
-    summary["news_articles"] = news_data["articles"]
+    summary = get_report_data(customer_id, time_period)
     save_to_json(summary)
     
     # Print key information
@@ -1,18 +1,18 @@
 """
 Email sender module for financial newsletters with Firebase integration
 """
-import os
-import resend
-from dotenv import load_dotenv
 from datetime import datetime
 import report_data
 from generate_newsletter import generate_newsletter
-from firebase_admin import firestore
 import numpy as np
+import logging
+from helperFunctions import clients, resilience
+from helperFunctions.settings import get_settings
+from helperFunctions.user_repository import UserRepository
+from helperFunctions.tracing import http_span, span
 
 
-load_dotenv()
-RESEND_API_KEY = os.environ["RESEND_API_KEY"]
+logger = logging.getLogger(__name__)
 
 def convert_numpy_types(obj):
     """Convert numpy types to Python native types recursively in dictionaries and lists."""
@@ -37,16 +37,46 @@ def convert_numpy_types(obj):
 def get_firestore_db():
     """
     Get the Firestore database client.
-    This avoids circular imports by getting the client at runtime.
+    Firebase is initialized on first use rather than at import time.
+    """
+    return clients.get_firestore_db()
+
+def store_newsletter_data(customer_id, date_range, recipient_email, customer_data, repository=None, user=None):
+    """
+    Store the generated report data under 'last_newsletter_data' on the user's document.
+    Failures are logged and swallowed so the email can still be sent.
+
+    When a repository is passed (cron runs), the update is queued on it and committed
+    with other users' updates in a batch; otherwise it is written immediately.
     """
     try:
-        # Get the existing client that was initialized in main.py
-        return firestore.client()
+        flush = repository is None
+        if repository is None:
+            # Get Firestore client at runtime instead of import time
+            db = get_firestore_db()
+            if db is None:
+                logger.warning("Firebase db not initialized, skipping database update")
+                return
+            repository = UserRepository(db)
+
+        # In Firestore the document ID is the email address; fall back to the customer_id
+        if user is None:
+            user = repository.find_user(recipient_email, customer_id)
+        if user is None:
+            logger.warning("Could not find user for customer_id %s or email %s", customer_id, recipient_email)
+            return
+
+        # Convert NumPy types to native Python types before storing in Firestore
+        repository.queue_newsletter_data(user, convert_numpy_types(customer_data), date_range)
+        if flush:
+            repository.flush()
+        logger.debug("Stored the latest newsletter data for user %s", user.id)
     except Exception as e:
-        print(f"Warning: Could not get Firestore client: {e}")
-        return None
+        logger.error("Error storing report data in Firebase: %s", e)
+        # Continue with email sending even if database update fails
 
-def send_financial_newsletter(customer_id, date_range, recipient_email):
+def send_financial_newsletter(customer_id, date_range, recipient_email, repository=None, user=None,
+                              compute_pool=None, headline_engine=None):
     """
     Generate and send a financial newsletter email to a customer.
     The generated report data is also stored in Firebase under 'last_newsletter_data'.
@@ -55,18 +85,35 @@ def send_financial_newsletter(customer_id, date_range, recipient_email):
     customer_id (str): The ID of the customer to generate the newsletter for
     date_range (str): The date range for the report (e.g., "30d", "60d", "90d")
     recipient_email (str): Email address to send the newsletter to (required)
+    repository (UserRepository): Optional repository to batch the Firestore update on
+    user (UserRecord): Optional already-loaded user document for recipient_email
+    compute_pool (ComputePool): Optional pool to run the pandas work and rendering in worker processes
+    headline_engine (HeadlineEngine): Optional engine shared by a run that picks each headline's tier
     
     Returns:
     dict: The email response from the Resend API
     """
+    import resend
+
     # Set Resend API key
-    resend.api_key = RESEND_API_KEY
+    settings = get_settings()
+    settings.require("resend_api_key")
+    resend.api_key = settings.resend_api_key
+    
+    # The last newsletter's numbers tell the headline engine whether anything changed
+    previous_report = (user.data.get("last_newsletter_data") or {}).get("data") if user else None
     
     # Get customer data from report_data module
-    customer_data = report_data.get_report_data(customer_id, date_range)
+    with span("report_data"):
+        customer_data = report_data.get_report_data(customer_id, date_range, compute_pool,
+                                                    headline_engine, previous_report)
     
     # Generate HTML newsletter content
-    newsletter_html = generate_newsletter(customer_data)
+    with span("generate_newsletter"):
+        if compute_pool is None:
+            newsletter_html = generate_newsletter(customer_data)
+        else:
+            newsletter_html, customer_data = compute_pool.render_newsletter(customer_data)
 
     # Get customer name for email subject
     full_name = customer_data.get('name', f"{customer_data.get('first_name', '')} {customer_data.get('last_name', '')}")
@@ -78,57 +125,8 @@ def send_financial_newsletter(customer_id, date_range, recipient_email):
     subject = f"Financial Insights Newsletter for {full_name} - {today_date}"
 
     # Store the report data in Firebase
-    try:
-        # Get Firestore client at runtime instead of import time
-        db = get_firestore_db()
-        
-        if db is not None:
-            # In Firestore, the document ID is the email address as seen in the screenshot
-            # So we can directly access the user document if we have the email
-            user_doc_ref = db.collection("users").document(recipient_email)
-            user_doc = user_doc_ref.get()
-            
-            if user_doc.exists:
-                # Convert NumPy types to native Python types before storing in Firestore
-                converted_data = convert_numpy_types(customer_data)
-                
-                # Update the user document with the newsletter data
-                user_doc_ref.update({
-                    "last_newsletter_data": {
-                        "data": converted_data,
-                        "date": datetime.now().isoformat(),
-                        "date_range": date_range
-                    }
-                })
-                print(f"Updated user {recipient_email} with the latest newsletter data")
-            else:
-                # If we don't have the email directly, try to find the user by customer_id
-                users_ref = db.collection("users")
-                query = users_ref.where("customer_id", "==", customer_id).limit(1)
-                user_docs = query.get()
-                
-                user_found = False
-                for doc in user_docs:
-                    user_found = True
-                    # Convert NumPy types to native Python types before storing in Firestore
-                    converted_data = convert_numpy_types(customer_data)
-                    
-                    doc.reference.update({
-                        "last_newsletter_data": {
-                            "data": converted_data,
-                            "date": datetime.now().isoformat(),
-                            "date_range": date_range
-                        }
-                    })
-                    print(f"Updated user {doc.id} with the latest newsletter data")
-                
-                if not user_found:
-                    print(f"Warning: Could not find user for customer_id {customer_id} or email {recipient_email}")
-        else:
-            print("Warning: Firebase db not initialized, skipping database update")
-    except Exception as e:
-        print(f"Error storing report data in Firebase: {str(e)}")
-        # Continue with email sending even if database update fails
+    with span("firestore.store_newsletter_data"):
+        store_newsletter_data(customer_id, date_range, recipient_email, customer_data, repository, user)
 
     params: resend.Emails.SendParams = {
         "from": "Penny <penny@newsletter.venai.dev>",
@@ -139,11 +137,12 @@ def send_financial_newsletter(customer_id, date_range, recipient_email):
 
     # Send the email
     try:
-        email_response = resend.Emails.send(params)
-        print(f"Email sent successfully to {recipient_email}")
+        with http_span("resend"):
+            email_response = resilience.upstream("resend").call(resend.Emails.send, params)
+        logger.info("Email sent successfully to %s", recipient_email)
         return email_response
     except Exception as e:
-        print(f"Error sending email: {str(e)}")
+        logger.error("Error sending email: %s", e)
         raise
 
 if __name__ == "__main__":
@@ -0,0 +1,119 @@
+"""
+Worker process for sharded newsletter cron runs.
+
+Start any number of these, on one node or many. Each one repeatedly claims a
+shard enqueued by /cron/send_weekly_newsletters?shards=N (or the monthly
+endpoint), sends that shard's newsletters while renewing its lease, records
+the shard's results and, if it finished the last shard, merges the run into
+cron_logs.
+
+Usage:
+    python shard_worker.py
+    python shard_worker.py --worker-id node-a-1 --lease-seconds 300 --poll-seconds 10
+    python shard_worker.py --once      # process available shards, then exit
+    python shard_worker.py --backfill-shard-points   # for users created before shard points
+                                                     # (sharded runs also backfill their cohort)
+"""
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+
+import newsletter_cron
+from helperFunctions import clients, cron_shards
+from helperFunctions.logging_config import configure_logging
+from helperFunctions.settings import get_settings
+from helperFunctions.user_repository import UserRepository
+
+logger = logging.getLogger(__name__)
+
+
+def _keep_lease(db, lease: cron_shards.ShardLease, lease_seconds: float, stop: threading.Event, lost: threading.Event):
+    """Renew the lease every third of its duration until stopped"""
+    while not stop.wait(lease_seconds / 3):
+        try:
+            cron_shards.renew_lease(db, lease, lease_seconds)
+        except cron_shards.LeaseLost:
+            logger.error("Lost the lease on shard %s of %s", lease.shard, lease.run_id)
+            lost.set()
+            return
+        except Exception as e:
+            # Transient failure; try again at the next interval while the lease is still valid
+            logger.warning("Failed to renew lease on shard %s of %s: %s", lease.shard, lease.run_id, e)
+
+
+def process_shard(db, lease: cron_shards.ShardLease, lease_seconds: float):
+    """Send one shard's newsletters, record its results and merge the run if it was the last shard"""
+    logger.info("Processing shard %s/%s of %s", lease.shard + 1, lease.shard_count, lease.run_id)
+    stop, lost = threading.Event(), threading.Event()
+    heartbeat = threading.Thread(target=_keep_lease, args=(db, lease, lease_seconds, stop, lost), daemon=True)
+    heartbeat.start()
+    try:
+        # Stop sending as soon as the lease is lost; users already sent are skipped if the shard is retried
+        results = newsletter_cron.send_cohort(
+            db, lease.frequency, lease.date_range, point_range=lease.point_range,
+            run_id=lease.run_id, cancel=lost
+        )
+    except Exception:
+        stop.set()
+        heartbeat.join()
+        logger.exception("Shard %s of %s failed", lease.shard, lease.run_id)
+        if not lost.is_set():
+            cron_shards.release_shard(db, lease)
+        return
+    stop.set()
+    heartbeat.join()
+
+    if lost.is_set():
+        # Another worker has taken the shard over and will record its own results
+        return
+    cron_shards.complete_shard(db, lease, results)
+    logger.info("Finished shard %s of %s: %s sent, %s failed",
+                lease.shard, lease.run_id, results["successful"], results["failed"])
+
+    log_reference = db.collection(newsletter_cron.CRON_LOGS_COLLECTION).document(lease.run_id)
+    if cron_shards.merge_run(db, lease.run_id, log_reference) is not None:
+        logger.info("Merged all %s shards of %s into cron_logs", lease.shard_count, lease.run_id)
+
+
+def run_worker(db, worker_id: str, lease_seconds: float, poll_seconds: float, once: bool = False):
+    while True:
+        lease = cron_shards.claim_shard(db, worker_id, lease_seconds)
+        if lease is not None:
+            try:
+                process_shard(db, lease, lease_seconds)
+            except cron_shards.LeaseLost as e:
+                logger.warning("%s", e)
+            continue
+        if once:
+            return
+        time.sleep(poll_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--lease-seconds", type=float, default=cron_shards.DEFAULT_LEASE_SECONDS)
+    parser.add_argument("--poll-seconds", type=float, default=10)
+    parser.add_argument("--once", action="store_true", help="Exit when no shard is available")
+    parser.add_argument("--backfill-shard-points", action="store_true",
+                        help="Add shard_point to user documents that lack it, then exit")
+    args = parser.parse_args()
+
+    get_settings()
+    configure_logging()
+
+    db = clients.get_firestore_db()
+    if db is None:
+        raise SystemExit("Firestore is not configured (set FIREBASE_SERVICE_ACCOUNT)")
+    if args.backfill_shard_points:
+        updated = UserRepository(db).backfill_shard_points()
+        logger.info("Added shard points to %d users", updated)
+        return
+    run_worker(db, args.worker_id, args.lease_seconds, args.poll_seconds, args.once)
+
+
+if __name__ == "__main__":
+    main()